@@ -0,0 +1,148 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def _normalize(vector):
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by query embedding.
+
+    A lookup hits when a cached query for the same corpus version has cosine
+    similarity >= threshold. The in-memory tier is an LRU with a TTL; when a
+    MongoDB collection is given, entries are written through to it and reloaded
+    on startup so the cache survives restarts.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=512, ttl_seconds=24 * 3600, collection=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.collection = collection
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._keys = []
+        self._lock = threading.Lock()
+
+        if self.collection is not None:
+            try:
+                # Let MongoDB expire persisted entries on its own
+                self.collection.create_index("created_at", expireAfterSeconds=int(ttl_seconds))
+            except Exception:
+                pass
+
+    def load(self, corpus_version):
+        """Warm the memory tier from the persistent tier (entries for this corpus version only)"""
+        if self.collection is None:
+            return 0
+        cursor = (
+            self.collection.find({"corpus_version": corpus_version})
+            .sort("created_at", -1)
+            .limit(self.max_entries)
+        )
+        loaded = 0
+        with self._lock:
+            for doc in reversed(list(cursor)):
+                created = doc["created_at"].replace(tzinfo=timezone.utc).timestamp()
+                if time.time() - created > self.ttl_seconds:
+                    continue
+                self._entries[doc["_id"]] = {
+                    "embedding": _normalize(doc["embedding"]),
+                    "answer": doc["answer"],
+                    "sources": doc.get("sources", []),
+                    "corpus_version": doc["corpus_version"],
+                    "created": created,
+                }
+                loaded += 1
+            self._matrix = None
+        return loaded
+
+    def lookup(self, embedding, corpus_version):
+        """Return (answer, sources) for a semantically equivalent cached query, or None"""
+        query = _normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries.keys())
+                    self._matrix = np.stack([self._entries[k]["embedding"] for k in self._keys])
+                scores = self._matrix @ query
+                for idx in np.argsort(-scores):
+                    if scores[idx] < self.threshold:
+                        break
+                    key = self._keys[idx]
+                    entry = self._entries.get(key)
+                    if entry is None or entry["corpus_version"] != corpus_version:
+                        continue
+                    if now - entry["created"] > self.ttl_seconds:
+                        continue
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["answer"], entry["sources"]
+            self.misses += 1
+        return None
+
+    def store(self, query, embedding, corpus_version, answer, sources):
+        """Cache an answer; sources are plain dicts ({"page_content", "metadata"})"""
+        key = hashlib.sha1(f"{corpus_version}\x00{query.strip().lower()}".encode("utf-8")).hexdigest()
+        entry = {
+            "embedding": _normalize(embedding),
+            "answer": answer,
+            "sources": sources,
+            "corpus_version": corpus_version,
+            "created": time.time(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+        if self.collection is not None:
+            try:
+                self.collection.replace_one(
+                    {"_id": key},
+                    {
+                        "embedding": entry["embedding"].tolist(),
+                        "answer": answer,
+                        "sources": sources,
+                        "corpus_version": corpus_version,
+                        "created_at": datetime.now(timezone.utc),
+                    },
+                    upsert=True,
+                )
+            except Exception:
+                # The persistent tier is best-effort; the memory tier already has the entry
+                pass
+
+    def invalidate(self, persistent=True):
+        """
+        Drop every cached answer (the corpus changed). persistent=False only empties
+        the memory tier, when another process changed the corpus and cleared the rest.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+        if persistent and self.collection is not None:
+            self.collection.delete_many({})
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
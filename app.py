@@ -1,8 +1,11 @@
 import streamlit as st
-import time
 import os
 from dotenv import load_dotenv
-from rag_engine import RAGChatbot
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from chat_history import new_conversation_id
+from settings import get_setting
+# rag_engine and its heavy dependencies load in a background thread (see startup.py)
+from startup import get_bot, readiness, start_warm_up
 
 load_dotenv()
 
@@ -98,6 +101,16 @@ st.markdown("""
         box-shadow: 0 0 5px #4ade80;
     }
 
+    .status-dot.starting {
+        background-color: #facc15;
+        box-shadow: 0 0 5px #facc15;
+    }
+
+    .status-dot.offline {
+        background-color: #f87171;
+        box-shadow: 0 0 5px #f87171;
+    }
+
     /* Chat Area */
     div[data-testid="stChatMessage"] {
         background-color: transparent;
@@ -175,40 +188,147 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# The engine (models, database and LLM clients) warms up in the background; the page
+# renders straight away and the header shows when the knowledge base is ready
+startup = start_warm_up()
+status_dot, status_text = {
+    "ready": ("", "Online"),
+    "starting": ("starting", "Starting up..."),
+}.get(startup["status"], ("offline", "Offline"))
+
 # --- Header ---
-st.markdown("""
+st.markdown(f"""
 <div class="header-container">
     <div class="header-content-wrapper">
         <div class="header-title">
             <span>RAG Chatbot 🤖</span>
         </div>
         <div class="header-subtitle">
-            <span class="status-dot"></span>
-            Online
+            <span class="status-dot {status_dot}"></span>
+            {status_text}
         </div>
     </div>
 </div>
 """, unsafe_allow_html=True)
 
+@st.fragment(run_every=1)
+def watch_startup():
+    # Reruns the page once the background warm-up has finished
+    if readiness()["status"] != "starting":
+        st.rerun(scope="app")
+
+if startup["status"] == "starting":
+    watch_startup()
+
 # --- State Init ---
-if "messages" not in st.session_state:
+# The shared engine, once warmed up (None while starting, or if keys are missing: handled by UI warning)
+bot = None
+
+def attach_bot(engine):
+    global bot
+    bot = engine
+    if bot:
+        ctx = get_script_run_ctx()
+        if ctx:
+            bot.register_session(ctx.session_id)
+
+attach_bot(get_bot())
+
+# Only a recent window of the conversation lives in session_state; the full
+# transcript is appended to the chat_history collection and older pages load on demand
+HISTORY_WINDOW = int(get_setting("CHAT_HISTORY_WINDOW", 20))
+HISTORY_PAGE = int(get_setting("CHAT_HISTORY_PAGE", 20))
+
+def start_conversation(conversation_id=None):
+    """Open a conversation (its ID is kept in the URL so a reload resumes it)"""
+    st.session_state.conversation_id = conversation_id or new_conversation_id()
+    st.query_params["c"] = st.session_state.conversation_id
     st.session_state.messages = []
-if "bot" not in st.session_state:
-    st.session_state.bot = None
+    # Pages loaded with "Load older messages", oldest first
+    st.session_state.older = []
+    st.session_state.older_available = False
+    # A resumed conversation is read back once the engine is ready
+    st.session_state.history_pending = bool(conversation_id)
 
-# Auto-init bot
-if not st.session_state.bot:
+def load_window():
+    """Read back the latest messages of a resumed conversation, ahead of any sent meanwhile"""
+    st.session_state.history_pending = False
     try:
-        # RAGChatbot will check st.secrets or os.environ
-        st.session_state.bot = RAGChatbot()
+        loaded = bot.chat_history.recent(st.session_state.conversation_id, HISTORY_WINDOW)
     except Exception:
-        # Silent fail if keys missing (handled by UI warning)
-        pass
+        return
+    st.session_state.older_available = len(loaded) == HISTORY_WINDOW
+    st.session_state.messages[:0] = loaded
+    trim_window()
+
+if "conversation_id" not in st.session_state:
+    start_conversation(st.query_params.get("c"))
 
 # --- Helper Functions ---
-def generate_response(prompt):
+def add_message(role, content, **extra):
+    """Persist a message and add it to the window, moving the oldest out once it is full"""
+    message = {"role": role, "content": content}
+    if bot:
+        try:
+            message = bot.chat_history.append(st.session_state.conversation_id, role, content)
+        except Exception:
+            # The chat keeps working without persistence
+            pass
+    # Extra keys (e.g. "expand") live only in this session
+    message.update(extra)
+    st.session_state.messages.append(message)
+    trim_window()
+    return message
+
+def trim_window():
+    messages = st.session_state.messages
+    overflow = len(messages) - HISTORY_WINDOW
+    if overflow > 0:
+        if st.session_state.older:
+            # Older pages are open: keep them contiguous with the window
+            st.session_state.older.extend(messages[:overflow])
+        else:
+            st.session_state.older_available = "seq" in messages[0]
+        del messages[:overflow]
+
+def load_older():
+    shown = st.session_state.older or st.session_state.messages
+    page = bot.chat_history.recent(st.session_state.conversation_id, HISTORY_PAGE, before=shown[0]["seq"])
+    st.session_state.older[:0] = page
+    st.session_state.older_available = len(page) == HISTORY_PAGE
+
+def request_expansion(msg):
+    """Ask the same question again, answered by the LLM instead of a quote"""
+    st.session_state.mk_expand = msg.pop("expand")
+
+def expand_button(msg):
+    if msg.get("expand"):
+        st.button("✨ Expand with AI", key=f"expand-{msg.get('seq', id(msg))}", on_click=request_expansion, args=(msg,))
+
+def render_message(msg):
+    with st.chat_message(msg["role"]):
+        st.write(msg["content"])
+        expand_button(msg)
+
+@st.fragment
+def older_history():
+    # A fragment, so loading a page reruns only this part of the page
+    if st.session_state.older_available and bot:
+        st.button("⬆️ Load older messages", on_click=load_older)
+    for msg in st.session_state.older:
+        render_message(msg)
+
+def wait_for_bot():
+    """If the engine is still warming up, wait for it (with a spinner); returns it or None"""
+    if bot is None and readiness()["status"] == "starting":
+        with st.spinner("Warming up the knowledge base..."):
+            attach_bot(get_bot(timeout=float(get_setting("STARTUP_WAIT_SECONDS", 120))))
+    return bot
+
+def generate_response(prompt, extractive=True):
     """
     Generates a response for the given prompt, handling UI updates and RAG logic.
+    extractive=False skips the quoted fast-path answer ("Expand with AI").
     """
     # Display user message if not already displayed (controlled by calling code)
     # This function assumes the message is already in session_state.messages
@@ -222,14 +342,14 @@ def generate_response(prompt):
             "What can you help me with?": "I can summarize long documents, extract specific details, compare information across files, and answer specific questions about your uploaded content."
         }
         
-        if prompt in meta_responses and not st.session_state.bot:
+        if prompt in meta_responses and not bot:
              # Fallback if bot is not init but user clicked a button
              full_response = meta_responses[prompt]
              st.markdown(full_response)
-             st.session_state.messages.append({"role": "assistant", "content": full_response})
+             add_message("assistant", full_response)
              return
 
-        if st.session_state.bot:
+        if bot:
             try:
                 # Placeholder for streaming
                 response_placeholder = st.empty()
@@ -237,18 +357,15 @@ def generate_response(prompt):
                 
                 # Check for meta-response override first, or use RAG
                 if prompt in meta_responses:
-                     answer = meta_responses[prompt]
+                     chunks = iter([meta_responses[prompt]])
                      sources = []
                 else:
-                    # Get Response from RAG
-                    answer, sources = st.session_state.bot.get_response(prompt)
+                    # Stream Response from RAG (tokens arrive as Gemini generates them)
+                    chunks, sources = bot.stream_response(prompt, extractive=extractive)
                 
-                # Simple Stream Simulation
-                words = answer.split(' ')
-                for i, word in enumerate(words):
-                    full_response += word + " "
+                for chunk in chunks:
+                    full_response += chunk
                     response_placeholder.markdown(full_response + "▌")
-                    time.sleep(0.015) 
                 
                 response_placeholder.markdown(full_response)
                 
@@ -259,16 +376,21 @@ def generate_response(prompt):
                             st.markdown(f"**Source {i}:**")
                             st.caption(doc.page_content[:200] + "...")
                 
-                st.session_state.messages.append({"role": "assistant", "content": full_response})
+                # A quoted answer can be expanded by the LLM on demand
+                quoted = bool(sources) and sources[0].metadata.get("extractive_answer", False)
+                expand_button(add_message("assistant", full_response, **({"expand": prompt} if quoted else {})))
                 
             except Exception as e:
                 err_msg = f"⚠️ Error: {str(e)}"
                 st.error(err_msg)
-                st.session_state.messages.append({"role": "assistant", "content": err_msg})
+                add_message("assistant", err_msg)
         else:
             msg = "⚠️ Knowledge base not initialized. Please check API key."
             st.warning(msg)
-            st.session_state.messages.append({"role": "assistant", "content": msg})
+            add_message("assistant", msg)
+
+if bot and st.session_state.history_pending:
+    load_window()
 
 # --- Suggested Topics ---
 # Only show if no messages yet
@@ -280,7 +402,7 @@ if not st.session_state.messages:
     with col1:
         if st.button("❓ About Chatbot"):
             msg = "Tell me about this chatbot."
-            st.session_state.messages.append({"role": "user", "content": msg})
+            add_message("user", msg)
             # Force a rerun to display the user message then we will handle response at end of script if needed? 
             # Actually, standard Streamlit flow: update state -> rerun. 
             # But we want to trigger response generation.
@@ -290,27 +412,33 @@ if not st.session_state.messages:
             
         if st.button("⚙️ How it works"):
              msg = "How does this RAG system work?"
-             st.session_state.messages.append({"role": "user", "content": msg})
+             add_message("user", msg)
              st.session_state.mk_run_response = msg
              st.rerun()
              
     with col2:
         if st.button("📁 Documents"):
             msg = "How many documents are currently indexed?"
-            st.session_state.messages.append({"role": "user", "content": msg})
+            add_message("user", msg)
             st.session_state.mk_run_response = msg
             st.rerun()
             
         if st.button("🚀 Capabilities"):
             msg = "What can you help me with?"
-            st.session_state.messages.append({"role": "user", "content": msg})
+            add_message("user", msg)
             st.session_state.mk_run_response = msg
             st.rerun()
 
 # --- Chat History ---
+# Each rerun renders at most the window (plus any pages the user asked for), so
+# the cost of a turn does not grow with the length of the conversation
+if st.session_state.messages:
+    if st.button("🧹 New conversation"):
+        start_conversation()
+        st.rerun()
+older_history()
 for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.write(msg["content"])
+    render_message(msg)
 
 # --- Response Logic Handling ---
 # Check if a button click triggered a response need
@@ -321,12 +449,18 @@ if "mk_run_response" in st.session_state and st.session_state.mk_run_response:
     # Generate response
     generate_response(prompt)
 
+if st.session_state.get("mk_expand"):
+    prompt = st.session_state.mk_expand
+    st.session_state.mk_expand = None
+    generate_response(prompt, extractive=False)
+
 # --- Input & Response ---
 if prompt := st.chat_input("Hit the buttons or type here..."):
     # Render user message immediately
-    st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.write(prompt)
+    wait_for_bot()
+    add_message("user", prompt)
     
     # Generate response
     generate_response(prompt)
@@ -0,0 +1,47 @@
+"""
+Run a regression question set through the bot.
+
+Usage:
+    python batch_eval.py questions.jsonl results.jsonl [--concurrency 16]
+
+questions.jsonl holds one {"id": ..., "question": ...} object per line (plain
+text lines are also accepted). Results are appended to results.jsonl as they
+complete; re-running the same command resumes an interrupted run.
+"""
+import argparse
+import json
+import time
+
+from dotenv import load_dotenv
+
+from rag_engine import RAGChatbot
+
+
+def load_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                questions.append(json.loads(line))
+            else:
+                questions.append({"id": i, "question": line})
+    return questions
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Batch question answering for evaluation runs")
+    parser.add_argument("questions")
+    parser.add_argument("output")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum concurrent LLM calls")
+    parser.add_argument("--retrieval-concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    bot = RAGChatbot()
+    started = time.perf_counter()
+    answered = bot.answer_batch(questions, args.output, args.concurrency, args.retrieval_concurrency)
+    print(f"Answered {answered} of {len(questions)} questions in {time.perf_counter() - started:.1f}s -> {args.output}")
@@ -0,0 +1,244 @@
+"""
+Offline performance benchmark for ingestion, retrieval and end-to-end latency.
+
+Needs no Gemini key or MongoDB: it uses a fake chat model with configurable
+latency, a hashing embedder, the local vector store and an in-memory stand-in
+for the MongoDB collections, against generated corpora of several sizes.
+
+Usage:
+    python benchmark.py --sizes 1000 10000 --output bench.json
+    python benchmark.py --sizes 1000 10000 --compare bench.json   # fail on regressions
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from llm_guard import TokenBucketLimiter
+from local_db import LocalDatabase
+from rag_engine import RAGChatbot
+
+WORDS = ("printer controller firmware network refund invoice warranty account password reset "
+         "upload server license backup policy support schedule shipping battery display sensor "
+         "calibration error voltage cable update version report request approval manager").split()
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers after a fixed delay, streaming tokens at a fixed rate"""
+
+    latency: float = 0.2
+    time_to_first_token: float = 0.05
+    answer: str = "This is a benchmark answer generated from the retrieved context. " * 4
+
+    @property
+    def _llm_type(self):
+        return "benchmark-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self.answer.split(" ")
+        time.sleep(self.time_to_first_token)
+        per_token = max(self.latency - self.time_to_first_token, 0) / len(tokens)
+        for token in tokens:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+            time.sleep(per_token)
+
+
+class HashingEmbeddings(Embeddings):
+    """Fast deterministic bag-of-words embedding (feature hashing into dim buckets)"""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class _Upload(io.BytesIO):
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def generate_corpus(chunks, chunks_per_file=200, seed=0):
+    """Synthetic .txt uploads totalling about `chunks` chunks of ~900 characters"""
+    rng = random.Random(seed)
+    uploads = []
+    for f in range(math.ceil(chunks / chunks_per_file)):
+        paragraphs = []
+        for p in range(min(chunks_per_file, chunks - f * chunks_per_file)):
+            words = [rng.choice(WORDS) for _ in range(120)]
+            words.insert(rng.randrange(len(words)), f"E-{f:03d}{p:04d}")
+            paragraphs.append(" ".join(words) + ".")
+        uploads.append(_Upload(f"doc_{f:04d}.txt", "\n\n".join(paragraphs).encode()))
+    return uploads
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "n": 0}
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "n": len(ordered)}
+
+
+def run_size(size, queries, llm_latency):
+    rng = random.Random(size)
+    previous_index_dir = os.environ.get("LOCAL_INDEX_DIR")
+    with tempfile.TemporaryDirectory() as index_dir:
+        os.environ["LOCAL_INDEX_DIR"] = index_dir
+        try:
+            return _run_size(size, queries, llm_latency, rng)
+        finally:
+            if previous_index_dir is None:
+                os.environ.pop("LOCAL_INDEX_DIR", None)
+            else:
+                os.environ["LOCAL_INDEX_DIR"] = previous_index_dir
+
+
+def _run_size(size, queries, llm_latency, rng):
+    bot = RAGChatbot(
+        api_key="offline",
+        embeddings=HashingEmbeddings(),
+        llm=FakeChatModel(latency=llm_latency),
+        db=LocalDatabase(),
+        vector_backend="local",
+    )
+    # Every query must exercise the full pipeline
+    bot.answer_cache.threshold = 2.0
+    # The fake LLM has no quota; keep client-side rate limiting out of the measurements
+    bot.llm_guard.limiter = TokenBucketLimiter(rpm=10**9, tpm=10**12)
+
+    uploads = generate_corpus(size)
+    started = time.perf_counter()
+    bot.process_files(uploads)
+    ingest_seconds = time.perf_counter() - started
+    chunk_count = bot.get_document_count()
+
+    questions = [
+        f"what does error E-{rng.randrange(len(uploads)):03d}{rng.randrange(200):04d} mean for the "
+        f"{rng.choice(WORDS)} {rng.choice(WORDS)}"
+        for _ in range(queries)
+    ]
+    vectors = [bot.embeddings.embed_query(q) for q in questions]
+
+    retrieval = []
+    for question, vector in zip(questions, vectors):
+        t0 = time.perf_counter()
+        bot._retrieve(question, vector, k=bot.retrieve_k)
+        retrieval.append(time.perf_counter() - t0)
+
+    end_to_end, overhead = [], []
+    for question in questions:
+        t0 = time.perf_counter()
+        bot.get_response(question)
+        elapsed = time.perf_counter() - t0
+        end_to_end.append(elapsed)
+        # Cached and extractive answers skip the LLM, so they have no latency to subtract
+        tags = bot.telemetry.recent(1, kind="chat")[0].tags
+        if tags.get("answer") == "generated" and tags.get("cache") == "miss":
+            overhead.append(elapsed - llm_latency)
+
+    stats = bot.prompt_stats
+    return {
+        "chunks": chunk_count,
+        "ingest": {"seconds": round(ingest_seconds, 3),
+                   "chunks_per_second": round(chunk_count / ingest_seconds, 1)},
+        "retrieval": percentiles(retrieval),
+        "end_to_end": percentiles(end_to_end),
+        # Pipeline overhead on top of the simulated LLM latency, over LLM-answered questions only
+        "overhead": percentiles(overhead),
+        "prompt_tokens_avg": round(stats["total_tokens"] / stats["requests"]) if stats["requests"] else 0,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print metric deltas; return False if any latency/throughput regressed beyond tolerance"""
+    ok = True
+    for size, result in current["results"].items():
+        base = baseline["results"].get(size)
+        if not base:
+            continue
+        checks = [
+            ("retrieval p95", result["retrieval"]["p95_ms"], base["retrieval"]["p95_ms"], True),
+            ("overhead p95", result["overhead"]["p95_ms"], base["overhead"]["p95_ms"], True),
+            ("prompt tokens", result["prompt_tokens_avg"], base["prompt_tokens_avg"], True),
+            ("ingest chunks/s", result["ingest"]["chunks_per_second"], base["ingest"]["chunks_per_second"], False),
+        ]
+        for name, now, before, lower_is_better in checks:
+            if now is None or before is None:
+                continue
+            change = (now - before) / before if before else 0.0
+            regressed = change > tolerance if lower_is_better else change < -tolerance
+            ok = ok and not regressed
+            print(f"[{size:>7}] {name:<16} {before:>10} -> {now:>10} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def _commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline RAG pipeline benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="simulated LLM latency in seconds")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    results = {"commit": _commit(), "python": platform.python_version(), "llm_latency": args.llm_latency,
+               "results": {}}
+    for size in args.sizes:
+        results["results"][str(size)] = run_size(size, args.queries, args.llm_latency)
+        print(json.dumps({size: results["results"][str(size)]}))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(results, json.load(f), args.tolerance):
+                raise SystemExit(1)
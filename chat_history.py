@@ -0,0 +1,45 @@
+import time
+import uuid
+
+
+def new_conversation_id():
+    return uuid.uuid4().hex
+
+
+class ChatHistory:
+    """
+    Append-only store of chat turns, one document per message.
+
+    Each message gets a sequence number from a nanosecond clock, so a conversation
+    reads back in order and older pages are fetched with seq < the oldest one shown.
+    Messages are never updated or rewritten, so a turn costs one small insert
+    however long the conversation is.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        try:
+            self.collection.create_index([("conversation_id", 1), ("seq", -1)])
+        except Exception:
+            pass
+
+    def append(self, conversation_id, role, content):
+        """Store one message; returns it with its seq"""
+        seq = time.time_ns()
+        message = {"role": role, "content": content, "seq": seq}
+        self.collection.insert_one({
+            "_id": f"{conversation_id}:{seq}", "conversation_id": conversation_id,
+            "created_at": seq / 1e9, **message,
+        })
+        return message
+
+    def recent(self, conversation_id, limit=20, before=None):
+        """
+        The latest `limit` messages of a conversation (older than seq `before`, if given),
+        oldest first.
+        """
+        query = {"conversation_id": conversation_id}
+        if before is not None:
+            query["seq"] = {"$lt": before}
+        cursor = self.collection.find(query, {"role": 1, "content": 1, "seq": 1}).sort("seq", -1).limit(limit)
+        return [{"role": m["role"], "content": m["content"], "seq": m["seq"]} for m in reversed(list(cursor))]
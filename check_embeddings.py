@@ -0,0 +1,99 @@
+"""
+Compare the int8 ONNX embedding backend with the full-precision HuggingFace model.
+
+Accuracy: cosine similarity between the two vectors of every sample text, and how
+many of each text's 5 nearest neighbours (within the sample) the backends agree on.
+Throughput: documents/second for batched embedding and p50 latency of a single query.
+
+Usage:
+    python check_embeddings.py                       # built-in sample set
+    python check_embeddings.py --texts corpus.txt    # one sample per blank-line separated paragraph
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from rag_engine import load_embeddings
+
+TOPICS = ("refund policy", "printer firmware update", "password reset", "warranty claim", "VPN access",
+          "expense report", "shipping delay", "battery replacement", "license renewal", "data backup")
+TEMPLATES = (
+    "How do I {}?",
+    "What is the process for a {} and who approves it?",
+    "The {} procedure requires the form to be submitted within 30 days of purchase, together with the "
+    "original receipt. Requests received later are reviewed case by case by the support manager.",
+    "Error E-{n} is shown when the {} step fails. Restart the device, check the cable and try again; if "
+    "the error persists contact support with the serial number printed on the back label.",
+)
+
+
+def sample_texts(n=200, seed=0):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        template = rng.choice(TEMPLATES)
+        text = template.replace("{n}", str(rng.randrange(1000, 9999))).format(rng.choice(TOPICS))
+        # Longer chunk-sized samples as well as short queries
+        if rng.random() < 0.3:
+            text = " ".join([text] * rng.randint(2, 5))
+        texts.append(text)
+    return texts
+
+
+def throughput(embeddings, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        embeddings.embed_documents(texts)
+        best = min(best, time.perf_counter() - t0)
+    latencies = []
+    for text in texts[:50]:
+        t0 = time.perf_counter()
+        embeddings.embed_query(text)
+        latencies.append(time.perf_counter() - t0)
+    return {"docs_per_second": round(len(texts) / best, 1),
+            "query_p50_ms": round(statistics.median(latencies) * 1000, 2)}
+
+
+def neighbours(vectors, k=5):
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, -np.inf)
+    return np.argsort(-similarity, axis=1)[:, :k]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ONNX int8 vs full-precision embedding check")
+    parser.add_argument("--texts", help="file with sample texts (paragraphs separated by blank lines)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="fail if the mean cosine is lower")
+    args = parser.parse_args()
+
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [p.strip() for p in f.read().split("\n\n") if p.strip()]
+    else:
+        texts = sample_texts()
+
+    reference = load_embeddings("huggingface")
+    quantized = load_embeddings("onnx")
+
+    ref = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    quant = np.asarray(quantized.embed_documents(texts), dtype=np.float32)
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+    quant /= np.linalg.norm(quant, axis=1, keepdims=True)
+    cosine = (ref * quant).sum(axis=1)
+
+    ref_nn, quant_nn = neighbours(ref), neighbours(quant)
+    overlap = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(ref_nn, quant_nn)])
+
+    print(f"Samples: {len(texts)}")
+    print(f"Cosine agreement: mean {cosine.mean():.4f}, min {cosine.min():.4f}, p5 {np.percentile(cosine, 5):.4f}")
+    print(f"Top-5 neighbour overlap: {overlap:.1%}")
+    print(f"HuggingFace (fp32): {throughput(reference, texts, args.repeat)}")
+    print(f"ONNX (int8):        {throughput(quantized, texts, args.repeat)}")
+
+    if cosine.mean() < args.min_cosine:
+        raise SystemExit(f"Mean cosine {cosine.mean():.4f} is below {args.min_cosine}")
@@ -0,0 +1,94 @@
+"""
+Measure the extractive fast path on a labeled question set: how much traffic it
+would answer without the LLM, and how often those answers are right.
+
+Usage:
+    python check_extractive.py labeled.jsonl [--thresholds 0.7 0.75 0.8 0.85 0.9]
+
+labeled.jsonl holds one {"question": ..., "answer": ...} object per line, run
+against the indexed corpus. "answer" is a string (or list of accepted strings)
+the quoted sentence must contain, or null when the question should go to the
+LLM; any fast-path answer to such a question counts as wrong. Questions are
+retrieved once and every threshold is evaluated on the same hits, so the table
+shows the coverage / accuracy trade-off for EXTRACTIVE_MIN_SCORE.
+"""
+import argparse
+import json
+import re
+
+from dotenv import load_dotenv
+
+from extractive import ExtractiveAnswerer, is_lookup
+from rag_engine import RAGChatbot
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def load_labeled(path):
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                expected = item.get("answer")
+                item["accepted"] = [] if expected is None else [expected] if isinstance(expected, str) else expected
+                items.append(item)
+    return items
+
+
+def is_correct(answer, accepted):
+    answer = _normalize(answer)
+    return any(_normalize(text) in answer for text in accepted)
+
+
+def evaluate(items, retrieved, min_score, min_coverage):
+    """{"served", "share", "correct", "accuracy", "errors"} for one threshold"""
+    answerer = ExtractiveAnswerer(min_score=min_score, min_coverage=min_coverage)
+    served, correct, errors = 0, 0, []
+    for item, docs in zip(items, retrieved):
+        result = answerer.extract(item["question"], docs)
+        if result is None:
+            continue
+        served += 1
+        if is_correct(result[0], item["accepted"]):
+            correct += 1
+        else:
+            errors.append((item["question"], result[0]))
+    return {
+        "served": served,
+        "share": served / len(items) if items else 0.0,
+        "correct": correct,
+        "accuracy": correct / served if served else 0.0,
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Extractive fast-path coverage and accuracy")
+    parser.add_argument("labeled")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.7, 0.75, 0.8, 0.85, 0.9])
+    parser.add_argument("--show-errors", type=int, default=5, help="wrong answers to print at the configured threshold")
+    args = parser.parse_args()
+
+    items = load_labeled(args.labeled)
+    bot = RAGChatbot()
+    retrieved = [
+        bot._retrieve(item["question"], bot.embeddings.embed_query(item["question"]), k=bot.retrieve_k)
+        for item in items
+    ]
+    lookups = sum(is_lookup(item["question"]) for item in items)
+    print(f"{len(items)} questions, {lookups} match the lookup pattern, "
+          f"{sum(bool(item['accepted']) for item in items)} labeled with an answer")
+    print(f"{'min score':>10} {'served':>8} {'share':>7} {'accuracy':>9}")
+    thresholds = sorted(set(args.thresholds) | {bot.extractive.min_score})
+    for threshold in thresholds:
+        result = evaluate(items, retrieved, threshold, bot.extractive.min_coverage)
+        marker = "  <- EXTRACTIVE_MIN_SCORE" if threshold == bot.extractive.min_score else ""
+        print(f"{threshold:>10.2f} {result['served']:>8} {result['share']:>7.1%} {result['accuracy']:>9.1%}{marker}")
+        if marker:
+            errors = result["errors"]
+    for question, answer in errors[:args.show_errors]:
+        print(f"\nWrong: {question}\n{answer}")
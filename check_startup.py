@@ -0,0 +1,86 @@
+"""
+Break down cold-start cost: module imports, then engine initialization and warm-up.
+
+Each run happens in a fresh interpreter, so nothing is already imported or cached
+in memory. Steps run in the order a server process pays for them, and every
+import is timed on top of the previous ones (shared dependencies are charged to
+the first step that pulls them in). "page" is what app.py needs before it can
+render; everything after it happens in the background warm-up thread.
+
+Usage:
+    python check_startup.py                  # imports + engine (needs the usual keys)
+    python check_startup.py --imports-only   # no keys or database needed
+    python check_startup.py --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_STEPS = [
+    ("streamlit", "import streamlit"),
+    ("page", "import settings, startup, chat_history"),
+    ("langchain_core + pymongo", "import langchain_core.prompts, langchain_core.documents, pymongo"),
+    ("rag_engine", "import rag_engine"),
+    ("langchain_google_genai", "import langchain_google_genai"),
+    ("langchain_huggingface", "import langchain_huggingface"),
+    ("sentence_transformers (torch)", "import sentence_transformers"),
+]
+
+
+def child(imports_only):
+    """Runs in the fresh interpreter; prints one JSON object of timings in seconds"""
+    timings = {}
+    for name, statement in IMPORT_STEPS:
+        t0 = time.perf_counter()
+        try:
+            exec(statement, {})
+        except ImportError:
+            continue
+        timings[f"import {name}"] = time.perf_counter() - t0
+    if not imports_only:
+        from dotenv import load_dotenv
+        import rag_engine
+        load_dotenv()
+        t0 = time.perf_counter()
+        try:
+            bot = rag_engine.get_shared_bot()
+            timings["engine init"] = time.perf_counter() - t0
+            timings.update({f"  {stage}": seconds for stage, seconds in bot.startup_timings.items() if stage != "total"})
+            t0 = time.perf_counter()
+            bot.warm_up()
+            timings["warm-up embedding"] = time.perf_counter() - t0
+        except Exception as e:
+            timings["error"] = str(e)
+    print(json.dumps(timings))
+
+
+def measure(imports_only):
+    args = [sys.executable, __file__, "--child"] + (["--imports-only"] if imports_only else [])
+    t0 = time.perf_counter()
+    out = subprocess.run(args, capture_output=True, text=True, check=True).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    timings["process total"] = time.perf_counter() - t0
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start time breakdown")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--imports-only", action="store_true", help="skip engine initialization")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.imports_only)
+        raise SystemExit
+
+    runs = [measure(args.imports_only) for _ in range(args.runs)]
+    errors = {run.pop("error") for run in runs if "error" in run}
+    print(f"Median of {args.runs} cold starts (seconds):")
+    for step in runs[0]:
+        print(f"  {step:<34} {statistics.median(run[step] for run in runs if step in run):7.3f}")
+    for error in errors:
+        print(f"Engine init failed: {error}")
@@ -0,0 +1,99 @@
+"""
+Measure recall and per-chunk size of the compact vector storage modes (VECTOR_STORAGE).
+
+Chunk embeddings are sampled from the embedding cache in MongoDB (MONGODB_URI), or
+generated when --synthetic is given. Some are held out as queries. Exact float
+cosine top-k is the ground truth. Each mode runs the same two passes as
+AtlasVectorStore: an approximate pass over the compact vectors for rescore_factor * k
+candidates, then rescoring against the full-precision query.
+
+Usage:
+    python check_vector_recall.py                  # sample from the embedding cache
+    python check_vector_recall.py --synthetic      # no database needed
+"""
+import argparse
+
+import bson
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+from dotenv import load_dotenv
+
+from quantization import cosine_scores, hamming_distances, pack_bits, quantize_int8
+
+
+def load_vectors(limit):
+    from mongo_clients import get_client
+    from rag_engine import EMBEDDING_MODEL, get_setting
+    client = get_client(get_setting("MONGODB_URI"))
+    cursor = client["chatbot_db"]["embedding_cache"].find({"model": EMBEDDING_MODEL}, {"embedding": 1}).limit(limit)
+    return np.asarray([doc["embedding"] for doc in cursor], dtype=np.float32)
+
+
+def synthetic_vectors(n, dim=384, clusters=500, spread=0.5, seed=0):
+    """Clustered unit vectors, roughly like topical document embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + spread * rng.standard_normal((n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def top_k(scores, k, largest=True):
+    order = np.argpartition(-scores if largest else scores, k - 1)[:k]
+    return order[np.argsort(-scores[order] if largest else scores[order])]
+
+
+def recall(corpus, queries, k, mode, rescore_factor):
+    int8 = quantize_int8(corpus)
+    bits = pack_bits(corpus) if mode == "binary" else None
+    candidates = k * rescore_factor
+    hits = 0
+    for query in queries:
+        truth = set(top_k(cosine_scores(query, corpus), k))
+        if mode == "int8":
+            # First pass with the query quantized as well, as the index compares int8 to int8
+            first = top_k(cosine_scores(quantize_int8(query)[0], int8), candidates)
+        else:
+            first = top_k(hamming_distances(pack_bits(query)[0], bits), candidates, largest=False)
+        rescored = first[top_k(cosine_scores(query, int8[first]), k)]
+        hits += len(truth & set(rescored))
+    return hits / (k * len(queries))
+
+
+def bytes_per_chunk(vector):
+    """BSON size of the embedding field(s) each storage mode writes for one chunk"""
+    int8 = Binary.from_vector(quantize_int8(vector)[0], BinaryVectorDtype.INT8)
+    bits = Binary.from_vector(pack_bits(vector)[0].tolist(), BinaryVectorDtype.PACKED_BIT, 0)
+    return {
+        "float": len(bson.encode({"embedding": vector.tolist()})),
+        "int8": len(bson.encode({"embedding": int8})),
+        "binary": len(bson.encode({"embedding": bits, "embedding_int8": int8})),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall of compact vector storage with rescoring")
+    parser.add_argument("--synthetic", action="store_true", help="use generated vectors instead of MongoDB")
+    parser.add_argument("--limit", type=int, default=20000, help="max vectors to sample")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, 2, 4, 10])
+    args = parser.parse_args()
+
+    load_dotenv()
+    vectors = synthetic_vectors(args.limit) if args.synthetic else load_vectors(args.limit)
+    if len(vectors) <= args.queries + args.k:
+        raise SystemExit(f"Need more than {args.queries + args.k} vectors, found {len(vectors)}")
+    rng = np.random.default_rng(1)
+    order = rng.permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+
+    sizes = bytes_per_chunk(corpus[0])
+    print(f"Corpus: {len(corpus)} vectors, {len(queries)} queries, recall@{args.k}")
+    print(f"Embedding bytes per chunk: " + ", ".join(
+        f"{mode} {size} ({sizes['float'] / size:.1f}x smaller)" if mode != "float" else f"{mode} {size}"
+        for mode, size in sizes.items()))
+    for mode in ("int8", "binary"):
+        results = ", ".join(
+            f"x{factor}: {recall(corpus, queries, args.k, mode, factor):.3f}" for factor in args.rescore_factors
+        )
+        print(f"{mode:<7} recall by rescore factor: {results}")
@@ -0,0 +1,96 @@
+import re
+
+from langchain_core.documents import Document
+
+# Rough Gemini tokenizer ratio for English prose; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _position(doc):
+    """(source, segment, start, end) when the chunk carries a start_index, else None"""
+    start = doc.metadata.get("start_index")
+    if start is None or start < 0:
+        return None
+    segment = doc.metadata.get("page", doc.metadata.get("offset", 0))
+    return doc.metadata.get("source"), segment, start, start + len(doc.page_content)
+
+
+def merge_adjacent(docs):
+    """
+    Merge chunks from the same source/page whose character ranges overlap or touch,
+    so the chunk_overlap text is sent once. Keeps the best (lowest) rank of the parts.
+    Returns [(rank, Document)].
+    """
+    ranked = list(enumerate(docs))
+    positioned = sorted(
+        ((rank, doc, pos) for rank, doc in ranked if (pos := _position(doc)) is not None),
+        key=lambda item: item[2],
+    )
+    merged = [(rank, doc) for rank, doc in ranked if _position(doc) is None]
+
+    current = None
+    for rank, doc, (source, segment, start, end) in positioned:
+        if current and current["key"] == (source, segment) and start <= current["end"]:
+            overlap = current["end"] - start
+            current["text"] += doc.page_content[overlap:]
+            current["end"] = max(current["end"], end)
+            current["rank"] = min(current["rank"], rank)
+            continue
+        if current:
+            merged.append((current["rank"], Document(page_content=current["text"], metadata=current["metadata"])))
+        current = {"key": (source, segment), "end": end, "text": doc.page_content,
+                   "rank": rank, "metadata": dict(doc.metadata)}
+    if current:
+        merged.append((current["rank"], Document(page_content=current["text"], metadata=current["metadata"])))
+
+    merged.sort(key=lambda item: item[0])
+    return merged
+
+
+def _shingles(text, size=5):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(ranked_docs, threshold=0.8):
+    """Drop documents whose word-shingle Jaccard similarity to a better-ranked one is >= threshold"""
+    kept = []
+    for rank, doc in ranked_docs:
+        shingles = _shingles(doc.page_content)
+        duplicate = False
+        for _, _, other in kept:
+            union = len(shingles | other)
+            if union and len(shingles & other) / union >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append((rank, doc, shingles))
+    return [(rank, doc) for rank, doc, _ in kept]
+
+
+def pack_context(docs, token_budget=3000, dedupe_threshold=0.8):
+    """
+    Assemble retrieved docs into a prompt context:
+    merge overlapping neighbours, drop near-duplicates, then pack in rank order
+    until token_budget is reached. Returns (context text, docs used).
+    """
+    candidates = drop_near_duplicates(merge_adjacent(docs), dedupe_threshold)
+    parts, used, tokens = [], [], 0
+    for _, doc in candidates:
+        cost = estimate_tokens(doc.page_content)
+        if tokens + cost > token_budget:
+            if parts:
+                continue
+            # Always send something: truncate the best hit to the budget
+            doc = Document(page_content=doc.page_content[:token_budget * CHARS_PER_TOKEN], metadata=doc.metadata)
+            cost = estimate_tokens(doc.page_content)
+        parts.append(doc.page_content)
+        used.append(doc)
+        tokens += cost
+    return "\n\n".join(parts), used
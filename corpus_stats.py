@@ -0,0 +1,106 @@
+import time
+
+from pymongo import ReturnDocument
+
+from context import CHARS_PER_TOKEN
+
+_TOTALS_ID = "__corpus__"
+
+
+class CorpusStats:
+    """
+    Corpus statistics kept in a small collection so the dashboard never scans the chunks.
+
+    One document per source file ({chunks, chars, tokens, embedding_model, indexed_at})
+    plus a totals document. Ingestion and deletion update them incrementally: each
+    source document holds absolute values for the file's current revision and the
+    totals are moved by the difference, so both stay O(1) to read.
+
+    The source document is swapped with an atomic find-and-modify that returns its
+    previous values, so concurrent writers in different processes each apply their
+    own difference and the totals stay exact.
+    """
+
+    def __init__(self, collection, model_name):
+        self.collection = collection
+        self.model_name = model_name
+
+    def record_source(self, source, chunks, chars):
+        """Set the stats for source's current revision and adjust the totals"""
+        tokens = _tokens(chars)
+        now = time.time()
+        old = self.collection.find_one_and_update(
+            {"_id": source},
+            {"$set": {"kind": "source", "chunks": chunks, "chars": chars, "tokens": tokens,
+                      "embedding_model": self.model_name, "indexed_at": now}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        ) or {}
+        self.collection.update_one(
+            {"_id": _TOTALS_ID},
+            {
+                "$inc": {
+                    "sources": 0 if old else 1,
+                    "chunks": chunks - old.get("chunks", 0),
+                    "chars": chars - old.get("chars", 0),
+                    "tokens": tokens - old.get("tokens", 0),
+                },
+                "$set": {"kind": "total", "embedding_model": self.model_name, "indexed_at": now},
+            },
+            upsert=True,
+        )
+
+    def remove_source(self, source):
+        """Drop a source's stats and subtract them from the totals"""
+        old = self.collection.find_one_and_delete({"_id": source})
+        if not old:
+            return
+        self.collection.update_one(
+            {"_id": _TOTALS_ID},
+            {"$inc": {"sources": -1, "chunks": -old["chunks"], "chars": -old["chars"], "tokens": -old["tokens"]}},
+        )
+
+    def backfill(self, manifest, store):
+        """
+        Build the stats of a corpus indexed before they were kept, from the manifest and
+        the stored chunk texts (one pass, source by source). Without it the first ingest
+        would start the totals from that file alone. Writes absolute values, so running
+        it twice is harmless.
+        """
+        now = time.time()
+        totals = {"sources": 0, "chars": 0, "tokens": 0}
+        for entry in manifest.find({}):
+            texts = store.get(entry.get("chunk_ids", []))
+            chars = sum(len(doc.page_content) for doc in texts.values())
+            self.collection.replace_one(
+                {"_id": entry["_id"]},
+                {"kind": "source", "chunks": len(texts), "chars": chars, "tokens": _tokens(chars),
+                 "embedding_model": self.model_name, "indexed_at": entry.get("indexed_at", now)},
+                upsert=True,
+            )
+            totals["sources"] += 1
+            totals["chars"] += chars
+            totals["tokens"] += _tokens(chars)
+        self.collection.replace_one(
+            {"_id": _TOTALS_ID},
+            # Chunks missing from the manifest still count towards the total
+            {"kind": "total", "chunks": store.estimated_count(), "embedding_model": self.model_name,
+             "indexed_at": now, **totals},
+            upsert=True,
+        )
+
+    def clear(self):
+        self.collection.delete_many({})
+
+    def totals(self):
+        """Totals document, or None if nothing was indexed since stats were introduced"""
+        return self.collection.find_one({"_id": _TOTALS_ID})
+
+    def sources(self):
+        """Per-file breakdown, largest first"""
+        docs = self.collection.find({"kind": "source"})
+        return sorted(docs, key=lambda doc: doc["chunks"], reverse=True)
+
+
+def _tokens(chars):
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -0,0 +1,91 @@
+import hashlib
+import re
+import threading
+
+from bson.binary import Binary, BinaryVectorDtype
+from langchain_core.embeddings import Embeddings
+from pymongo.errors import BulkWriteError
+
+from quantization import quantize_int8
+
+# Keep $in queries and inserts to a reasonable size
+_BATCH = 1000
+
+
+def chunk_key(text, model_name):
+    """Content address of a chunk: hash of the whitespace-normalized text plus the model name"""
+    normalized = re.sub(r"\s+", " ", text).strip()
+    return hashlib.sha256(f"{model_name}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that stores document vectors in MongoDB keyed by chunk content.
+    Only chunks that were never embedded with this model reach the underlying model.
+    Queries are not cached (the answer cache covers repeated questions).
+
+    compact=True caches int8 vectors (~0.4 KB instead of ~4.9 KB at 384 dimensions),
+    for stores that keep int8 or 1-bit vectors anyway: they quantize the cached
+    vectors to exactly what they would have stored. Compact entries are keyed
+    separately from full-precision ones.
+    """
+
+    def __init__(self, embeddings, model_name, collection, compact=False):
+        self.embeddings = embeddings
+        self.model_name = f"{model_name}/int8" if compact else model_name
+        self.compact = compact
+        self.collection = collection
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        keys = [chunk_key(t, self.model_name) for t in texts]
+
+        # 1. Look up every distinct key
+        vectors = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for i in range(0, len(unique_keys), _BATCH):
+            batch = unique_keys[i:i + _BATCH]
+            for doc in self.collection.find({"_id": {"$in": batch}}, {"embedding": 1}):
+                vector = doc["embedding"]
+                vectors[doc["_id"]] = [float(x) for x in vector.as_vector().data] if isinstance(vector, Binary) else vector
+
+        # 2. Embed only the misses (first occurrence of each key)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            records = []
+            for key, vector in zip(missing.keys(), new_vectors):
+                vectors[key] = vector
+                records.append({"_id": key, "model": self.model_name, "embedding": self._encode(vector)})
+            for i in range(0, len(records), _BATCH):
+                try:
+                    self.collection.insert_many(records[i:i + _BATCH], ordered=False)
+                except BulkWriteError:
+                    # A concurrent ingest cached the same chunk first; vectors are identical
+                    pass
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [vectors[key] for key in keys]
+
+    def _encode(self, vector):
+        if self.compact:
+            return Binary.from_vector(quantize_int8(vector)[0].tolist(), BinaryVectorDtype.INT8)
+        return list(vector)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
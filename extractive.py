@@ -0,0 +1,99 @@
+import re
+import threading
+
+from lexical_index import tokenize
+
+# Short factual lookups: "what is the support email", "what's the refund window", "who approves refunds"
+_LOOKUP_RE = re.compile(
+    r"^(what(?:['’]s|s| is| are| was)|which|who|whom|where|when|how (?:many|much|long|often|old|far|soon)|"
+    r"is there|are there)\b",
+    re.IGNORECASE,
+)
+# Questions that need reasoning or a synthesis of several passages, not a quoted line
+_OPEN_ENDED_RE = re.compile(
+    r"\b(why|explain|compare|difference|differences|summari[sz]e|summary|describe|overview|pros|cons|"
+    r"steps|list all|versus|vs)\b",
+    re.IGNORECASE,
+)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+MAX_LOOKUP_WORDS = 12
+MAX_ANSWER_CHARS = 400
+
+
+def is_lookup(query):
+    """True for short questions asking for a single fact"""
+    text = query.strip()
+    return (len(text.split()) <= MAX_LOOKUP_WORDS and bool(_LOOKUP_RE.match(text))
+            and not _OPEN_ENDED_RE.search(text))
+
+
+def best_sentence(query, text):
+    """(sentence, share of the query's terms it contains) for the sentence of text that best matches query"""
+    terms = set(tokenize(query))
+    if not terms:
+        return None, 0.0
+    best, best_coverage = None, 0.0
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        if len(sentence) < 8:
+            continue
+        coverage = len(terms & set(tokenize(sentence))) / len(terms)
+        if coverage > best_coverage:
+            best, best_coverage = sentence, coverage
+    return best, best_coverage
+
+
+def cite(doc):
+    source = doc.metadata.get("source", "Document")
+    page = doc.metadata.get("page")
+    return f"{source}, page {page + 1}" if isinstance(page, int) else source
+
+
+class ExtractiveAnswerer:
+    """
+    Answers lookup questions by quoting the top retrieved chunk, without calling the LLM.
+
+    A question is answered here only when it matches the lookup pattern, the top
+    hit's vector similarity (metadata["score"], 0..1) is at least min_score and
+    one of its sentences holds at least min_coverage of the question's terms.
+    Everything else goes to the LLM. check_extractive.py measures how often this
+    fires and how often it is right on a labeled question set.
+    """
+
+    def __init__(self, min_score=0.8, min_coverage=0.5, enabled=True):
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self.enabled = enabled
+        self.counters = {"checked": 0, "served": 0}
+        self._lock = threading.Lock()
+
+    def extract(self, query, docs):
+        """(answer with citation, cited doc) or None; does not count"""
+        if not self.enabled or not docs or not is_lookup(query):
+            return None
+        top = docs[0]
+        score = top.metadata.get("score")
+        if score is None or score < self.min_score:
+            return None
+        sentence, coverage = best_sentence(query, top.page_content)
+        if sentence is None or coverage < self.min_coverage:
+            return None
+        if len(sentence) > MAX_ANSWER_CHARS:
+            sentence = sentence[:MAX_ANSWER_CHARS].rsplit(" ", 1)[0] + "..."
+        return f"> {sentence}\n\n— *{cite(top)}*", top
+
+    def answer(self, query, docs):
+        """extract(), counted in stats()"""
+        result = self.extract(query, docs)
+        with self._lock:
+            self.counters["checked"] += 1
+            if result:
+                self.counters["served"] += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, "share": counters["served"] / counters["checked"] if counters["checked"] else 0.0,
+                "min_score": self.min_score}
@@ -0,0 +1,320 @@
+import contextlib
+import hashlib
+import io
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from loaders import file_fingerprint, iter_chunks, iter_pages, open_source, read_all, source_size
+
+# Seconds between progress callbacks while waiting on background stages
+_PROGRESS_INTERVAL = 0.2
+
+
+class ChunkIds:
+    """
+    Deterministic chunk IDs: hash of source name, normalized text and occurrence number.
+    Occurrences are tracked by text digest, so memory does not grow with chunk text.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._seen = {}
+
+    def next(self, text):
+        normalized = re.sub(r"\s+", " ", text).strip()
+        key = hashlib.sha1(normalized.encode("utf-8")).digest()
+        n = self._seen.get(key, 0)
+        self._seen[key] = n + 1
+        return hashlib.sha1(f"{self.source}\x00{normalized}\x00{n}".encode("utf-8")).hexdigest()
+
+
+def _make_splitter(chunk_size, chunk_overlap):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    # start_index lets retrieval merge overlapping neighbours back together
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+
+
+def parse_and_split(name, data, chunk_size, chunk_overlap):
+    """
+    Parse stage for small files (runs in a worker process).
+    Returns (page count, [(chunk text, metadata)], {"parse": seconds, "split": seconds}).
+    """
+    t0 = time.perf_counter()
+    pages = list(iter_pages(name, io.BytesIO(data)))
+    t1 = time.perf_counter()
+    chunks = list(iter_chunks(pages, _make_splitter(chunk_size, chunk_overlap)))
+    return len(pages), chunks, {"parse": t1 - t0, "split": time.perf_counter() - t1}
+
+
+class IngestPipeline:
+    """
+    Three overlapping ingestion stages:
+    1. parse + split small files in a process pool (at most two files per worker
+       are read and queued at a time); large files are streamed page by page
+       (or window by window) in-process instead of being copied,
+    2. embed new chunks in fixed-size batches (background thread),
+    3. bulk insert embedded chunks into the vector store (background thread).
+    Bounded queues between the stages keep memory proportional to the batch
+    sizes and the text window, not to the size of the upload.
+    Files whose fingerprint matches the manifest are skipped; changed files only
+    embed/insert chunks with new IDs and delete the ones that disappeared.
+    """
+
+    def __init__(self, embeddings, store, manifest, chunk_size=1000, chunk_overlap=200,
+                 embed_batch_size=64, insert_batch_size=500, parse_workers=None,
+                 stream_threshold=16 << 20, window_chars=1_000_000, lexical_index=None, stats=None,
+                 pool=None):
+        self.embeddings = embeddings
+        self.store = store
+        self.manifest = manifest
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embed_batch_size = embed_batch_size
+        self.insert_batch_size = insert_batch_size
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        # Uploads larger than this (bytes) take the streaming path
+        self.stream_threshold = stream_threshold
+        self.window_chars = window_chars
+        # Optional BM25 index kept in sync with the chunks written/deleted here
+        self.lexical_index = lexical_index
+        # Optional CorpusStats updated with each file's chunk/character totals
+        self.stats = stats
+        # Optional process pool shared with other pipelines (parse_workers is its size);
+        # without one, each run starts and stops its own
+        self.pool = pool
+
+    def run(self, uploads, progress=None):
+        """
+        Ingest uploads (file objects with a .name, or file paths) and return a report dict.
+        progress(fraction, text) is called from the calling thread only, so it can
+        safely update Streamlit elements.
+        """
+        started = time.perf_counter()
+        report = {"files": 0, "skipped": 0, "pages": 0, "chunks": 0,
+                  "added": 0, "removed": 0, "unchanged": 0}
+        counters = {"embedded": 0, "inserted": 0}
+        # Seconds spent in each stage; parse/split are summed across worker processes
+        stage_seconds = {"parse": 0.0, "split": 0.0, "embed": 0.0, "insert": 0.0}
+        errors = []
+        embed_q = queue.Queue(maxsize=4)
+        insert_q = queue.Queue(maxsize=4)
+
+        def embed_worker():
+            while True:
+                batch = embed_q.get()
+                if batch is None:
+                    insert_q.put(None)
+                    return
+                if errors:
+                    continue
+                try:
+                    t0 = time.perf_counter()
+                    vectors = self.embeddings.embed_documents([text for _, text, _ in batch])
+                    stage_seconds["embed"] += time.perf_counter() - t0
+                    insert_q.put([
+                        {"_id": cid, "text": text, "embedding": vector, **metadata}
+                        for (cid, text, metadata), vector in zip(batch, vectors)
+                    ])
+                    counters["embedded"] += len(batch)
+                except Exception as e:
+                    errors.append(e)
+
+        def insert_worker():
+            pending = []
+            while True:
+                records = insert_q.get()
+                if records is not None:
+                    pending.extend(records)
+                if pending and not errors and (records is None or len(pending) >= self.insert_batch_size):
+                    try:
+                        t0 = time.perf_counter()
+                        self.store.add(pending)
+                        if self.lexical_index is not None:
+                            self.lexical_index.add_many((r["_id"], r["text"]) for r in pending)
+                        stage_seconds["insert"] += time.perf_counter() - t0
+                        counters["inserted"] += len(pending)
+                    except Exception as e:
+                        errors.append(e)
+                    pending = []
+                if records is None:
+                    return
+
+        # 1. Fingerprint uploads (streaming hash) and skip unchanged ones
+        small_jobs, large_jobs, opened = [], [], []
+        for upload in uploads:
+            name = getattr(upload, "name", None) or os.path.basename(upload)
+            if not name.endswith((".pdf", ".txt")):
+                continue
+            fileobj = open_source(upload)
+            if fileobj is not upload:
+                opened.append(fileobj)
+            fingerprint = file_fingerprint(fileobj)
+            entry = self.manifest.find_one({"_id": name})
+            if entry and entry["fingerprint"] == fingerprint:
+                report["skipped"] += 1
+                continue
+            if source_size(fileobj) > self.stream_threshold:
+                large_jobs.append((name, fileobj, fingerprint, entry))
+            else:
+                small_jobs.append((name, fileobj, fingerprint, entry))
+        total_jobs = len(small_jobs) + len(large_jobs)
+
+        def notify():
+            if not progress:
+                return
+            known = report["added"] or 1
+            fraction = (report["files"] / max(total_jobs, 1)
+                        + counters["embedded"] / known + counters["inserted"] / known) / 3
+            progress(min(fraction, 1.0), f"Parsed {report['files']}/{total_jobs} files · "
+                                         f"embedded {counters['embedded']} · stored {counters['inserted']} chunks")
+
+        finalize = []
+        buffer = []
+        last_notified = [time.perf_counter()]
+
+        def feed(name, fingerprint, entry, pages, chunks):
+            """2. Diff deterministic chunk IDs against the previous revision and queue new chunks"""
+            nonlocal buffer
+            assigner = ChunkIds(name)
+            old_ids = set(entry["chunk_ids"]) if entry else set()
+            ids = []
+            chars = 0
+            for text, metadata in chunks:
+                cid = assigner.next(text)
+                ids.append(cid)
+                chars += len(text)
+                report["chunks"] += 1
+                if cid in old_ids:
+                    report["unchanged"] += 1
+                    continue
+                report["added"] += 1
+                buffer.append((cid, text, metadata))
+                if len(buffer) >= self.embed_batch_size:
+                    # Blocks when the embedder falls behind, which bounds memory
+                    embed_q.put(buffer)
+                    buffer = []
+                if time.perf_counter() - last_notified[0] > _PROGRESS_INTERVAL:
+                    notify()
+                    last_notified[0] = time.perf_counter()
+            report["pages"] += pages() if callable(pages) else pages
+            report["files"] += 1
+            finalize.append((name, fingerprint, ids, list(old_ids - set(ids)), chars))
+
+        threads = [threading.Thread(target=embed_worker, daemon=True),
+                   threading.Thread(target=insert_worker, daemon=True)]
+        for t in threads:
+            t.start()
+
+        futures = {}
+        try:
+            if self.pool is not None:
+                workers = self.parse_workers
+                pool_context = contextlib.nullcontext(self.pool)
+            else:
+                # Spawned workers only import this module, not the Streamlit app or torch
+                workers = min(self.parse_workers, len(small_jobs)) or 1
+                pool_context = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            with pool_context as pool:
+                # Only a few files per worker are read into memory and queued at a time
+                waiting = iter(small_jobs)
+
+                def submit_more():
+                    while len(futures) < 2 * workers:
+                        job = next(waiting, None)
+                        if job is None:
+                            return
+                        name, fileobj, fingerprint, entry = job
+                        future = pool.submit(parse_and_split, name, read_all(fileobj), self.chunk_size, self.chunk_overlap)
+                        futures[future] = (name, fingerprint, entry)
+
+                def collect(timeout):
+                    done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name, fingerprint, entry = futures.pop(future)
+                        pages, chunks, seconds = future.result()
+                        for stage, value in seconds.items():
+                            stage_seconds[stage] += value
+                        feed(name, fingerprint, entry, pages, chunks)
+                    submit_more()
+
+                submit_more()
+
+                # Large files stream through the splitter while the pool parses small ones
+                splitter = _make_splitter(self.chunk_size, self.chunk_overlap)
+                for name, fileobj, fingerprint, entry in large_jobs:
+                    page_count = [0]
+
+                    def counted(pages):
+                        while True:
+                            t0 = time.perf_counter()
+                            page = next(pages, None)
+                            stage_seconds["parse"] += time.perf_counter() - t0
+                            if page is None:
+                                return
+                            page_count[0] += 1
+                            yield page
+
+                    def timed(chunks):
+                        # Time inside the splitter, minus the page reads it triggers
+                        while True:
+                            t0, parsed = time.perf_counter(), stage_seconds["parse"]
+                            chunk = next(chunks, None)
+                            stage_seconds["split"] += time.perf_counter() - t0 - (stage_seconds["parse"] - parsed)
+                            if chunk is None:
+                                return
+                            yield chunk
+
+                    pages = counted(iter_pages(name, fileobj, self.window_chars))
+                    feed(name, fingerprint, entry, lambda: page_count[0], timed(iter_chunks(pages, splitter)))
+
+                    # Hand finished small files on and keep the pool busy between large ones
+                    collect(0)
+
+                while futures:
+                    collect(_PROGRESS_INTERVAL)
+                    notify()
+        finally:
+            # Don't leave this run's queued files behind in a shared pool
+            for future in futures:
+                future.cancel()
+            if buffer and not errors:
+                embed_q.put(buffer)
+            embed_q.put(None)
+            while any(t.is_alive() for t in threads):
+                threads[-1].join(_PROGRESS_INTERVAL)
+                notify()
+            for fileobj in opened:
+                fileobj.close()
+
+        if errors:
+            # Manifests are untouched, so retrying the upload resumes cleanly
+            raise errors[0]
+
+        # 3. Drop chunks that disappeared and record the new file revisions
+        for name, fingerprint, ids, stale_ids, chars in finalize:
+            if stale_ids:
+                self.store.delete(stale_ids)
+                if self.lexical_index is not None:
+                    self.lexical_index.remove_many(stale_ids)
+                report["removed"] += len(stale_ids)
+            self.manifest.replace_one(
+                {"_id": name},
+                {"fingerprint": fingerprint, "chunk_ids": ids, "chunk_count": len(ids), "indexed_at": time.time()},
+                upsert=True,
+            )
+            if self.stats is not None:
+                self.stats.record_source(name, len(ids), chars)
+
+        elapsed = time.perf_counter() - started
+        report["seconds"] = round(elapsed, 2)
+        report["pages_per_second"] = round(report["pages"] / elapsed, 1) if elapsed else 0.0
+        report["chunks_per_second"] = round(report["chunks"] / elapsed, 1) if elapsed else 0.0
+        report["stage_seconds"] = {stage: round(value, 3) for stage, value in stage_seconds.items()}
+        if progress:
+            progress(1.0, "Done")
+        return report
@@ -0,0 +1,134 @@
+import os
+import shutil
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds between progress writes to the job record
+_PROGRESS_WRITE_INTERVAL = 1.0
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IngestJobQueue:
+    """
+    Background ingestion jobs.
+
+    submit() copies the uploads into a spool directory (so the job survives the
+    Streamlit script rerunning or the tab closing), stores a job record and returns
+    its ID immediately. A small thread pool runs ingest(paths, progress, **options) and keeps
+    the record up to date: status (queued/running/done/failed), progress,
+    the pipeline report (counts and timings) and the error, if any.
+    """
+
+    def __init__(self, collection, ingest, spool_dir, workers=2):
+        self.collection = collection
+        self.ingest = ingest
+        self.spool_dir = spool_dir
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-job")
+        self._host = socket.gethostname()
+        try:
+            self.collection.create_index("created_at")
+        except Exception:
+            pass
+
+    def submit(self, uploads, **options):
+        """
+        Spool uploads (file objects with a .name, or paths) and queue them; returns the job ID.
+        options are stored with the job and passed to ingest().
+        """
+        job_id = uuid.uuid4().hex
+        directory = os.path.join(self.spool_dir, job_id)
+        os.makedirs(directory)
+        names = []
+        for upload in uploads:
+            name = os.path.basename(getattr(upload, "name", None) or upload)
+            if name in names:
+                continue
+            target = os.path.join(directory, name)
+            if isinstance(upload, (str, os.PathLike)):
+                shutil.copyfile(upload, target)
+            else:
+                upload.seek(0)
+                with open(target, "wb") as f:
+                    shutil.copyfileobj(upload, f, 1 << 20)
+            names.append(name)
+
+        self.collection.replace_one(
+            {"_id": job_id},
+            {"status": "queued", "files": names, "options": options, "spool": directory, "host": self._host, "pid": os.getpid(),
+             "created_at": time.time(), "started_at": None, "finished_at": None,
+             "progress": 0.0, "progress_text": "Queued", "report": None, "message": None, "error": None},
+            upsert=True,
+        )
+        self._pool.submit(self._run, job_id, directory, names, options)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        self.collection.update_one({"_id": job_id}, {"$set": fields})
+
+    def _run(self, job_id, directory, names, options):
+        self._update(job_id, status="running", started_at=time.time(), progress_text="Starting")
+        last_write = [0.0]
+
+        def progress(fraction, text):
+            if time.time() - last_write[0] >= _PROGRESS_WRITE_INTERVAL:
+                last_write[0] = time.time()
+                self._update(job_id, progress=round(fraction, 3), progress_text=text)
+
+        try:
+            report, message = self.ingest([os.path.join(directory, name) for name in names], progress, **options)
+            self._update(job_id, status="done", finished_at=time.time(), progress=1.0, progress_text="Done",
+                         report=report, message=message)
+        except Exception as e:
+            self._update(job_id, status="failed", finished_at=time.time(), progress_text="Failed", error=str(e))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def resume(self):
+        """
+        Re-queue jobs left queued/running by a process on this host that has exited
+        (ingestion is idempotent, so a half-finished job simply runs again). Each job is
+        claimed atomically, so processes starting together never both run it. Jobs
+        whose spooled files are gone are marked failed. Returns the number re-queued.
+        """
+        resumed = 0
+        for job in self.collection.find({"status": {"$in": list(ACTIVE_STATUSES)}}):
+            pid = job.get("pid")
+            # Spools are only visible on their own host, and a live owner is still working on the job
+            if job.get("host") != self._host or pid == os.getpid() or (pid and _pid_alive(pid)):
+                continue
+            # Several processes may start at once: only the one whose update matches the old owner runs the job
+            claimed = self.collection.find_one_and_update(
+                {"_id": job["_id"], "pid": pid, "status": job["status"]},
+                {"$set": {"status": "queued", "pid": os.getpid(), "progress": 0.0, "progress_text": "Re-queued"}},
+            )
+            if claimed is None:
+                continue
+            if not os.path.isdir(job["spool"]):
+                self._update(job["_id"], status="failed", finished_at=time.time(), error="Interrupted; upload again")
+                continue
+            self._pool.submit(self._run, job["_id"], job["spool"], job["files"], job.get("options", {}))
+            resumed += 1
+        return resumed
+
+    def get(self, job_id):
+        return self.collection.find_one({"_id": job_id})
+
+    def recent(self, limit=20):
+        """Latest jobs first"""
+        return list(self.collection.find({}).sort("created_at", -1).limit(limit))
+
+    def active(self):
+        return list(self.collection.find({"status": {"$in": list(ACTIVE_STATUSES)}}))
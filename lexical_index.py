@@ -0,0 +1,157 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Keeps part numbers, error codes and versions ("E-1042", "v2.5", "SKU_778") as single tokens
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+_STOP_WORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "that the this to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercased tokens; compound tokens are also indexed by their parts"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOP_WORDS:
+            continue
+        tokens.append(token)
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p and p not in _STOP_WORDS)
+    return tokens
+
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring"""
+
+    def __init__(self, k1=1.5, b=0.75, max_df=0.5):
+        self.k1 = k1
+        self.b = b
+        # Terms in more than this fraction of chunks add little score but cost a full
+        # postings scan, so they are skipped when the query has rarer terms
+        self.max_df = max_df
+        self._postings = defaultdict(dict)   # term -> {doc_id: term frequency}
+        self._doc_terms = {}                 # doc_id -> {term: tf}, needed for removal
+        self._doc_len = {}
+        self._total_len = 0
+        # Bumped by every change, so sync() can tell it raced with a writer
+        self._writes = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def add(self, doc_id, text):
+        with self._lock:
+            if doc_id in self._doc_len:
+                self.remove(doc_id)
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                self._postings[term][doc_id] = tf
+            self._doc_terms[doc_id] = dict(counts)
+            length = sum(counts.values())
+            self._doc_len[doc_id] = length
+            self._total_len += length
+            self._writes += 1
+
+    def add_many(self, items):
+        """items: iterable of (doc_id, text)"""
+        with self._lock:
+            for doc_id, text in items:
+                self.add(doc_id, text)
+
+    def remove(self, doc_id):
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_len -= self._doc_len.pop(doc_id)
+            self._writes += 1
+
+    def remove_many(self, doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                self.remove(doc_id)
+
+    def sync(self, items):
+        """
+        Make the index hold exactly these (doc_id, text) items. items may be a slow
+        database cursor, so the new index is built without holding the lock and
+        swapped in at the end; searches keep using the old one meanwhile. Chunk IDs
+        are content hashes, so only new IDs are tokenized.
+        Returns (added, removed), or None if the index was changed during the build
+        (nothing is swapped in; sync again).
+        """
+        with self._lock:
+            known = dict(self._doc_terms)
+            writes = self._writes
+        postings = defaultdict(dict)
+        doc_terms, doc_len = {}, {}
+        total_len = added = 0
+        for doc_id, text in items:
+            if doc_id in doc_terms:
+                continue
+            terms = known.get(doc_id)
+            if terms is None:
+                terms = dict(Counter(tokenize(text)))
+                added += 1
+            for term, tf in terms.items():
+                postings[term][doc_id] = tf
+            doc_terms[doc_id] = terms
+            doc_len[doc_id] = sum(terms.values())
+            total_len += doc_len[doc_id]
+        with self._lock:
+            if self._writes != writes:
+                return None
+            self._postings, self._doc_terms, self._doc_len, self._total_len = postings, doc_terms, doc_len, total_len
+            self._writes += 1
+        return added, len(known.keys() - doc_terms.keys())
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._total_len = 0
+            self._writes += 1
+
+    def search(self, query, k=10):
+        """Return [(doc_id, score)] for the k best BM25 matches"""
+        with self._lock:
+            n = len(self._doc_len)
+            if not n:
+                return []
+            avg_len = self._total_len / n
+            scores = defaultdict(float)
+            terms = [(term, self._postings[term]) for term in set(tokenize(query)) if term in self._postings]
+            rare = [(term, postings) for term, postings in terms if len(postings) <= self.max_df * n]
+            for term, postings in rare or terms:
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings, weights=None, rrf_k=60):
+    """
+    Fuse ranked lists of ids: score(id) = sum(weight / (rrf_k + rank)).
+    Returns ids sorted by fused score.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] += weight / (rrf_k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
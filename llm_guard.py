@@ -0,0 +1,382 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+from langchain_core.exceptions import ModelAPIError, ModelConnectionError, ModelRateLimitError, ModelTimeoutError
+
+from context import estimate_tokens
+from telemetry import percentile
+
+# Call priorities: interactive chat goes ahead of batch evaluation and admin jobs
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+_RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class LLMUnavailable(RuntimeError):
+    """The LLM call was not made or gave up: circuit open, queue timeout or retries exhausted"""
+
+
+def is_retryable(error):
+    """Quota, overload, server and network errors; not bad requests or auth failures"""
+    while error is not None:
+        if isinstance(error, (ModelRateLimitError, ModelAPIError, ModelConnectionError, ModelTimeoutError,
+                              TimeoutError, ConnectionError)):
+            return True
+        if getattr(error, "code", None) in _RETRYABLE_STATUS or getattr(error, "status_code", None) in _RETRYABLE_STATUS:
+            return True
+        error = error.__cause__
+    return False
+
+
+class TokenBucketLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets shared by every LLM call in the process.
+
+    Both buckets refill continuously at quota/60 per second. A call takes one
+    request and its estimated tokens, waiting until both are available. Batch
+    calls never go ahead while an interactive call is waiting and leave `reserve`
+    of each bucket for interactive traffic. A call may overdraw the token bucket
+    when it uses more than estimated (refund() with a negative amount).
+
+    The buckets live in process memory: every process running the app (Streamlit,
+    server.py, evaluation scripts) gets the full rpm/tpm, so split the project's
+    quota between them.
+    """
+
+    def __init__(self, rpm, tpm, reserve=0.2):
+        self.capacity = {"requests": float(rpm), "tokens": float(tpm)}
+        self.rate = {name: value / 60.0 for name, value in self.capacity.items()}
+        self.level = dict(self.capacity)
+        self.reserve = reserve
+        self.waiting = dict.fromkeys(PRIORITIES, 0)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        for name in self.level:
+            self.level[name] = min(self.capacity[name], self.level[name] + elapsed * self.rate[name])
+
+    def _try_take(self, tokens, priority):
+        """Take one request and `tokens` if allowed and return 0, else the seconds to wait before trying again"""
+        self._refill()
+        floor = 0.0
+        if priority != INTERACTIVE:
+            if self.waiting[INTERACTIVE]:
+                return 0.05
+            floor = self.reserve
+        # A call larger than the whole bucket still runs once the bucket is full
+        tokens = min(tokens, self.capacity["tokens"] * (1 - floor))
+        need = {"requests": 1.0, "tokens": tokens}
+        waits = [
+            (need[name] + floor * self.capacity[name] - self.level[name]) / self.rate[name]
+            for name in need
+            if self.level[name] - need[name] < floor * self.capacity[name]
+        ]
+        if waits:
+            return max(waits)
+        for name in need:
+            self.level[name] -= need[name]
+        return 0.0
+
+    def acquire(self, tokens, priority=INTERACTIVE, timeout=None):
+        """Block until the call may go ahead; returns seconds waited. Raises LLMUnavailable after timeout."""
+        started = time.monotonic()
+        with self._cond:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    wait = self._try_take(tokens, priority)
+                    if not wait:
+                        return time.monotonic() - started
+                    waited = time.monotonic() - started
+                    if timeout is not None and waited + wait > timeout:
+                        raise LLMUnavailable("too many requests queued")
+                    self._cond.wait(wait)
+            finally:
+                self.waiting[priority] -= 1
+                self._cond.notify_all()
+
+    async def aacquire(self, tokens, priority=INTERACTIVE, timeout=None):
+        """acquire() for coroutines: sleeps on the event loop instead of blocking it"""
+        started = time.monotonic()
+        with self._cond:
+            self.waiting[priority] += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(tokens, priority)
+                if not wait:
+                    return time.monotonic() - started
+                waited = time.monotonic() - started
+                if timeout is not None and waited + wait > timeout:
+                    raise LLMUnavailable("too many requests queued")
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self.waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def refund(self, tokens):
+        """Return unused reserved tokens (negative: charge tokens used beyond the estimate)"""
+        with self._cond:
+            self._refill()
+            self.level["tokens"] = min(self.capacity["tokens"], self.level["tokens"] + tokens)
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            self._refill()
+            return {
+                "queued": dict(self.waiting),
+                "requests_available": round(self.level["requests"], 1),
+                "tokens_available": round(self.level["tokens"]),
+                "rpm": self.capacity["requests"],
+                "tpm": self.capacity["tokens"],
+            }
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures. While open,
+    calls are refused at once. After `reset_seconds` a single trial call is let
+    through (half-open); its success closes the circuit, its failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def cancel_trial(self):
+        """The admitted trial call never reached the service (e.g. timed out in the queue)"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class LLMGuard:
+    """
+    Admission control around LLM calls: rate limiting (TokenBucketLimiter), retries
+    of retryable errors with exponential backoff and full jitter, and a circuit
+    breaker. Every path that cannot produce an answer raises LLMUnavailable, which
+    callers turn into a fallback reply.
+
+    `tokens` is the estimated prompt size; `output_tokens` more are reserved per
+    call and settled against the actual answer length afterwards. Streams are
+    retried only until the first chunk arrives; a later error is re-raised as is.
+    """
+
+    def __init__(self, limiter, breaker, max_retries=3, base_delay=1.0, max_delay=20.0,
+                 queue_timeout=None, output_tokens=512):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # {priority: seconds a call may wait in the queue (None: no limit)}
+        self.queue_timeout = queue_timeout or {}
+        self.output_tokens = output_tokens
+        self.counters = {"calls": 0, "retries": 0, "rejected": 0, "failed": 0}
+        self._waits = {priority: deque(maxlen=1000) for priority in PRIORITIES}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise LLMUnavailable("paused after repeated failures")
+
+    def _admit(self, tokens, priority, trace):
+        self._check_breaker()
+        try:
+            waited = self.limiter.acquire(tokens + self.output_tokens, priority, self.queue_timeout.get(priority))
+        except LLMUnavailable:
+            self.breaker.cancel_trial()
+            self._count("rejected")
+            raise
+        self._admitted(waited, priority, trace)
+
+    async def _aadmit(self, tokens, priority, trace):
+        self._check_breaker()
+        try:
+            waited = await self.limiter.aacquire(tokens + self.output_tokens, priority, self.queue_timeout.get(priority))
+        except LLMUnavailable:
+            self.breaker.cancel_trial()
+            self._count("rejected")
+            raise
+        self._admitted(waited, priority, trace)
+
+    def _admitted(self, waited, priority, trace):
+        with self._lock:
+            self.counters["calls"] += 1
+            self._waits[priority].append(waited)
+        if trace is not None:
+            trace.add("llm_queue", waited)
+
+    def _failed(self, error, attempt):
+        """Record a failed attempt; raises unless it should be retried"""
+        if not is_retryable(error):
+            # The service answered (bad request, auth...): not an availability problem
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_retries or self.breaker.state != "closed":
+            self._count("failed")
+            raise LLMUnavailable(f"overloaded: {type(error).__name__}") from error
+        self._count("retries")
+
+    def _failed_midstream(self, error):
+        """A stream broke after its first chunk: too late to retry, but it still counts against the service"""
+        if is_retryable(error):
+            self.breaker.record_failure()
+            self._count("failed")
+
+    def _settle(self, text):
+        self.limiter.refund(self.output_tokens - estimate_tokens(text))
+
+    def call(self, fn, tokens, priority=INTERACTIVE, trace=None):
+        """Run fn() (one LLM request) under rate limiting, retries and the circuit breaker"""
+        for attempt in range(self.max_retries + 1):
+            self._admit(tokens, priority, trace)
+            try:
+                result = fn()
+            except Exception as e:
+                self.limiter.refund(self.output_tokens)
+                self._failed(e, attempt)
+                time.sleep(self._backoff(attempt))
+                continue
+            self.breaker.record_success()
+            self._settle(result if isinstance(result, str) else "")
+            return result
+
+    async def acall(self, fn, tokens, priority=INTERACTIVE, trace=None):
+        """call() for a coroutine function"""
+        for attempt in range(self.max_retries + 1):
+            await self._aadmit(tokens, priority, trace)
+            try:
+                result = await fn()
+            except Exception as e:
+                self.limiter.refund(self.output_tokens)
+                self._failed(e, attempt)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self.breaker.record_success()
+            self._settle(result if isinstance(result, str) else "")
+            return result
+
+    def stream(self, open_stream, tokens, priority=INTERACTIVE, trace=None):
+        """Generator over open_stream()'s chunks; LLMUnavailable is raised before the first chunk, if at all"""
+        for attempt in range(self.max_retries + 1):
+            self._admit(tokens, priority, trace)
+            try:
+                chunks = open_stream()
+                first = next(chunks, "")
+            except Exception as e:
+                self.limiter.refund(self.output_tokens)
+                self._failed(e, attempt)
+                time.sleep(self._backoff(attempt))
+                continue
+            self.breaker.record_success()
+            parts = [first]
+            try:
+                yield first
+                for chunk in chunks:
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                self._failed_midstream(e)
+                raise
+            finally:
+                # Also settles when the consumer stops reading early
+                self._settle("".join(parts))
+            return
+
+    async def astream(self, open_stream, tokens, priority=INTERACTIVE, trace=None):
+        """Async generator counterpart of stream()"""
+        for attempt in range(self.max_retries + 1):
+            await self._aadmit(tokens, priority, trace)
+            try:
+                chunks = open_stream()
+                first = await anext(chunks, "")
+            except Exception as e:
+                self.limiter.refund(self.output_tokens)
+                self._failed(e, attempt)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self.breaker.record_success()
+            parts = [first]
+            try:
+                yield first
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                self._failed_midstream(e)
+                raise
+            finally:
+                # Also settles when the consumer stops reading early
+                self._settle("".join(parts))
+            return
+
+    def stats(self):
+        """Counters, circuit state, queue depth and queue wait percentiles per priority"""
+        with self._lock:
+            counters = dict(self.counters)
+            waits = {priority: sorted(values) for priority, values in self._waits.items()}
+        return {
+            **counters,
+            "circuit": self.breaker.state,
+            **self.limiter.snapshot(),
+            "wait_ms": {
+                priority: {
+                    "p50": round(percentile(ordered, 0.50) * 1000, 1),
+                    "p95": round(percentile(ordered, 0.95) * 1000, 1),
+                    "max": round(ordered[-1] * 1000, 1),
+                }
+                for priority, ordered in waits.items() if ordered
+            },
+        }
@@ -0,0 +1,116 @@
+import codecs
+import hashlib
+import io
+import mmap
+import os
+
+# Bytes hashed / decoded per read when streaming an upload
+_READ_BLOCK = 1 << 20
+
+
+def open_source(source):
+    """
+    Return a seekable binary file object for an upload.
+    In-memory uploads (Streamlit's UploadedFile is a BytesIO) are used as-is;
+    paths are memory-mapped so the OS pages them in and out on demand.
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                # mmap cannot map empty files
+                return io.BytesIO()
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return source
+
+
+def source_size(fileobj):
+    if isinstance(fileobj, mmap.mmap):
+        return len(fileobj)
+    size = getattr(fileobj, "size", None)
+    if isinstance(size, int):
+        return size
+    position = fileobj.tell()
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(position)
+    return size
+
+
+def iter_blocks(fileobj, block_size=_READ_BLOCK):
+    """Yield the file's bytes block by block without materializing the whole file"""
+    if hasattr(fileobj, "getbuffer"):
+        view = fileobj.getbuffer()
+        try:
+            for start in range(0, len(view), block_size):
+                yield view[start:start + block_size]
+        finally:
+            view.release()
+        return
+    fileobj.seek(0)
+    while True:
+        block = fileobj.read(block_size)
+        if not block:
+            break
+        yield block
+
+
+def file_fingerprint(fileobj):
+    """sha256 of the file contents, computed in streaming fashion"""
+    digest = hashlib.sha256()
+    for block in iter_blocks(fileobj):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def read_all(fileobj):
+    fileobj.seek(0)
+    return fileobj.read()
+
+
+def _iter_text_windows(fileobj, window_chars):
+    """Decode UTF-8 incrementally and yield windows of about window_chars, cut at whitespace"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    offset = 0
+    for block in iter_blocks(fileobj):
+        pending += decoder.decode(bytes(block))
+        while len(pending) >= window_chars:
+            # Prefer paragraph, then line, then word boundaries so the splitter sees whole units
+            cut = -1
+            for sep in ("\n\n", "\n", " "):
+                cut = pending.rfind(sep, window_chars // 2, window_chars)
+                if cut != -1:
+                    cut += len(sep)
+                    break
+            if cut == -1:
+                cut = window_chars
+            yield pending[:cut], offset
+            offset += cut
+            pending = pending[cut:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending, offset
+
+
+def iter_pages(name, fileobj, window_chars=1_000_000):
+    """
+    Lazily yield (text, metadata) for a PDF/TXT upload.
+    PDFs are read page by page from the stream; text files are decoded in
+    windows of window_chars, so memory stays bounded regardless of file size.
+    """
+    if name.endswith(".pdf"):
+        from pypdf import PdfReader
+        fileobj.seek(0)
+        reader = PdfReader(fileobj)
+        for i, page in enumerate(reader.pages):
+            yield page.extract_text() or "", {"source": name, "page": i}
+    else:
+        for text, offset in _iter_text_windows(fileobj, window_chars):
+            yield text, {"source": name, "offset": offset}
+
+
+def iter_chunks(pages, splitter):
+    """Split pages one at a time, yielding (chunk text, metadata)"""
+    for text, metadata in pages:
+        for chunk in splitter.create_documents([text], metadatas=[metadata]):
+            yield chunk.page_content, chunk.metadata
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode(obj):
+    if set(obj) == {"$date"}:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        value = doc.get(key)
+        if isinstance(condition, dict) and "$in" in condition:
+            if value not in condition["$in"]:
+                return False
+        elif isinstance(condition, dict) and "$lt" in condition:
+            if value is None or not value < condition["$lt"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Result:
+    def __init__(self, deleted_count=0):
+        self.deleted_count = deleted_count
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction=1):
+        self._docs.sort(key=lambda d: d.get(key), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+
+class LocalCollection:
+    """
+    In-process stand-in for the subset of pymongo's Collection API this app uses
+    (find/find_one by equality, $in and $lt, inserts, replace/upsert, $inc/$set updates,
+    find-and-modify, deletes, counts). With a path, every write is appended to a JSON-lines log
+    that is replayed on startup.
+    """
+
+    def __init__(self, path=None):
+        self._docs = {}
+        self._lock = threading.Lock()
+        self._log = None
+        if path:
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        op = json.loads(line, object_hook=_decode)
+                        if "put" in op:
+                            self._docs[op["put"]["_id"]] = op["put"]
+                        else:
+                            self._docs.pop(op["del"], None)
+            self._log = open(path, "a", encoding="utf-8")
+
+    def _write(self, op):
+        if self._log:
+            self._log.write(json.dumps(op, default=_encode) + "\n")
+            self._log.flush()
+
+    def _put(self, doc):
+        self._docs[doc["_id"]] = doc
+        self._write({"put": doc})
+
+    def find_one(self, query=None, projection=None):
+        for doc in self.find(query or {}):
+            return doc
+        return None
+
+    def find(self, query=None, projection=None):
+        query = query or {}
+        with self._lock:
+            if set(query) == {"_id"} and not isinstance(query["_id"], dict):
+                doc = self._docs.get(query["_id"])
+                docs = [doc] if doc else []
+            else:
+                docs = [d for d in self._docs.values() if _matches(d, query)]
+            return _Cursor([dict(d) for d in docs])
+
+    def insert_one(self, record):
+        with self._lock:
+            if record["_id"] in self._docs:
+                raise DuplicateKeyError(f"duplicate key: {record['_id']}")
+            self._put(dict(record))
+
+    def insert_many(self, records, ordered=True):
+        with self._lock:
+            for record in records:
+                # Duplicate keys are skipped, like an unordered insert_many
+                if record["_id"] not in self._docs:
+                    self._put(dict(record))
+
+    def replace_one(self, query, doc, upsert=False):
+        with self._lock:
+            existing = [d for d in self._docs.values() if _matches(d, query)]
+            if existing or upsert:
+                _id = existing[0]["_id"] if existing else query["_id"]
+                self._put({**doc, "_id": _id})
+
+    def update_one(self, query, update, upsert=False):
+        self.find_one_and_update(query, update, upsert=upsert)
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=ReturnDocument.BEFORE):
+        with self._lock:
+            existing = next((d for d in self._docs.values() if _matches(d, query)), None)
+            if existing is None and not upsert:
+                return None
+            before = dict(existing) if existing else None
+            doc = dict(existing) if existing else {k: v for k, v in query.items() if not isinstance(v, dict)}
+            for key, value in update.get("$set", {}).items():
+                doc[key] = value
+            for key, value in update.get("$inc", {}).items():
+                doc[key] = doc.get(key, 0) + value
+            self._put(doc)
+            return dict(doc) if return_document == ReturnDocument.AFTER else before
+
+    def find_one_and_delete(self, query):
+        with self._lock:
+            existing = next((d for d in self._docs.values() if _matches(d, query)), None)
+            if existing is None:
+                return None
+            del self._docs[existing["_id"]]
+            self._write({"del": existing["_id"]})
+            return dict(existing)
+
+    def delete_many(self, query):
+        with self._lock:
+            doomed = [_id for _id, d in self._docs.items() if _matches(d, query)]
+            for _id in doomed:
+                del self._docs[_id]
+                self._write({"del": _id})
+            return _Result(len(doomed))
+
+    def count_documents(self, query):
+        return len(list(self.find(query)))
+
+    def estimated_document_count(self):
+        return len(self._docs)
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+
+class LocalDatabase:
+    """Dict-like database of LocalCollections, persisted under directory when given"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._collections = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            path = os.path.join(self.directory, f"{name}.jsonl") if self.directory else None
+            self._collections[name] = LocalCollection(path)
+        return self._collections[name]
@@ -0,0 +1,37 @@
+"""
+Switch the Atlas chunk collection to the storage format in VECTOR_STORAGE.
+
+1. Creates vector_index, or replaces its definition, to match the format: euclidean
+   (Hamming) similarity for binary, cosine otherwise, with source as a filter field.
+2. Re-encodes chunks still stored as float arrays into the compact format.
+
+Atlas rebuilds the index in the background, so searches may miss chunks until it is
+ready; run this while the corpus is quiet. Chunks ingested afterwards are written in
+the new format by the app (with the same VECTOR_STORAGE).
+
+Usage:
+    VECTOR_STORAGE=int8 python migrate_vector_storage.py [--skip-index] [--skip-convert]
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+from mongo_clients import get_client
+from settings import get_setting
+from vector_stores import AtlasVectorStore
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move chunk embeddings to the VECTOR_STORAGE format")
+    parser.add_argument("--skip-index", action="store_true", help="leave the vector search index as it is")
+    parser.add_argument("--skip-convert", action="store_true", help="do not re-encode existing chunks")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    load_dotenv()
+    storage = get_setting("VECTOR_STORAGE", "float").lower()
+    store = AtlasVectorStore(get_client(get_setting("MONGODB_URI"))["chatbot_db"]["documents"], storage=storage)
+    if not args.skip_index:
+        action = store.apply_search_index(int(get_setting("EMBEDDING_DIM", 384)))
+        print(f"{action} {store.index_name} for {storage} vectors")
+    if not args.skip_convert:
+        print(f"Re-encoded {store.convert_storage(args.batch_size)} chunks as {storage}")
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+
+from settings import get_setting
+
+
+class DatabaseUnavailable(RuntimeError):
+    """MongoDB cannot be reached; raised at once instead of waiting on timeouts"""
+
+    def __init__(self, message="The database is unreachable right now, please try again shortly"):
+        super().__init__(message)
+
+
+def _describe(error):
+    # Server-selection errors append the whole topology description; the start is what matters
+    text = str(error)
+    return f"{type(error).__name__}: {text[:200] + '...' if len(text) > 200 else text}"
+
+
+def client_options():
+    """
+    Pool and timeout settings for every client. The defaults fail in seconds
+    rather than pymongo's 30 s server selection, so a database outage does not
+    hold Streamlit threads.
+    """
+    return {
+        "appname": "rag-chatbot",
+        "maxPoolSize": int(get_setting("MONGO_MAX_POOL_SIZE", 50)),
+        "minPoolSize": int(get_setting("MONGO_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": int(get_setting("MONGO_MAX_IDLE_TIME_MS", 5 * 60 * 1000)),
+        # Waiting for a free pooled connection
+        "waitQueueTimeoutMS": int(get_setting("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000)),
+        "serverSelectionTimeoutMS": int(get_setting("MONGO_SERVER_SELECTION_TIMEOUT_MS", 3000)),
+        "connectTimeoutMS": int(get_setting("MONGO_CONNECT_TIMEOUT_MS", 3000)),
+        # Longest single network read; large ingest batches and index builds stay under it
+        "socketTimeoutMS": int(get_setting("MONGO_SOCKET_TIMEOUT_MS", 20000)),
+        "retryReads": True,
+        "retryWrites": True,
+    }
+
+
+_clients = {}
+# An AsyncMongoClient is bound to the event loop that first uses it: one per (loop, uri),
+# forgotten with the loop
+_async_clients = weakref.WeakKeyDictionary()
+_probes = {}
+_lock = threading.Lock()
+
+
+def get_client(uri, asynchronous=False):
+    """
+    The process-wide MongoClient for uri, created on first use. With asynchronous=True,
+    the AsyncMongoClient of the running event loop (call it from a coroutine).
+    """
+    if asynchronous:
+        loop = asyncio.get_running_loop()
+        with _lock:
+            clients = _async_clients.setdefault(loop, {})
+            if uri not in clients:
+                from pymongo import AsyncMongoClient
+                clients[uri] = AsyncMongoClient(uri, **client_options())
+            return clients[uri]
+    with _lock:
+        if uri not in _clients:
+            from pymongo import MongoClient
+            _clients[uri] = MongoClient(uri, **client_options())
+        return _clients[uri]
+
+
+async def close_async_client(uri):
+    """Close the running loop's AsyncMongoClient for uri, if any (before a short-lived loop ends)"""
+    with _lock:
+        client = _async_clients.get(asyncio.get_running_loop(), {}).pop(uri, None)
+    if client is not None:
+        await client.close()
+
+
+def get_health_probe(uri):
+    """The process-wide, already running HealthProbe for uri"""
+    with _lock:
+        if uri not in _probes:
+            _probes[uri] = HealthProbe(
+                uri,
+                interval=float(get_setting("MONGO_HEALTH_INTERVAL", 15)),
+                retry_interval=float(get_setting("MONGO_HEALTH_RETRY_INTERVAL", 2)),
+            )
+            _probes[uri].start()
+        return _probes[uri]
+
+
+class HealthProbe:
+    """
+    Pings MongoDB from a background thread and keeps the latest result plus a
+    short history for the admin logs.
+
+    A reachable server is pinged every `interval` seconds, an unreachable one
+    every `retry_interval`. While the last result is a failure, ensure_available()
+    raises DatabaseUnavailable immediately, so requests do not each wait out the
+    server-selection timeout. report_failure() lets an operation that hit a
+    network error mark the database down before the next ping.
+    """
+
+    def __init__(self, uri, interval=15, retry_interval=2, history=100):
+        self.uri = uri
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self._history = deque(maxlen=history)
+        self._last = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="mongo-health", daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            ok = self.check()["ok"]
+            self._wake.wait(self.interval if ok else self.retry_interval)
+            self._wake.clear()
+
+    def check(self):
+        """Ping now and record the result"""
+        t0 = time.perf_counter()
+        try:
+            get_client(self.uri).admin.command("ping")
+            result = {"ok": True, "latency_ms": round((time.perf_counter() - t0) * 1000, 1), "error": None}
+        except Exception as e:
+            result = {"ok": False, "latency_ms": None, "error": _describe(e)}
+        return self._record(result)
+
+    def _record(self, result):
+        result["checked_at"] = time.time()
+        with self._lock:
+            self._last = result
+            self._history.append(result)
+        return result
+
+    def report_failure(self, error):
+        """Mark the database down after a failed operation and re-check soon"""
+        self._record({"ok": False, "latency_ms": None, "error": _describe(error)})
+        self._wake.set()
+
+    @property
+    def healthy(self):
+        """False only after a failed check; unknown counts as healthy"""
+        with self._lock:
+            return self._last is None or self._last["ok"]
+
+    def status(self):
+        with self._lock:
+            return dict(self._last) if self._last else {"ok": None, "latency_ms": None, "error": None, "checked_at": None}
+
+    def recent(self, n=20):
+        """Latest results first"""
+        with self._lock:
+            return [dict(r) for r in reversed(self._history)][:n]
+
+    def ensure_available(self):
+        with self._lock:
+            last = self._last
+        if last is not None and not last["ok"]:
+            raise DatabaseUnavailable()
@@ -0,0 +1,91 @@
+import os
+import platform
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ONNX_REPO = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def default_onnx_file():
+    """Pre-quantized int8 graph published with the model, matched to this CPU"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    # AVX2 kernels run on every x86-64 server CPU of the last decade
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def available_cores():
+    """CPUs this process may run on (respects taskset/cgroup pinning)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    all-MiniLM-L6-v2 on ONNX Runtime using the int8-quantized graph.
+
+    Produces the same vectors as the sentence-transformers model (mean pooling over
+    the attention mask, then L2 normalization) within quantization error. Documents
+    are sorted by length and embedded in fixed-size batches so padding stays small.
+    The model files come from model_dir when given, else from the Hugging Face Hub cache.
+    """
+
+    def __init__(self, model_dir=None, onnx_file=None, threads=None, batch_size=32, max_length=256):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        onnx_file = onnx_file or default_onnx_file()
+        if model_dir:
+            tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+            model_path = os.path.join(model_dir, onnx_file)
+        else:
+            from huggingface_hub import hf_hub_download
+            tokenizer_path = hf_hub_download(ONNX_REPO, "tokenizer.json")
+            model_path = hf_hub_download(ONNX_REPO, onnx_file)
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        # One pool of threads, one per core we are allowed to use; no nested parallelism
+        options.intra_op_num_threads = threads or available_cores()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalization (as sentence-transformers does)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0].tolist()
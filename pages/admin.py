@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from auth import logout, check_credentials
-from rag_engine import RAGChatbot
+from rag_engine import warm_up
 
 load_dotenv()
 
@@ -135,15 +135,20 @@ st.markdown(f"""
     </div>
 """, unsafe_allow_html=True)
 
-# Initialize Bot
-if "bot" not in st.session_state:
-    st.session_state.bot = None
+# Initialize Bot (shared with the chat page, one per server process)
+bot = None
+try:
+    bot = warm_up()
+except Exception as e:
+    st.error(f"Init Error: {e}")
 
-if not st.session_state.bot:
-    try: 
-        st.session_state.bot = RAGChatbot()
-    except Exception as e: 
-        st.error(f"Init Error: {e}")
+# Corpus stats are read from a small maintained collection, not counted on every rerun
+corpus = None
+if bot:
+    try:
+        corpus = bot.get_corpus_stats()
+    except Exception:
+        pass
 
 # Layout
 col1, col2 = st.columns([2, 1])
@@ -162,34 +167,146 @@ with col1:
             if not uploaded_files:
                 st.warning("Please upload files first")
             else:
-                with st.spinner("Indexing documents into MongoDB Atlas..."):
-                    try:
-                        res = st.session_state.bot.process_files(uploaded_files)
-                        st.success(res)
-                        time.sleep(2)
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Index Error: {e}")
+                try:
+                    job_id = bot.submit_ingest_job(uploaded_files)
+                    st.success(f"Queued indexing job {job_id[:8]} ({len(uploaded_files)} files)")
+                except Exception as e:
+                    st.error(f"Index Error: {e}")
     
     with c2:
         if st.button("🗑️ Wipe Database", type="secondary"):
             try:
-                msg = st.session_state.bot.clear_all_documents()
+                msg = bot.clear_all_documents()
                 st.success(msg)
                 time.sleep(2)
                 st.rerun()
             except Exception as e:
                 st.error(f"Clear Error: {e}")
 
+    if bot:
+        # Job status is polled (fragment reruns only) while anything is queued or running
+        @st.fragment(run_every=2 if bot.ingest_jobs.active() else None)
+        def ingest_jobs_panel():
+            jobs = bot.ingest_jobs.recent(10)
+            active = {job["_id"] for job in jobs if job["status"] in ("queued", "running")}
+            # Refresh the whole page (corpus stats, polling interval) once a job we saw running finishes
+            finished = st.session_state.get("active_ingest_jobs", set()) - active
+            st.session_state.active_ingest_jobs = active
+            if finished:
+                st.rerun(scope="app")
+
+            for job in jobs:
+                files = ", ".join(job["files"][:3]) + (f" +{len(job['files']) - 3}" if len(job["files"]) > 3 else "")
+                created = time.strftime("%H:%M:%S", time.localtime(job["created_at"]))
+                if job["status"] in ("queued", "running"):
+                    st.progress(job["progress"], text=f"⏳ [{created}] {files} · {job['progress_text']}")
+                elif job["status"] == "done":
+                    st.success(f"[{created}] {files}: {job['message']}", icon="✅")
+                else:
+                    st.error(f"[{created}] {files}: {job['error']}", icon="⚠️")
+
+        with st.expander("⚙️ Indexing jobs", expanded=True):
+            ingest_jobs_panel()
+
+    sources = bot.list_sources() if bot else []
+    if sources:
+        with st.expander("🗂️ Update or remove a file"):
+            target = st.selectbox("Indexed file", sources)
+            replacement = st.file_uploader("New version (optional)", type=["pdf", "txt"], key="replacement_file")
+            r1, r2 = st.columns([1, 1])
+            with r1:
+                if st.button("🔁 Replace", disabled=replacement is None):
+                    try:
+                        bot.submit_ingest_job([replacement], replaces=target)
+                        # Rerun so the jobs panel above starts polling
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Replace Error: {e}")
+            with r2:
+                if st.button("🗑️ Delete file", type="secondary"):
+                    try:
+                        st.success(bot.delete_source(target))
+                        time.sleep(1)
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Delete Error: {e}")
+
+    if corpus is not None and corpus["sources"]:
+        with st.expander(f"📁 Indexed files ({len(corpus['sources'])})"):
+            st.dataframe([
+                {
+                    "file": doc["_id"],
+                    "chunks": doc["chunks"],
+                    "characters": doc["chars"],
+                    "~tokens": doc["tokens"],
+                    "embedding model": doc["embedding_model"],
+                    "indexed": time.strftime("%Y-%m-%d %H:%M", time.localtime(doc["indexed_at"])),
+                }
+                for doc in corpus["sources"]
+            ], hide_index=True)
+
 with col2:
     st.markdown("### 📊 Database Insight")
-    if st.session_state.bot:
-        try:
-            count = st.session_state.bot.get_document_count()
-            st.metric("Total Chunks", count)
-            st.info(f"Connected to: **MongoDB Atlas**")
-        except:
+    if bot:
+        if corpus is not None:
+            totals = corpus["totals"]
+            s1, s2 = st.columns(2)
+            s1.metric("Total Chunks", f"{totals['chunks']:,}")
+            s2.metric("Files", "—" if totals["sources"] is None else totals["sources"])
+            if totals["tokens"] is not None:
+                st.caption(
+                    f"~{totals['tokens']:,} tokens ({totals['chars']:,} characters) · "
+                    f"embeddings: {totals['embedding_model']} · last indexed "
+                    f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(totals['indexed_at']))}"
+                )
+            st.info(f"Connected to: **{bot.store_label}**")
+        else:
             st.error("Database connection failed")
+        if bot.db_health:
+            probe = bot.db_health.status()
+            if probe["ok"]:
+                st.caption(f"MongoDB ping {probe['latency_ms']:.0f} ms "
+                           f"({time.time() - probe['checked_at']:.0f}s ago)")
+            elif probe["ok"] is False:
+                st.error(f"MongoDB unreachable since {time.strftime('%H:%M:%S', time.localtime(probe['checked_at']))}: "
+                         f"{probe['error']}")
+
+        metrics = bot.get_metrics()
+        m1, m2 = st.columns(2)
+        m1.metric("Resident Memory", f"{metrics['rss_mb']:.0f} MB")
+        m2.metric("Active Sessions", metrics["active_sessions"])
+        st.caption(
+            f"Engine cold start: {metrics['startup_seconds'].get('total', 0):.2f}s "
+            f"(embeddings {metrics['startup_seconds'].get('embeddings', 0):.2f}s, "
+            f"warm-up {metrics['startup_seconds'].get('warm_up', 0):.2f}s) · "
+            f"engine memory {metrics['engine_rss_mb']:.0f} MB"
+        )
+        cache = metrics["answer_cache"]
+        st.caption(
+            f"Answer cache: {cache['hits']} hits / {cache['misses']} misses "
+            f"({cache['hit_rate']:.0%}), {cache['entries']} entries"
+        )
+        st.caption(
+            f"Prompt size: {metrics['prompt_tokens']['last']} tokens last request, "
+            f"{metrics['prompt_tokens']['avg']} avg"
+        )
+        llm = metrics["llm"]
+        waits = " · ".join(f"{priority} wait p95 {w['p95']:.0f} ms" for priority, w in llm["wait_ms"].items())
+        st.caption(
+            f"Gemini: circuit {llm['circuit'].replace('_', '-')} · queued {llm['queued']['interactive']} chat / "
+            f"{llm['queued']['batch']} batch · {llm['calls']} calls, {llm['retries']} retries, "
+            f"{llm['rejected']} rejected, {llm['failed']} failed" + (f" · {waits}" if waits else "")
+        )
+        coalescing = metrics["coalescing"]
+        st.caption(
+            f"Coalesced questions: {coalescing['coalesced']} joined an identical answer in progress, "
+            f"{coalescing['llm_calls_saved']} LLM calls saved · {coalescing['in_flight']} in flight"
+        )
+        extractive = metrics["extractive"]
+        st.caption(
+            f"Extractive answers: {extractive['served']} of {extractive['checked']} retrieved questions "
+            f"({extractive['share']:.0%}) answered without the LLM (min score {extractive['min_score']})"
+        )
     
     st.markdown("---")
     if st.button("🚪 Logout System"):
@@ -198,5 +315,50 @@ with col2:
 
 st.markdown("---")
 st.markdown("### 📜 System Logs")
-st.code(f"[{time.strftime('%H:%M:%S')}] Admin session active\n[{time.strftime('%H:%M:%S')}] MongoDB connection healthy", language="bash")
+if bot:
+    telemetry = bot.telemetry
+    l1, l2 = st.columns(2)
+    with l1:
+        st.markdown("**Chat latency (rolling, ms)**")
+        chat_latency = telemetry.percentiles("chat")
+        if chat_latency:
+            st.dataframe([{"stage": stage, **values} for stage, values in chat_latency.items()],
+                         hide_index=True)
+        else:
+            st.caption("No chat requests yet")
+        ingest_latency = telemetry.percentiles("ingest")
+        if ingest_latency:
+            st.markdown("**Ingestion stages (ms)**")
+            st.dataframe([{"stage": stage, **values} for stage, values in ingest_latency.items()],
+                         hide_index=True)
+    with l2:
+        st.markdown("**Slowest recent requests**")
+        slowest = telemetry.slowest(10)
+        if slowest:
+            st.dataframe([
+                {
+                    "time": time.strftime("%H:%M:%S", time.localtime(t.timestamp)),
+                    "question": t.label[:60],
+                    "cache": t.tags.get("cache", ""),
+                    **{stage: round(seconds * 1000) for stage, seconds in t.stages.items()},
+                }
+                for t in slowest
+            ], hide_index=True)
+        else:
+            st.caption("No chat requests yet")
+
+    log_entries = []
+    for t in telemetry.recent(30):
+        stages = " ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in t.stages.items())
+        tags = " ".join(f"{key}={value}" for key, value in t.tags.items())
+        log_entries.append((t.timestamp, f"{t.kind} {tags} {stages}"))
+    if bot.db_health:
+        for probe in bot.db_health.recent(10):
+            log_entries.append((probe["checked_at"], f"mongodb ping={probe['latency_ms']}ms" if probe["ok"]
+                                else f"mongodb UNREACHABLE {probe['error']}"))
+    log_lines = [f"[{time.strftime('%H:%M:%S', time.localtime(ts))}] {line}"
+                 for ts, line in sorted(log_entries, key=lambda entry: entry[0], reverse=True)]
+    st.code("\n".join(log_lines) or f"[{time.strftime('%H:%M:%S')}] No requests recorded yet", language="bash")
+    st.download_button("⬇️ Export metrics (Prometheus)", telemetry.prometheus_text(),
+                       file_name="rag_metrics.prom", mime="text/plain")
 
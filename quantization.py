@@ -0,0 +1,34 @@
+import numpy as np
+
+# Supported compact storage formats for chunk embeddings
+STORAGE_MODES = ("float", "int8", "binary")
+
+
+def quantize_int8(vectors):
+    """
+    Scalar-quantize to int8 with one scale per vector (largest component -> 127).
+    Cosine similarity is scale-invariant, so the scale does not need to be stored.
+    """
+    v = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    peak = np.abs(v).max(axis=1, keepdims=True)
+    peak[peak == 0] = 1.0
+    return np.round(v * (127.0 / peak)).astype(np.int8)
+
+
+def pack_bits(vectors):
+    """1-bit quantization: sign of each component, packed 8 per byte"""
+    return np.packbits(np.atleast_2d(np.asarray(vectors, dtype=np.float32)) > 0, axis=1)
+
+
+def cosine_scores(query, vectors):
+    """Cosine similarity of a full-precision query against (possibly int8) vectors"""
+    q = np.asarray(query, dtype=np.float32)
+    m = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(m, axis=1) * (np.linalg.norm(q) or 1.0)
+    norms[norms == 0] = 1.0
+    return (m @ q) / norms
+
+
+def hamming_distances(query_bits, packed):
+    """Bit differences between one packed query and packed vectors"""
+    return np.unpackbits(np.bitwise_xor(np.atleast_2d(packed), query_bits), axis=1).sum(axis=1)
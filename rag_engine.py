@@ -1,135 +1,1184 @@
 import os
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import threading
+import time
+import weakref
+import resource
 import tempfile
-import streamlit as st # Added for secrets
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_mongodb import MongoDBAtlasVectorSearch
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+# The heaviest dependencies (langchain_google_genai, langchain_huggingface/torch and the
+# Mongo clients) are imported where they are first used; see check_startup.py
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from pymongo import MongoClient
+from langchain_core.documents import Document
+from pymongo import ReturnDocument
+from pymongo.errors import ConnectionFailure
+from answer_cache import SemanticAnswerCache
+from chat_history import ChatHistory
+from context import estimate_tokens, pack_context
+from corpus_stats import CorpusStats
+from embedding_cache import CachedEmbeddings
+from ingest import IngestPipeline
+from ingest_jobs import IngestJobQueue
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from llm_guard import BATCH, INTERACTIVE, CircuitBreaker, LLMGuard, LLMUnavailable, TokenBucketLimiter
+from local_db import LocalDatabase
+from mongo_clients import DatabaseUnavailable, close_async_client, get_client, get_health_probe
+from extractive import ExtractiveAnswerer
+from settings import get_flag, get_setting
+from single_flight import SingleFlight, normalize_query
+from telemetry import Telemetry
+from vector_stores import AtlasVectorStore, LocalVectorStore
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+NO_DOCUMENTS_MESSAGE = "Please upload documents first to initialize the knowledge base."
+INTERRUPTED_MESSAGE = "The answer was interrupted, please ask again"
+
+PROMPT_TEMPLATE = """You are a comprehensive and analytical AI assistant. Your goal is to provide a detailed answer based on ALL relevant information found in the context.
+
+Guidelines:
+1. **Analyze All Matches**: Scan the provided context thoroughly and identify every relevant piece of information that helps answer the user's question.
+2. **Comprehensive Explanation**: Do not just give a direct answer. Explain the 'why' and 'how' based on the context. Provide context and nuance.
+3. **Structure with Matches**: If there are multiple relevant points or documents, list them clearly. Use bullet points to break down different aspects of the retrieved information.
+4. **Citations (Implicit)**: Refer to specific details from the text to support your explanation.
+5. **No Hallucinations**: Only use the provided context. If the answer is not there, strictly state that.
+
+Context:
+{context}
+
+Question: {question}
+
+Detailed Answer with All Matches:"""
+
+
+def load_embeddings(backend=None):
+    """
+    Embedding model for EMBEDDING_BACKEND: "huggingface" (PyTorch, full precision, default)
+    or "onnx" (int8-quantized graph on ONNX Runtime, see onnx_embeddings.py)
+    """
+    backend = (backend or get_setting("EMBEDDING_BACKEND", "huggingface")).lower()
+    if backend == "onnx":
+        from onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(
+            model_dir=get_setting("ONNX_MODEL_DIR"),
+            onnx_file=get_setting("ONNX_MODEL_FILE"),
+            threads=int(get_setting("EMBEDDING_THREADS", 0)) or None,
+            batch_size=int(get_setting("EMBEDDING_BATCH_SIZE", 32)),
+        )
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
+
+def _current_rss_mb():
+    """Resident set size of this process in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if peak > 1 << 32 else peak / 1024
+
+
+def _abandoned(flight, trace):
+    """A leader's chunk generator was dropped before it ran, so its finally never will"""
+    error = RuntimeError(INTERRUPTED_MESSAGE)
+    flight.finish(error)
+    trace.finish(error)
+
+
+def _finish_if_abandoned(chunks, flight, trace):
+    """Return chunks, finishing flight and trace if the generator is collected unstarted"""
+    weakref.finalize(chunks, _abandoned, flight, trace)
+    return chunks
+
 
 class RAGChatbot:
-    def __init__(self, api_key=None, mongodb_uri=None):
+    # Sessions not seen for this long are no longer counted as active
+    SESSION_IDLE_SECONDS = 30 * 60
+
+    def __init__(self, api_key=None, mongodb_uri=None, embeddings=None, llm=None, db=None, vector_backend=None):
+        """
+        embeddings, llm and db may be injected (offline tests, benchmarks); otherwise
+        they are built from secrets/env. vector_backend is "atlas" (default) or "local".
+        """
+        started = time.perf_counter()
+        self.startup_timings = {}
+        self.rss_before_init_mb = _current_rss_mb()
+        # Ingests of different files run concurrently; the same file, or a wipe, waits.
+        # Reads never take it.
+        self._write_cond = threading.Condition()
+        self._ingesting = set()
+        self._exclusive = False
+        self._sessions_lock = threading.Lock()
+        self._sessions = {}
+        self.vector_backend = (vector_backend or get_setting("VECTOR_BACKEND", "atlas")).lower()
+
         # 1. API Key Strategy: Argument -> Secrets -> Env
         self.api_key = api_key
         if not self.api_key:
-             if "GOOGLE_API_KEY" in st.secrets:
-                 self.api_key = st.secrets["GOOGLE_API_KEY"]
-             else:
-                 self.api_key = os.getenv("GOOGLE_API_KEY")
+            self.api_key = get_setting("GOOGLE_API_KEY")
                  
-        if not self.api_key:
+        if not self.api_key and llm is None:
             raise ValueError("API Key is required")
         
-        os.environ["GOOGLE_API_KEY"] = self.api_key
+        if self.api_key:
+            os.environ["GOOGLE_API_KEY"] = self.api_key
         
         # Initialize Embeddings (Local -> Free & No Rate Limits)
         # Using a small, fast model ideal for CPU
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        t0 = time.perf_counter()
+        self.embedding_backend = get_setting("EMBEDDING_BACKEND", "huggingface").lower()
+        self.base_embeddings = embeddings or load_embeddings(self.embedding_backend)
+        # int8 vectors differ slightly from full-precision ones, so they are cached under their own name
+        self.embedding_model = EMBEDDING_MODEL
+        if embeddings is None and self.embedding_backend == "onnx":
+            self.embedding_model += "-onnx-int8"
+        self.startup_timings["embeddings"] = time.perf_counter() - t0
         
         # 2. MongoDB URI Strategy: Argument -> Secrets -> Env
         self.mongodb_uri = mongodb_uri
         if not self.mongodb_uri:
-            if "MONGODB_URI" in st.secrets:
-                self.mongodb_uri = st.secrets["MONGODB_URI"]
-            else:
-                self.mongodb_uri = os.getenv("MONGODB_URI")
+            self.mongodb_uri = get_setting("MONGODB_URI")
 
-        if not self.mongodb_uri:
+        t0 = time.perf_counter()
+        self.client = None
+        # Pings MongoDB in the background; None when there is no MongoDB (local or injected db)
+        self.db_health = None
+        if db is not None:
+            self.db = db
+        elif self.mongodb_uri:
+            # One tuned pool per process, shared by every engine using this URI
+            self.client = get_client(self.mongodb_uri)
+            self.db = self.client["chatbot_db"]
+            self.db_health = get_health_probe(self.mongodb_uri)
+        elif self.vector_backend == "local":
+            # Air-gapped mode: manifest, caches and metadata live next to the local index
+            self.db = LocalDatabase(os.path.join(get_setting("LOCAL_INDEX_DIR", "local_index"), "db"))
+        else:
             raise ValueError("MongoDB URI is required")
+        # One entry per indexed source file: fingerprint + IDs of its chunks
+        self.manifest = self.db["files"]
+        # Per-file and total chunk/character counts, maintained by ingestion
+        self.corpus_stats = CorpusStats(self.db["corpus_stats"], self.embedding_model)
+
+        # Chunk vectors are content-addressed, so re-uploaded text is never re-embedded
+        # With compact Atlas storage the cache holds int8 vectors too, so it does not cancel the savings
+        compact_cache = self.vector_backend != "local" and get_setting("VECTOR_STORAGE", "float").lower() != "float"
+        self.embeddings = CachedEmbeddings(self.base_embeddings, self.embedding_model, self.db["embedding_cache"],
+                                           compact=compact_cache)
         
-        self.client = MongoClient(self.mongodb_uri)
-        self.db = self.client["chatbot_db"]
-        self.collection = self.db["documents"]
-        
-        # Initialize Vector Store (Persistent with MongoDB)
-        self.vector_store = MongoDBAtlasVectorSearch(
-            collection=self.collection,
-            embedding=self.embeddings,
-            index_name="vector_index",
-            text_key="text",
-            embedding_key="embedding"
-        )
-        self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
+        # Initialize Vector Store: MongoDB Atlas Vector Search, or a local memory-mapped index
+        if self.vector_backend == "local":
+            self.vector_store = LocalVectorStore(
+                os.path.join(get_setting("LOCAL_INDEX_DIR", "local_index"), "vectors"),
+                dim=int(get_setting("EMBEDDING_DIM", 384)),
+            )
+        else:
+            storage = get_setting("VECTOR_STORAGE", "float").lower()
+            self.vector_store = AtlasVectorStore(
+                self.db["documents"],
+                index_name="vector_index",
+                text_key="text",
+                embedding_key="embedding",
+                storage=storage,
+                # 1-bit vectors need a wider candidate pool to keep recall (see check_vector_recall.py)
+                rescore_factor=int(get_setting("VECTOR_RESCORE_FACTOR", 10 if storage == "binary" else 4)),
+            )
+        self.startup_timings["vector_store"] = time.perf_counter() - t0
+        if self.corpus_stats.totals() is None and self.vector_store.estimated_count():
+            # Chunks indexed before corpus stats were kept: count them once
+            t0 = time.perf_counter()
+            self.corpus_stats.backfill(self.manifest, self.vector_store)
+            self.startup_timings["corpus_stats_backfill"] = time.perf_counter() - t0
+
+        # Hybrid retrieval: BM25 over the same chunks, fused with vector hits by RRF
+        self.hybrid = get_flag("HYBRID_SEARCH", True)
+        self.vector_k = int(get_setting("HYBRID_VECTOR_K", 10))
+        self.lexical_k = int(get_setting("HYBRID_LEXICAL_K", 10))
+        self.fusion_weights = [
+            float(get_setting("HYBRID_VECTOR_WEIGHT", 1.0)),
+            float(get_setting("HYBRID_LEXICAL_WEIGHT", 1.0)),
+        ]
+        self.rrf_k = int(get_setting("HYBRID_RRF_K", 60))
+        self.lexical_index = None
+        if self.hybrid:
+            t0 = time.perf_counter()
+            self.lexical_index = BM25Index()
+            self.lexical_index.add_many(self.vector_store.iter_texts())
+            self.startup_timings["lexical_index"] = time.perf_counter() - t0
+        # Set when another process changed the corpus; a background thread then re-syncs the BM25 index
+        self._lexical_stale = threading.Event()
+        self._lexical_refresher = None
+        self._lexical_refresher_lock = threading.Lock()
 
         # Initialize LLM
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.3
+        t0 = time.perf_counter()
+        if llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            llm = ChatGoogleGenerativeAI(
+                model="gemini-2.5-flash",
+                temperature=0.3,
+                # A single attempt per call: self.llm_guard retries with backoff and jitter
+                max_retries=1,
+            )
+        self.llm = llm
+        self.startup_timings["llm"] = time.perf_counter() - t0
+
+        # Prompt and chain are built once and reused for every query
+        self.prompt = PromptTemplate(
+            template=PROMPT_TEMPLATE, input_variables=["context", "question"]
+        )
+        self.chain = self.prompt | self.llm | StrOutputParser()
+        self._template_tokens = estimate_tokens(PROMPT_TEMPLATE)
+        self.retrieve_k = int(get_setting("RETRIEVE_K", 5))
+        # Lookup questions whose answer is one sentence of a confident top hit skip the LLM
+        self.extractive = ExtractiveAnswerer(
+            min_score=float(get_setting("EXTRACTIVE_MIN_SCORE", 0.8)),
+            min_coverage=float(get_setting("EXTRACTIVE_MIN_COVERAGE", 0.5)),
+            enabled=get_flag("EXTRACTIVE_ANSWERS", True),
+        )
+        self.context_token_budget = int(get_setting("CONTEXT_TOKEN_BUDGET", 1500))
+        self.prompt_stats = {"requests": 0, "total_tokens": 0, "last_tokens": 0}
+        self._prompt_stats_lock = threading.Lock()
+
+        # Every Gemini call is admitted by a shared RPM/TPM token bucket (interactive chat
+        # before batch), retried with backoff, and short-circuited while Gemini keeps failing
+        self.llm_guard = LLMGuard(
+            TokenBucketLimiter(
+                rpm=int(get_setting("LLM_RPM", 1000)),
+                tpm=int(get_setting("LLM_TPM", 1000000)),
+                reserve=float(get_setting("LLM_INTERACTIVE_RESERVE", 0.2)),
+            ),
+            CircuitBreaker(
+                failure_threshold=int(get_setting("LLM_BREAKER_FAILURES", 5)),
+                reset_seconds=float(get_setting("LLM_BREAKER_RESET_SECONDS", 30)),
+            ),
+            max_retries=int(get_setting("LLM_MAX_RETRIES", 3)),
+            queue_timeout={INTERACTIVE: float(get_setting("LLM_QUEUE_TIMEOUT", 20))},
+            output_tokens=int(get_setting("LLM_OUTPUT_TOKENS", 512)),
+        )
+
+        # Per-stage request timings (ring buffer) for the admin System Logs panel
+        self.telemetry = Telemetry(
+            capacity=int(get_setting("TELEMETRY_BUFFER", 1000)),
+            export_path=get_setting("METRICS_EXPORT_PATH"),
+            export_interval=float(get_setting("METRICS_EXPORT_INTERVAL", 15)),
+        )
+        self.telemetry.add_gauge("llm_queued_calls", "LLM calls waiting for rate-limit capacity, by priority",
+                                 lambda: {f'priority="{p}"': n for p, n in self.llm_guard.limiter.snapshot()["queued"].items()})
+        self.telemetry.add_gauge("llm_circuit_open", "1 while the LLM circuit breaker refuses calls",
+                                 lambda: {"": int(self.llm_guard.breaker.state == "open")})
+
+        # Semantic answer cache, scoped to the current corpus version
+        self.meta = self.db["meta"]
+        self.corpus_version = self._load_corpus_version()
+        # Other processes (server.py, replicas, ingest workers) bump the version too; re-read it this often
+        self.corpus_check_seconds = float(get_setting("CORPUS_VERSION_CHECK_SECONDS", 5))
+        self._corpus_checked_at = time.monotonic()
+        self._corpus_check_lock = threading.Lock()
+        self.answer_cache = SemanticAnswerCache(
+            threshold=float(get_setting("ANSWER_CACHE_THRESHOLD", 0.95)),
+            max_entries=int(get_setting("ANSWER_CACHE_SIZE", 512)),
+            ttl_seconds=int(get_setting("ANSWER_CACHE_TTL", 24 * 3600)),
+            collection=self.db["answer_cache"] if get_flag("ANSWER_CACHE_PERSIST", True) else None,
+        )
+        self.answer_cache.load(self.corpus_version)
+        # Identical questions asked while one is being answered share its retrieval and generation
+        self.flights = SingleFlight(timeout=float(get_setting("FLIGHT_FOLLOW_TIMEOUT", 120)))
+        self.telemetry.add_gauge("llm_calls_saved", "LLM calls avoided by attaching to an identical in-flight question",
+                                 lambda: {"": self.flights.stats()["llm_calls_saved"]})
+
+        # All ingests in this process, including concurrent jobs, share one parse pool
+        # of INGEST_PARSE_WORKERS processes (default: CPU count), started on first use
+        self.parse_workers = int(get_setting("INGEST_PARSE_WORKERS", 0)) or os.cpu_count() or 1
+        self._parse_pool = None
+        self._parse_pool_lock = threading.Lock()
+
+        # Uploads from the admin page run as background jobs, recorded in ingest_jobs
+        self.ingest_jobs = IngestJobQueue(
+            self.db["ingest_jobs"],
+            self._ingest,
+            get_setting("INGEST_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "rag_ingest_spool")),
+            workers=int(get_setting("INGEST_JOB_WORKERS", 2)),
+        )
+
+        # Chat transcripts, appended one message at a time; the UI keeps only a recent window
+        self.chat_history = ChatHistory(self.db["chat_history"])
+
+        self.startup_timings["total"] = time.perf_counter() - started
+        self.warmed_up = False
+
+    def warm_up(self):
+        """Run one embedding so model weights are loaded before the first real query"""
+        if self.warmed_up:
+            return
+        t0 = time.perf_counter()
+        self.embeddings.embed_query("warm up")
+        self.startup_timings["warm_up"] = time.perf_counter() - t0
+        self.warmed_up = True
+
+    def register_session(self, session_id):
+        """Record that a browser session is using this engine (for metrics only)"""
+        with self._sessions_lock:
+            self._sessions[session_id] = time.time()
+
+    def get_metrics(self):
+        """Process-level memory and startup metrics for the shared engine"""
+        cutoff = time.time() - self.SESSION_IDLE_SECONDS
+        with self._sessions_lock:
+            active = sum(1 for seen in self._sessions.values() if seen >= cutoff)
+            total = len(self._sessions)
+        with self._prompt_stats_lock:
+            prompt_stats = dict(self.prompt_stats)
+        rss = _current_rss_mb()
+        return {
+            "rss_mb": round(rss, 1),
+            "engine_rss_mb": round(rss - self.rss_before_init_mb, 1),
+            "active_sessions": active,
+            "sessions_seen": total,
+            "startup_seconds": {k: round(v, 3) for k, v in self.startup_timings.items()},
+            "warmed_up": self.warmed_up,
+            "answer_cache": self.answer_cache.stats(),
+            "embedding_cache": self.embeddings.stats(),
+            "prompt_tokens": {
+                "last": prompt_stats["last_tokens"],
+                "avg": round(prompt_stats["total_tokens"] / prompt_stats["requests"]) if prompt_stats["requests"] else 0,
+            },
+            "latency_ms": self.telemetry.percentiles("chat"),
+            "database": self.db_health.status() if self.db_health else None,
+            "llm": self.llm_guard.stats(),
+            "coalescing": self.flights.stats(),
+            "extractive": self.extractive.stats(),
+        }
+
+    def _load_corpus_version(self):
+        doc = self.meta.find_one({"_id": "corpus"})
+        return doc["version"] if doc else 0
+
+    def _corpus_changed(self):
+        """Bump the corpus version and drop cached answers built from the old corpus"""
+        doc = self.meta.find_one_and_update(
+            {"_id": "corpus"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
         )
+        self.corpus_version = doc["version"]
+        self.answer_cache.invalidate()
 
-    def process_files(self, uploaded_files):
-        documents = []
-        for uploaded_file in uploaded_files:
-            # Create a temporary file to save the uploaded content
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_file_path = tmp_file.name
+    def _corpus_check_due(self):
+        return time.monotonic() - self._corpus_checked_at >= self.corpus_check_seconds
 
+    def _check_corpus_version(self):
+        """
+        The current corpus version, re-read from the meta collection at most every
+        corpus_check_seconds, so a change made by another process stops this one
+        serving answers cached from the old corpus. Returns the last known version
+        while the database is down or another thread is already checking.
+        """
+        if not self._corpus_check_due() or not self._corpus_check_lock.acquire(blocking=False):
+            return self.corpus_version
+        try:
+            self._corpus_checked_at = time.monotonic()
+            if self.db_health is not None and not self.db_health.healthy:
+                return self.corpus_version
             try:
-                if uploaded_file.name.endswith(".pdf"):
-                    loader = PyPDFLoader(tmp_file_path)
-                    documents.extend(loader.load())
-                elif uploaded_file.name.endswith(".txt"):
-                    loader = TextLoader(tmp_file_path)
-                    documents.extend(loader.load())
-            finally:
-                os.remove(tmp_file_path)
+                version = self._load_corpus_version()
+            except Exception:
+                return self.corpus_version
+            if version != self.corpus_version:
+                self.corpus_version = version
+                # The process that changed the corpus already cleared the persistent tier
+                self.answer_cache.invalidate(persistent=False)
+                self._refresh_lexical_index()
+            return version
+        finally:
+            self._corpus_check_lock.release()
 
-        if not documents:
-            return "No documents to process."
+    def _refresh_lexical_index(self):
+        """Re-sync the BM25 index with the shared store in the background (chunks written by other processes)"""
+        if self.lexical_index is None:
+            return
+        self._lexical_stale.set()
+        with self._lexical_refresher_lock:
+            if self._lexical_refresher is None:
+                self._lexical_refresher = threading.Thread(target=self._lexical_refresh_loop, name="bm25-refresh",
+                                                           daemon=True)
+                self._lexical_refresher.start()
 
-        # Split text
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = text_splitter.split_documents(documents)
+    def _lexical_refresh_loop(self):
+        while True:
+            self._lexical_stale.wait()
+            self._lexical_stale.clear()
+            try:
+                version = self._load_corpus_version()
+                synced = self.lexical_index.sync(self.vector_store.iter_texts())
+                # An ingest or delete during the scan (here or elsewhere) may be missing: scan again
+                if synced is None or self._load_corpus_version() != version:
+                    time.sleep(1)
+                    self._lexical_stale.set()
+            except Exception:
+                # Database unavailable: try again shortly
+                time.sleep(5)
+                self._lexical_stale.set()
 
-        # Add to Vector Store (MongoDB)
-        self.vector_store.add_documents(chunks)
-        
-        return f"Processed and saved {len(chunks)} chunks from {len(uploaded_files)} files to MongoDB Atlas."
+    async def _acheck_corpus_version(self):
+        """_check_corpus_version without blocking the event loop on the database read"""
+        if not self._corpus_check_due():
+            return self.corpus_version
+        return await asyncio.to_thread(self._check_corpus_version)
 
-    def get_response(self, query):
-        if not self.retriever:
-            return "Please upload documents first to initialize the knowledge base.", []
-        
-        # Retrieve documents
-        docs = self.retriever.invoke(query)
-        context_text = "\n\n".join([doc.page_content for doc in docs])
-        
-        prompt_template = """You are a comprehensive and analytical AI assistant. Your goal is to provide a detailed answer based on ALL relevant information found in the context.
+    def _shared_parse_pool(self):
+        with self._parse_pool_lock:
+            if self._parse_pool is None:
+                self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                                       mp_context=multiprocessing.get_context("spawn"))
+            return self._parse_pool
 
-Guidelines:
-1. **Analyze All Matches**: Scan the provided context thoroughly and identify every relevant piece of information that helps answer the user's question.
-2. **Comprehensive Explanation**: Do not just give a direct answer. Explain the 'why' and 'how' based on the context. Provide context and nuance.
-3. **Structure with Matches**: If there are multiple relevant points or documents, list them clearly. Use bullet points to break down different aspects of the retrieved information.
-4. **Citations (Implicit)**: Refer to specific details from the text to support your explanation.
-5. **No Hallucinations**: Only use the provided context. If the answer is not there, strictly state that.
+    def _drop_parse_pool(self, pool):
+        """Forget a broken pool so the next ingest starts a new one"""
+        with self._parse_pool_lock:
+            if self._parse_pool is pool:
+                self._parse_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
 
-Context:
-{context}
+    @contextlib.contextmanager
+    def _writing(self, sources):
+        """
+        Hold the write slot for these source names (waits for other writers of the same sources).
+        This only orders writers within this process; ingests of the same file from
+        two processes are not serialized.
+        """
+        sources = set(sources)
+        with self._write_cond:
+            while self._exclusive or self._ingesting & sources:
+                self._write_cond.wait()
+            self._ingesting |= sources
+        try:
+            yield
+        finally:
+            with self._write_cond:
+                self._ingesting -= sources
+                self._write_cond.notify_all()
 
-Question: {question}
+    @contextlib.contextmanager
+    def _writing_all(self):
+        """Exclusive write access to the whole corpus (waits for running ingests)"""
+        with self._write_cond:
+            while self._exclusive:
+                self._write_cond.wait()
+            self._exclusive = True
+            while self._ingesting:
+                self._write_cond.wait()
+        try:
+            yield
+        finally:
+            with self._write_cond:
+                self._exclusive = False
+                self._write_cond.notify_all()
 
-Detailed Answer with All Matches:"""
+    def process_files(self, uploaded_files, progress=None):
+        """
+        Index uploaded PDF/TXT files (file objects or paths). progress(fraction, text)
+        is called while the parse/embed/insert stages run.
+        """
+        return self._ingest(uploaded_files, progress)[1]
+
+    def submit_ingest_job(self, uploaded_files, replaces=None):
+        """
+        Queue files for background indexing; returns the job ID (see ingest_jobs).
+        replaces names an indexed source to delete once the upload is indexed.
+        """
+        return self.ingest_jobs.submit(uploaded_files, replaces=replaces)
+
+    def replace_source(self, source, upload, progress=None):
+        """
+        Index upload as the new version of source. With the same file name only the
+        changed chunks are embedded and the stale ones deleted; under a new name the
+        upload is indexed first and the old source deleted afterwards.
+        """
+        return self._ingest([upload], progress, replaces=source)[1]
+
+    def delete_source(self, source):
+        """Remove one indexed file (chunks, manifest entry, stats); cost is proportional to that file"""
+        with self._database(), self._writing([source]):
+            entry = self.manifest.find_one({"_id": source})
+            deleted = self.vector_store.delete_source(source)
+            if self.lexical_index is not None and entry:
+                self.lexical_index.remove_many(entry["chunk_ids"])
+            self.manifest.delete_many({"_id": source})
+            self.corpus_stats.remove_source(source)
+            if deleted or entry:
+                self._corpus_changed()
+        return f"Deleted {source} ({deleted} chunks) from {self.store_label}."
+
+    def list_sources(self):
+        """Names of the indexed files"""
+        return sorted(doc["_id"] for doc in self.manifest.find({}, {"_id": 1}))
+
+    def _ingest(self, uploaded_files, progress=None, replaces=None):
+        """Run the ingest pipeline; returns (report dict, summary message)"""
+        sources = [getattr(f, "name", None) or os.path.basename(f) for f in uploaded_files]
+        with self._database(), self._writing(sources):
+            pool = self._shared_parse_pool()
+            pipeline = IngestPipeline(
+                self.embeddings,
+                self.vector_store,
+                self.manifest,
+                embed_batch_size=int(get_setting("INGEST_EMBED_BATCH", 64)),
+                insert_batch_size=int(get_setting("INGEST_INSERT_BATCH", 500)),
+                parse_workers=self.parse_workers,
+                stream_threshold=int(float(get_setting("INGEST_STREAM_THRESHOLD_MB", 16)) * (1 << 20)),
+                window_chars=int(get_setting("INGEST_WINDOW_CHARS", 1_000_000)),
+                lexical_index=self.lexical_index,
+                stats=self.corpus_stats,
+                pool=pool,
+            )
+            hits_before, misses_before = self.embeddings.hits, self.embeddings.misses
+            with self.telemetry.start("ingest") as trace:
+                try:
+                    report = pipeline.run(uploaded_files, progress=progress)
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        self._drop_parse_pool(pool)
+                    # Partial writes also change the corpus
+                    self._corpus_changed()
+                    raise
+                for stage, seconds in report["stage_seconds"].items():
+                    trace.add(stage, seconds)
+                trace.label = f"{report['files']} files, {report['added']} chunks added"
+                if report["added"] or report["removed"]:
+                    self._corpus_changed()
+
+        replaced = ""
+        if replaces and replaces not in sources:
+            replaced = " " + self.delete_source(replaces)
+
+        if not report["files"] and not report["skipped"]:
+            return report, "No documents to process." + replaced
+
+        # Approximate when other ingests run at the same time (the counters are shared)
+        hits = self.embeddings.hits - hits_before
+        misses = self.embeddings.misses - misses_before
+        hit_rate = hits / (hits + misses) if hits + misses else 0.0
         
-        prompt = PromptTemplate(
-            template=prompt_template, input_variables=["context", "question"]
+        return report, (
+            f"Indexed {report['files']} files ({report['skipped']} unchanged files skipped) in {self.store_label}: "
+            f"{report['added']} chunks added, {report['removed']} removed, {report['unchanged']} unchanged. "
+            f"Embedding cache hit rate: {hit_rate:.0%} ({hits} reused, {misses} embedded). "
+            f"Throughput: {report['pages_per_second']} pages/s, {report['chunks_per_second']} chunks/s "
+            f"({report['seconds']}s)." + replaced
         )
-        
-        # Generate response using LCEL or direct invocation
-        chain = prompt | self.llm | StrOutputParser()
-        
-        response = chain.invoke({"context": context_text, "question": query})
-        
+
+    def _fuse(self, query, vector_hits, k):
+        """RRF-fuse vector hits with BM25 hits; returns (ranked ids, docs already fetched by id)"""
+        lexical_hits = self.lexical_index.search(query, k=self.lexical_k)
+        docs = {doc.metadata["_id"]: doc for doc, _score in vector_hits}
+        ranked = reciprocal_rank_fusion(
+            [[doc.metadata["_id"] for doc, _score in vector_hits], [doc_id for doc_id, _score in lexical_hits]],
+            weights=self.fusion_weights,
+            rrf_k=self.rrf_k,
+        )[:k]
+        return ranked, docs
+
+    @staticmethod
+    def _scored(vector_hits):
+        """Docs of vector hits with their similarity (0..1) in metadata["score"]"""
+        for doc, score in vector_hits:
+            doc.metadata["score"] = round(score, 4)
+        return vector_hits
+
+    def _retrieve(self, query, query_embedding, k=5):
+        """
+        Vector search with a precomputed query embedding (avoids embedding the query twice),
+        fused with BM25 hits so exact codes and acronyms are not missed. Docs found by
+        vector search carry their similarity in metadata["score"]; lexical-only hits have none.
+        """
+        with self._database():
+            vector_hits = self._scored(self.vector_store.search(query_embedding, k=self.vector_k if self.lexical_index else k))
+            if not self.lexical_index:
+                return [doc for doc, _score in vector_hits]
+
+            ranked, docs = self._fuse(query, vector_hits, k)
+            # Only lexical-only hits need a fetch
+            docs.update(self.vector_store.get([doc_id for doc_id in ranked if doc_id not in docs]))
+        return [docs[doc_id] for doc_id in ranked if doc_id in docs]
+
+    async def _aretrieve(self, query, query_embedding, k=5):
+        """Async counterpart of _retrieve"""
+        self._ensure_async_store()
+        with self._database():
+            vector_hits = self._scored(
+                await self.vector_store.asearch(query_embedding, k=self.vector_k if self.lexical_index else k)
+            )
+            if not self.lexical_index:
+                return [doc for doc, _score in vector_hits]
+
+            ranked, docs = self._fuse(query, vector_hits, k)
+            docs.update(await self.vector_store.aget([doc_id for doc_id in ranked if doc_id not in docs]))
+        return [docs[doc_id] for doc_id in ranked if doc_id in docs]
+
+    def _ensure_async_store(self):
+        """Let the Atlas store reach its collection through the running event loop's async client"""
+        if self.vector_backend == "local" or not self.mongodb_uri or self.vector_store.async_collection is not None:
+            return
+        uri = self.mongodb_uri
+        self.vector_store.async_collection = lambda: get_client(uri, asynchronous=True)["chatbot_db"]["documents"]
+
+    @contextlib.contextmanager
+    def _database(self):
+        """
+        Fail fast while the health probe reports MongoDB down, and report a network
+        error from the wrapped operation so the following requests fail fast too.
+        Cached answers are served before this is reached, so they keep working.
+        """
+        if self.db_health is None:
+            yield
+            return
+        self.db_health.ensure_available()
+        try:
+            yield
+        except ConnectionFailure as e:
+            self.db_health.report_failure(e)
+            raise DatabaseUnavailable() from e
+
+    def _build_inputs(self, query, docs):
+        """Pack retrieved docs into chain inputs; returns (inputs, docs actually used)"""
+        # Packing merges overlaps and enforces the token budget
+        context_text, docs = pack_context(docs, token_budget=self.context_token_budget)
+        inputs = {"context": context_text, "question": query}
+
+        prompt_tokens = self._prompt_tokens(inputs)
+        with self._prompt_stats_lock:
+            self.prompt_stats["requests"] += 1
+            self.prompt_stats["total_tokens"] += prompt_tokens
+            self.prompt_stats["last_tokens"] = prompt_tokens
+        return inputs, docs
+
+    def _prompt_tokens(self, inputs):
+        return self._template_tokens + estimate_tokens(inputs["context"]) + estimate_tokens(inputs["question"])
+
+    @staticmethod
+    def _fallback_answer(docs, error):
+        """Reply used when Gemini cannot be called: the best retrieved passages, unsummarized"""
+        if not docs:
+            return f"⏳ The AI service is unavailable right now ({error}). Please try again in a minute."
+        passages = "\n\n".join(
+            f"**{doc.metadata.get('source', 'Document')}**: {doc.page_content[:300].strip()}..." for doc in docs[:3]
+        )
+        return (f"⏳ The AI service is unavailable right now ({error}), so here are the most relevant "
+                f"passages from your documents instead:\n\n{passages}")
+
+    def _prepare_chain(self, query, docs, trace):
+        """Pack retrieved docs into context for the query and return (chain, chain inputs, docs)"""
+        with trace.span("prompt"):
+            inputs, docs = self._build_inputs(query, docs)
+        return self.chain, inputs, docs
+
+    def _answer_without_llm(self, query, docs, extractive, trace):
+        """
+        (answer, docs) when the LLM is not needed: nothing is indexed yet, or the extractive
+        fast path quotes the top chunk for a confident lookup question. Otherwise None.
+        """
+        if not docs:
+            # Retrieval finds nothing only when the knowledge base is empty
+            trace.tag("answer", "no_documents")
+            return NO_DOCUMENTS_MESSAGE, []
+        if not extractive:
+            # The user asked to expand an extractive answer
+            trace.tag("answer", "expanded")
+            return None
+        with trace.span("extract"):
+            result = self.extractive.answer(query, docs)
+        trace.tag("answer", "extractive" if result else "generated")
+        if result is None:
+            return None
+        answer, doc = result
+        # Tells the UI and API clients they can offer to expand the answer with the LLM
+        doc.metadata["extractive_answer"] = True
+        return answer, [doc]
+
+    def _lookup_cache(self, query_embedding, corpus_version, trace):
+        with trace.span("cache_lookup"):
+            cached = self.answer_cache.lookup(query_embedding, corpus_version)
+        trace.tag("cache", "hit" if cached else "miss")
+        return cached
+
+    @staticmethod
+    def _docs_to_sources(docs):
+        sources = []
+        for doc in docs:
+            metadata = {k: v for k, v in doc.metadata.items() if k not in ("_id", "embedding")}
+            sources.append({"page_content": doc.page_content, "metadata": metadata})
+        return sources
+
+    @staticmethod
+    def _sources_to_docs(sources):
+        return [Document(page_content=s["page_content"], metadata=s["metadata"]) for s in sources]
+
+    def _join_flight(self, query, extractive=True):
+        """(flight, is_leader) for this question at the current corpus version"""
+        return self.flights.join((normalize_query(query), self._check_corpus_version(), extractive))
+
+    def _follow(self, flight, query):
+        """Attach to an identical question already being answered; returns (chunks, docs) like stream_response"""
+        trace = self.telemetry.start("chat", query)
+        trace.tag("cache", "coalesced")
+        try:
+            docs = flight.wait_docs()
+        except Exception as e:
+            trace.finish(e)
+            raise
+
+        def chunks():
+            error = None
+            try:
+                yield from flight.iter_chunks()
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                trace.finish(error)
+
+        return chunks(), docs
+
+    async def _afollow(self, flight, query):
+        """Async counterpart of _follow"""
+        trace = self.telemetry.start("chat", query)
+        trace.tag("cache", "coalesced")
+        try:
+            docs = await flight.await_docs()
+        except Exception as e:
+            trace.finish(e)
+            raise
+
+        async def chunks():
+            error = None
+            try:
+                async for chunk in flight.achunks():
+                    yield chunk
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                trace.finish(error)
+
+        return chunks(), docs
+
+    def get_response(self, query, extractive=True):
+        """
+        Answer a question: (answer, docs). Confident lookup questions are answered by
+        quoting the top chunk unless extractive=False ("expand with AI").
+        """
+        flight, leader = self._join_flight(query, extractive)
+        if not leader:
+            chunks, docs = self._follow(flight, query)
+            return "".join(chunks), docs
+        try:
+            answer, docs = self._answer(query, flight, extractive)
+        except Exception as e:
+            flight.fail(e)
+            raise
+        flight.complete(answer, docs)
+        return answer, docs
+
+    def _answer(self, query, flight, extractive):
+        with self.telemetry.start("chat", query) as trace:
+            # Check the semantic cache before retrieval + generation
+            with trace.span("embed"):
+                query_embedding = self.embeddings.embed_query(query)
+            corpus_version = self.corpus_version
+            cached = self._lookup_cache(query_embedding, corpus_version, trace)
+            if cached:
+                answer, sources = cached
+                return answer, self._sources_to_docs(sources)
+
+            with trace.span("retrieve"):
+                docs = self._retrieve(query, query_embedding, k=self.retrieve_k)
+            quoted = self._answer_without_llm(query, docs, extractive, trace)
+            if quoted:
+                return quoted
+            chain, inputs, docs = self._prepare_chain(query, docs, trace)
+            flight.llm_called = True
+            try:
+                with trace.span("llm_total"):
+                    response = self.llm_guard.call(lambda: chain.invoke(inputs), self._prompt_tokens(inputs), trace=trace)
+            except LLMUnavailable as e:
+                trace.tag("llm", "fallback")
+                return self._fallback_answer(docs, e), docs
+            self.answer_cache.store(query, query_embedding, corpus_version, response, self._docs_to_sources(docs))
+
         return response, docs
+
+    def stream_response(self, query, extractive=True):
+        """
+        Streaming variant of get_response.
+        Retrieval runs eagerly; returns (chunks, docs) where chunks is a generator
+        yielding answer text as Gemini produces it. Callers asking the same question
+        while it streams get the same chunks instead of a generation of their own.
+        """
+        flight, leader = self._join_flight(query, extractive)
+        if not leader:
+            return self._follow(flight, query)
+
+        trace = self.telemetry.start("chat", query)
+        try:
+            with trace.span("embed"):
+                query_embedding = self.embeddings.embed_query(query)
+            corpus_version = self.corpus_version
+            cached = self._lookup_cache(query_embedding, corpus_version, trace)
+            if cached:
+                trace.finish()
+                answer, sources = cached
+                docs = self._sources_to_docs(sources)
+                flight.complete(answer, docs)
+                return iter([answer]), docs
+
+            with trace.span("retrieve"):
+                docs = self._retrieve(query, query_embedding, k=self.retrieve_k)
+            quoted = self._answer_without_llm(query, docs, extractive, trace)
+            if quoted:
+                trace.finish()
+                flight.complete(*quoted)
+                return iter([quoted[0]]), quoted[1]
+            chain, inputs, docs = self._prepare_chain(query, docs, trace)
+        except Exception as e:
+            trace.finish(e)
+            flight.fail(e)
+            raise
+        flight.set_docs(docs)
+        flight.llm_called = True
+
+        def chunks():
+            parts = []
+            error = None
+            completed = False
+            started = time.perf_counter()
+            rendering = 0.0
+            stream = self.llm_guard.stream(lambda: chain.stream(inputs), self._prompt_tokens(inputs), trace=trace)
+            try:
+                for chunk in stream:
+                    if not parts:
+                        trace.add("llm_first_token", time.perf_counter() - started)
+                    parts.append(chunk)
+                    flight.publish(chunk)
+                    # Time suspended here is spent by the caller rendering the chunk
+                    t0 = time.perf_counter()
+                    yield chunk
+                    rendering += time.perf_counter() - t0
+                trace.add("llm_total", time.perf_counter() - started - rendering)
+                trace.add("render", rendering)
+                completed = True
+                # Only complete answers are cached
+                self.answer_cache.store(query, query_embedding, corpus_version, "".join(parts), self._docs_to_sources(docs))
+            except LLMUnavailable as e:
+                trace.tag("llm", "fallback")
+                fallback = self._fallback_answer(docs, e)
+                flight.publish(fallback)
+                completed = True
+                yield fallback
+            except GeneratorExit:
+                # This caller stopped reading (page closed or rerun): finish the answer for those attached to it
+                if flight.followers:
+                    try:
+                        for chunk in stream:
+                            flight.publish(chunk)
+                        completed = True
+                    except Exception as e:
+                        error = e
+                raise
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                flight.finish(None if completed else error or RuntimeError(INTERRUPTED_MESSAGE))
+                trace.finish(error)
+
+        return _finish_if_abandoned(chunks(), flight, trace), docs
     
+    async def aget_response(self, query, extractive=True):
+        """Async variant of get_response (ainvoke + async MongoDB driver)"""
+        await self._acheck_corpus_version()
+        flight, leader = self._join_flight(query, extractive)
+        if not leader:
+            chunks, docs = await self._afollow(flight, query)
+            return "".join([chunk async for chunk in chunks]), docs
+        try:
+            answer, docs = await self._aanswer(query, flight, extractive)
+        except Exception as e:
+            flight.fail(e)
+            raise
+        flight.complete(answer, docs)
+        return answer, docs
+
+    async def _aanswer(self, query, flight, extractive):
+        with self.telemetry.start("chat", query) as trace:
+            with trace.span("embed"):
+                query_embedding = await self.embeddings.aembed_query(query)
+            corpus_version = self.corpus_version
+            cached = self._lookup_cache(query_embedding, corpus_version, trace)
+            if cached:
+                answer, sources = cached
+                return answer, self._sources_to_docs(sources)
+
+            with trace.span("retrieve"):
+                docs = await self._aretrieve(query, query_embedding, k=self.retrieve_k)
+            quoted = self._answer_without_llm(query, docs, extractive, trace)
+            if quoted:
+                return quoted
+            chain, inputs, docs = self._prepare_chain(query, docs, trace)
+            flight.llm_called = True
+            try:
+                with trace.span("llm_total"):
+                    response = await self.llm_guard.acall(
+                        lambda: chain.ainvoke(inputs), self._prompt_tokens(inputs), trace=trace
+                    )
+            except LLMUnavailable as e:
+                trace.tag("llm", "fallback")
+                return self._fallback_answer(docs, e), docs
+            await asyncio.to_thread(
+                self.answer_cache.store, query, query_embedding, corpus_version, response, self._docs_to_sources(docs)
+            )
+        return response, docs
+
+    async def astream_response(self, query, extractive=True):
+        """
+        Async variant of stream_response: returns (chunks, docs) where chunks is an
+        async generator yielding answer text as Gemini produces it.
+        """
+        await self._acheck_corpus_version()
+        flight, leader = self._join_flight(query, extractive)
+        if not leader:
+            return await self._afollow(flight, query)
+
+        trace = self.telemetry.start("chat", query)
+        try:
+            with trace.span("embed"):
+                query_embedding = await self.embeddings.aembed_query(query)
+            corpus_version = self.corpus_version
+            cached = self._lookup_cache(query_embedding, corpus_version, trace)
+            if cached:
+                trace.finish()
+                answer, sources = cached
+                docs = self._sources_to_docs(sources)
+                flight.complete(answer, docs)
+
+                async def cached_chunks():
+                    yield answer
+
+                return cached_chunks(), docs
+
+            with trace.span("retrieve"):
+                docs = await self._aretrieve(query, query_embedding, k=self.retrieve_k)
+            quoted = self._answer_without_llm(query, docs, extractive, trace)
+            if quoted:
+                trace.finish()
+                flight.complete(*quoted)
+
+                async def quoted_chunks():
+                    yield quoted[0]
+
+                return quoted_chunks(), quoted[1]
+            chain, inputs, docs = self._prepare_chain(query, docs, trace)
+        except Exception as e:
+            trace.finish(e)
+            flight.fail(e)
+            raise
+        flight.set_docs(docs)
+        flight.llm_called = True
+
+        async def chunks():
+            parts = []
+            error = None
+            completed = False
+            started = time.perf_counter()
+            sending = 0.0
+            stream = self.llm_guard.astream(lambda: chain.astream(inputs), self._prompt_tokens(inputs), trace=trace)
+            try:
+                async for chunk in stream:
+                    if not parts:
+                        trace.add("llm_first_token", time.perf_counter() - started)
+                    parts.append(chunk)
+                    flight.publish(chunk)
+                    t0 = time.perf_counter()
+                    yield chunk
+                    sending += time.perf_counter() - t0
+                trace.add("llm_total", time.perf_counter() - started - sending)
+                trace.add("render", sending)
+                completed = True
+                await asyncio.to_thread(
+                    self.answer_cache.store, query, query_embedding, corpus_version, "".join(parts),
+                    self._docs_to_sources(docs)
+                )
+            except LLMUnavailable as e:
+                trace.tag("llm", "fallback")
+                fallback = self._fallback_answer(docs, e)
+                flight.publish(fallback)
+                completed = True
+                yield fallback
+            except GeneratorExit:
+                # The client disconnected: finish the answer for the callers attached to it
+                if flight.followers:
+                    try:
+                        async for chunk in stream:
+                            flight.publish(chunk)
+                        completed = True
+                    except Exception as e:
+                        error = e
+                raise
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                flight.finish(None if completed else error or RuntimeError(INTERRUPTED_MESSAGE))
+                trace.finish(error)
+
+        return _finish_if_abandoned(chunks(), flight, trace), docs
+
+    async def aanswer_batch(self, questions, output_path, concurrency=8, retrieval_concurrency=32):
+        """
+        Answer many questions (evaluation runs) and append one JSON line per result
+        to output_path as each completes. questions are strings or {"id", "question"}
+        dicts. Questions whose id already has an answer in output_path are skipped,
+        so an interrupted run resumes where it stopped. The answer cache is bypassed.
+        Returns the number of questions answered in this run.
+        """
+        items = [q if isinstance(q, dict) else {"id": i, "question": q} for i, q in enumerate(questions)]
+        done = set()
+        if os.path.exists(output_path):
+            with open(output_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Partial last line from an interrupted run
+                        continue
+                    if "answer" in record:
+                        done.add(record["id"])
+        pending = [item for item in items if item["id"] not in done]
+        if not pending:
+            return 0
+
+        # 1. One vectorized embedding call for every pending query
+        vectors = await asyncio.to_thread(self.base_embeddings.embed_documents, [item["question"] for item in pending])
+
+        retrieval_slots = asyncio.Semaphore(retrieval_concurrency)
+        llm_slots = asyncio.Semaphore(concurrency)
+        answered = 0
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            async def answer(item, vector):
+                nonlocal answered
+                started = time.perf_counter()
+                record = {"id": item["id"], "question": item["question"]}
+                trace = self.telemetry.start("batch", item["question"])
+                try:
+                    # 2. Concurrent retrievals, 3. bounded fan-out of LLM calls
+                    async with retrieval_slots:
+                        with trace.span("retrieve"):
+                            docs = await self._aretrieve(item["question"], vector, k=self.retrieve_k)
+                    chain, inputs, docs = self._prepare_chain(item["question"], docs, trace)
+                    async with llm_slots:
+                        with trace.span("llm_total"):
+                            # Batch priority: waits behind interactive chat for rate-limit capacity
+                            record["answer"] = await self.llm_guard.acall(
+                                lambda: chain.ainvoke(inputs), self._prompt_tokens(inputs), BATCH, trace
+                            )
+                    record["sources"] = [doc.metadata.get("source") for doc in docs]
+                    answered += 1
+                    trace.finish()
+                except Exception as e:
+                    record["error"] = str(e)
+                    trace.finish(e)
+                record["seconds"] = round(time.perf_counter() - started, 3)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+
+            await asyncio.gather(*(answer(item, vector) for item, vector in zip(pending, vectors)))
+        return answered
+
+    def answer_batch(self, questions, output_path, concurrency=8, retrieval_concurrency=32):
+        """Synchronous wrapper around aanswer_batch (scripts, notebooks); safe to call repeatedly"""
+        async def run():
+            try:
+                return await self.aanswer_batch(questions, output_path, concurrency, retrieval_concurrency)
+            finally:
+                # Each call runs on a new event loop; its async client must not outlive it
+                if self.mongodb_uri:
+                    await close_async_client(self.mongodb_uri)
+
+        return asyncio.run(run())
+
+    @property
+    def store_label(self):
+        return "Local index" if self.vector_backend == "local" else "MongoDB Atlas"
+
     def get_document_count(self):
-        """Get the number of documents stored in MongoDB"""
-        return self.collection.count_documents({})
+        """Number of stored chunks, from the maintained stats (no collection scan)"""
+        totals = self.corpus_stats.totals()
+        if totals is not None:
+            return totals["chunks"]
+        return self.vector_store.estimated_count()
+
+    def get_corpus_stats(self):
+        """Corpus totals and per-file breakdown for the dashboard"""
+        totals = self.corpus_stats.totals()
+        if totals is None:
+            # Corpus indexed before stats were kept: only the chunk total is known
+            totals = {"sources": None, "chunks": self.vector_store.estimated_count(), "chars": None,
+                      "tokens": None, "embedding_model": None, "indexed_at": None}
+        return {"totals": totals, "sources": self.corpus_stats.sources()}
     
     def clear_all_documents(self):
-        """Clear all documents from MongoDB"""
-        result = self.collection.delete_many({})
-        return f"Deleted {result.deleted_count} documents from MongoDB."
+        """Clear all documents (the Atlas collection is dropped and rebuilt, keeping its search indexes)"""
+        with self._database(), self._writing_all():
+            deleted = self.vector_store.clear()
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
+            self.manifest.delete_many({})
+            self.corpus_stats.clear()
+            self._corpus_changed()
+        return f"Deleted {deleted} documents from {self.store_label}."
+
+
+# --- Process-wide shared engine ---
+# Streamlit imports this module once per server process, so every browser
+# session shares one embedding model, one MongoClient pool and one LLM client.
+_shared_bot = None
+_shared_bot_lock = threading.Lock()
+
+
+def get_shared_bot():
+    """Return the process-wide RAGChatbot, creating it on first use"""
+    global _shared_bot
+    if _shared_bot is None:
+        with _shared_bot_lock:
+            if _shared_bot is None:
+                bot = RAGChatbot()
+                # The serving process takes over jobs left by one that exited; scripts
+                # building their own engine (evaluation, benchmarks) do not
+                bot.ingest_jobs.resume()
+                _shared_bot = bot
+    return _shared_bot
+
+
+def warm_up():
+    """Build the shared engine and load the embedding model (call at server start)"""
+    bot = get_shared_bot()
+    bot.warm_up()
+    return bot
+
+
+if __name__ == "__main__":
+    # `python rag_engine.py` checks that keys are configured and reports cold-start cost
+    from dotenv import load_dotenv
+    load_dotenv()
+    print(warm_up().get_metrics())
@@ -0,0 +1,133 @@
+"""
+Headless HTTP entry point for the RAG chatbot (ASGI).
+
+Run with:  uvicorn server:app --host 0.0.0.0 --port 8000
+
+Endpoints:
+    GET  /health        readiness, database ping and engine metrics (503 while the database is down)
+    GET  /metrics       per-stage latency summaries in Prometheus text format
+    POST /chat          {"question": "..."} -> {"answer": ..., "sources": [...]}
+                        add "extractive": false to have the LLM answer a question the fast path
+                        quoted (sources[0].metadata.extractive_answer is true on quoted answers)
+    POST /chat/stream   same body; Server-Sent Events, one "token" event per chunk, then "sources"
+    POST /ingest        multipart form with one or more "files"; requires "Authorization: Bearer <API_TOKEN>"
+
+Requests that need the database return 503 at once while it is unreachable.
+"""
+import contextlib
+import hmac
+import io
+import json
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from mongo_clients import DatabaseUnavailable
+from rag_engine import get_setting, get_shared_bot, warm_up
+
+load_dotenv()
+
+
+class _Upload(io.BytesIO):
+    """In-memory upload with a .name, like Streamlit's UploadedFile"""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def _sources(docs):
+    return [{"content": doc.page_content, "metadata": {k: v for k, v in doc.metadata.items() if k != "_id"}}
+            for doc in docs]
+
+
+async def _question(request):
+    """(question or None, extractive) from the JSON body"""
+    try:
+        body = await request.json()
+    except ValueError:
+        return None, True
+    if not isinstance(body, dict):
+        return None, True
+    question = (body.get("question") or "").strip()
+    return question or None, body.get("extractive", True) is not False
+
+
+async def health(request):
+    bot = get_shared_bot()
+    healthy = bot.db_health is None or bot.db_health.healthy
+    return JSONResponse({"status": "ok" if healthy else "degraded", "metrics": bot.get_metrics()},
+                        status_code=200 if healthy else 503)
+
+
+async def metrics(request):
+    return PlainTextResponse(get_shared_bot().telemetry.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+async def chat(request):
+    question, extractive = await _question(request)
+    if not question:
+        return JSONResponse({"error": "question is required"}, status_code=400)
+    answer, docs = await get_shared_bot().aget_response(question, extractive=extractive)
+    return JSONResponse({"answer": answer, "sources": _sources(docs)})
+
+
+async def chat_stream(request):
+    question, extractive = await _question(request)
+    if not question:
+        return JSONResponse({"error": "question is required"}, status_code=400)
+    chunks, docs = await get_shared_bot().astream_response(question, extractive=extractive)
+
+    async def events():
+        async for chunk in chunks:
+            yield f"event: token\ndata: {json.dumps(chunk)}\n\n"
+        yield f"event: sources\ndata: {json.dumps(_sources(docs))}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def ingest(request):
+    token = get_setting("API_TOKEN")
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not token or not hmac.compare_digest(supplied, str(token)):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+
+    form = await request.form()
+    uploads = [_Upload(f.filename, await f.read()) for f in form.getlist("files") if hasattr(f, "filename")]
+    if not uploads:
+        return JSONResponse({"error": "no files uploaded"}, status_code=400)
+    # Ingestion is CPU/IO heavy and synchronous; keep it off the event loop
+    message = await run_in_threadpool(get_shared_bot().process_files, uploads)
+    return JSONResponse({"message": message})
+
+
+async def database_unavailable(request, exc):
+    return JSONResponse({"error": str(exc)}, status_code=503, headers={"Retry-After": "5"})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Load the embedding model and clients before the first request arrives
+    await run_in_threadpool(warm_up)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat/stream", chat_stream, methods=["POST"]),
+        Route("/ingest", ingest, methods=["POST"]),
+    ],
+    exception_handlers={DatabaseUnavailable: database_unavailable},
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(get_setting("PORT", 8000)))
@@ -0,0 +1,21 @@
+import os
+
+import streamlit as st
+
+
+def get_setting(name, default=None):
+    """Read an optional setting: Secrets -> Env -> default"""
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except Exception:
+        # No secrets.toml (e.g. scripts and tests)
+        pass
+    return os.getenv(name, default)
+
+
+def get_flag(name, default=False):
+    value = get_setting(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
@@ -0,0 +1,205 @@
+import asyncio
+import re
+import threading
+
+
+def normalize_query(text):
+    """Case, whitespace and trailing punctuation do not make a question different"""
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip("?!. ")
+
+
+class Flight:
+    """
+    One in-progress answer that several callers share.
+
+    The leader publishes the retrieved docs, then answer chunks as they arrive,
+    then finish() or fail() (complete() does all three for a whole answer).
+    Followers replay the chunks published so far and then follow new ones, from
+    threads (iter_chunks(), result()) or coroutines (achunks(), aresult()).
+    A follower that sees no progress for `timeout` seconds fails the flight with
+    TimeoutError, so a leader that died silently does not hold it forever.
+    """
+
+    def __init__(self, on_done=None, timeout=None):
+        self.chunks = []
+        self.docs = None
+        self.done = False
+        self.error = None
+        self.followers = 0
+        # Set by the leader when it had to call the LLM (not answered from the cache)
+        self.llm_called = False
+        self._on_done = on_done
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+
+    def _changed(self):
+        self._cond.notify_all()
+        for loop, event in list(self._async_waiters):
+            loop.call_soon_threadsafe(event.set)
+
+    def set_docs(self, docs):
+        with self._cond:
+            self.docs = docs
+            self._changed()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._changed()
+
+    def finish(self, error=None):
+        with self._cond:
+            if self.done:
+                return
+            self.done = True
+            self.error = error
+            self._changed()
+        if self._on_done:
+            self._on_done(self)
+
+    def fail(self, error):
+        self.finish(error)
+
+    def complete(self, answer, docs):
+        self.set_docs(docs)
+        self.publish(answer)
+        self.finish()
+
+    def _state(self, index):
+        """(chunk or None, finished) for a reader at index; raises the leader's error"""
+        if index < len(self.chunks):
+            return self.chunks[index], False
+        if self.error is not None:
+            raise self.error
+        return None, self.done
+
+    def _stalled(self):
+        """Called by a follower that waited `timeout` seconds without progress"""
+        error = TimeoutError("The shared answer stopped making progress, please ask again")
+        self.finish(error)
+        raise error
+
+    def _wait_sync(self, ready):
+        """Block until ready() (checked under the lock) returns a value; resets the timeout on every change"""
+        timed_out = False
+        with self._cond:
+            while True:
+                value = ready()
+                if value is not None:
+                    return value
+                if timed_out:
+                    break
+                timed_out = not self._cond.wait(self.timeout)
+        self._stalled()
+
+    def _docs_ready(self):
+        if self.error is not None:
+            raise self.error
+        return self.docs is not None or self.done
+
+    def _chunk_ready(self, index):
+        chunk, finished = self._state(index)
+        return (chunk, finished) if chunk is not None or finished else None
+
+    def wait_docs(self):
+        self._wait_sync(lambda: True if self._docs_ready() else None)
+        return self.docs or []
+
+    def iter_chunks(self):
+        index = 0
+        while True:
+            chunk, finished = self._wait_sync(lambda: self._chunk_ready(index))
+            if chunk is None:
+                return
+            index += 1
+            yield chunk
+
+    def result(self):
+        """(answer, docs) once the leader has finished"""
+        answer = "".join(self.iter_chunks())
+        return answer, self.docs or []
+
+    async def _wait(self, ready):
+        """Wait on the event loop until ready() (checked under the lock) is true"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        timed_out = False
+        try:
+            while True:
+                with self._cond:
+                    value = ready()
+                    if value is not None:
+                        return value
+                    if timed_out:
+                        break
+                    event.clear()
+                    self._async_waiters.add(waiter)
+                try:
+                    await asyncio.wait_for(event.wait(), self.timeout)
+                except asyncio.TimeoutError:
+                    timed_out = True
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+        self._stalled()
+
+    async def await_docs(self):
+        await self._wait(lambda: True if self._docs_ready() else None)
+        return self.docs or []
+
+    async def achunks(self):
+        index = 0
+        while True:
+            chunk, finished = await self._wait(lambda: self._chunk_ready(index))
+            if chunk is None:
+                return
+            index += 1
+            yield chunk
+
+    async def aresult(self):
+        answer = "".join([chunk async for chunk in self.achunks()])
+        return answer, self.docs or []
+
+
+class SingleFlight:
+    """
+    Registry of in-flight answers keyed by (normalized query, corpus version).
+
+    join() returns (flight, True) to the first caller, which must produce the
+    answer, and (flight, False) to callers arriving while it runs. The flight
+    leaves the registry when it finishes; later repeats are served by the
+    answer cache instead. `timeout` bounds how long followers wait without
+    progress (see Flight).
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.llm_calls_saved = 0
+
+    def join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.coalesced += 1
+                return flight, False
+            flight = Flight(on_done=lambda f: self._done(key, f), timeout=self.timeout)
+            self._flights[key] = flight
+            return flight, True
+
+    def _done(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if flight.llm_called and flight.error is None:
+                self.llm_calls_saved += flight.followers
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._flights), "coalesced": self.coalesced,
+                    "llm_calls_saved": self.llm_calls_saved}
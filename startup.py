@@ -0,0 +1,57 @@
+import threading
+import time
+
+# A failed start (e.g. database unreachable) is retried by the next page load after this long
+RETRY_SECONDS = 30
+
+_lock = threading.Lock()
+_done = threading.Event()
+_state = {"status": "idle", "error": None, "started_at": None, "finished_at": None, "timings": {}}
+
+
+def start_warm_up():
+    """
+    Build the shared engine in a background thread, once per process, and return readiness().
+
+    The thread imports rag_engine (LangChain, Gemini, torch, pymongo), builds the
+    RAGChatbot and loads the embedding model, so the Streamlit page can render while it runs.
+    """
+    with _lock:
+        retry = _state["status"] == "failed" and time.time() - _state["finished_at"] >= RETRY_SECONDS
+        if _state["status"] == "idle" or retry:
+            _state.update(status="starting", error=None, started_at=time.time(), finished_at=None)
+            _done.clear()
+            threading.Thread(target=_run, name="engine-warm-up", daemon=True).start()
+    return readiness()
+
+
+def _run():
+    status, error, timings = "ready", None, {}
+    try:
+        t0 = time.perf_counter()
+        import rag_engine
+        timings["import"] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        rag_engine.warm_up()
+        timings["engine"] = time.perf_counter() - t0
+    except Exception as e:
+        status, error = "failed", str(e)
+    with _lock:
+        _state.update(status=status, error=error, finished_at=time.time(), timings=timings)
+    _done.set()
+
+
+def readiness():
+    """{"status": "idle" | "starting" | "ready" | "failed", "error", "started_at", "finished_at", "timings"}"""
+    with _lock:
+        return {**_state, "timings": dict(_state["timings"])}
+
+
+def get_bot(timeout=0):
+    """The shared engine if it is ready (waiting up to timeout seconds while it starts), else None"""
+    if readiness()["status"] == "starting" and timeout:
+        _done.wait(timeout)
+    if readiness()["status"] != "ready":
+        return None
+    from rag_engine import get_shared_bot
+    return get_shared_bot()
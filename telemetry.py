@@ -0,0 +1,195 @@
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+
+# Stages recorded per request kind, in display order
+CHAT_STAGES = ("embed", "cache_lookup", "retrieve", "extract", "prompt", "llm_queue", "llm_first_token", "llm_total", "render",
+               "total")
+INGEST_STAGES = ("parse", "split", "embed", "insert", "total")
+
+
+def percentile(ordered, q):
+    """q-quantile of an already sorted list (nearest rank)"""
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Trace:
+    """
+    Stage timings for one request. Use as a context manager, or call finish()
+    explicitly when the request outlives the call that started it (streaming).
+    """
+
+    def __init__(self, telemetry, kind, label=""):
+        self.telemetry = telemetry
+        self.kind = kind
+        self.label = label
+        self.stages = {}
+        self.tags = {}
+        self.timestamp = time.time()
+        self._started = time.perf_counter()
+        self._finished = False
+
+    def span(self, stage):
+        return _Span(self, stage)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def tag(self, key, value):
+        self.tags[key] = value
+
+    def finish(self, error=None):
+        if self._finished:
+            return
+        self._finished = True
+        if error is not None:
+            self.tags["error"] = type(error).__name__
+        self.stages["total"] = time.perf_counter() - self._started
+        self.telemetry.record(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+
+
+class _Span:
+    def __init__(self, trace, stage):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.add(self.stage, time.perf_counter() - self._t0)
+        return False
+
+
+class Telemetry:
+    """
+    Bounded in-memory ring buffer of request traces.
+
+    Percentiles are computed over the buffer (a rolling window of the last
+    `capacity` requests); request/tag counters and per-stage sums are cumulative
+    for the process, as Prometheus expects. When export_path is set, the
+    Prometheus text format is rewritten there at most every export_interval
+    seconds (e.g. for node_exporter's textfile collector).
+    """
+
+    def __init__(self, capacity=1000, export_path=None, export_interval=15.0):
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self._traces = deque(maxlen=capacity)
+        self._requests = defaultdict(int)     # (kind, tag items) -> count
+        self._stage_totals = defaultdict(lambda: [0, 0.0])   # (kind, stage) -> [count, sum]
+        self._last_export = 0.0
+        self._gauges = []
+        self._lock = threading.Lock()
+
+    def add_gauge(self, name, help_text, read):
+        """Export read() -> {label string: value} as a gauge in prometheus_text()"""
+        self._gauges.append((name, help_text, read))
+
+    def start(self, kind, label=""):
+        return Trace(self, kind, label)
+
+    def record(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+            self._requests[(trace.kind, tuple(sorted(trace.tags.items())))] += 1
+            for stage, seconds in trace.stages.items():
+                total = self._stage_totals[(trace.kind, stage)]
+                total[0] += 1
+                total[1] += seconds
+            due = self.export_path and time.time() - self._last_export >= self.export_interval
+            if due:
+                self._last_export = time.time()
+        if due:
+            try:
+                self.export()
+            except OSError:
+                pass
+
+    def recent(self, n=50, kind=None):
+        """Most recent traces first"""
+        with self._lock:
+            traces = [t for t in reversed(self._traces) if kind is None or t.kind == kind]
+        return traces[:n]
+
+    def slowest(self, n=10, kind="chat"):
+        with self._lock:
+            traces = [t for t in self._traces if t.kind == kind]
+        return sorted(traces, key=lambda t: t.stages["total"], reverse=True)[:n]
+
+    def _samples(self, kind):
+        """{stage: sorted seconds} over the buffered traces of one kind, in display order"""
+        samples = defaultdict(list)
+        with self._lock:
+            for trace in self._traces:
+                if trace.kind == kind:
+                    for stage, seconds in trace.stages.items():
+                        samples[stage].append(seconds)
+        order = CHAT_STAGES if kind == "chat" else INGEST_STAGES if kind == "ingest" else ()
+        stages = [s for s in order if s in samples] + sorted(s for s in samples if s not in order)
+        return {stage: sorted(samples[stage]) for stage in stages}
+
+    def percentiles(self, kind="chat"):
+        """{stage: {p50_ms, p95_ms, p99_ms, n}} over the buffered traces of one kind"""
+        return {
+            stage: {
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+                "n": len(ordered),
+            }
+            for stage, ordered in self._samples(kind).items()
+        }
+
+    def prometheus_text(self, prefix="rag"):
+        """Prometheus text exposition format: per-stage latency summaries and request counters"""
+        with self._lock:
+            kinds = sorted({t.kind for t in self._traces} | {kind for kind, _ in self._stage_totals})
+            totals = dict(self._stage_totals)
+            requests = dict(self._requests)
+
+        lines = [f"# HELP {prefix}_stage_seconds Stage latency over the last requests",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        for kind in kinds:
+            rolling = self._samples(kind)
+            for (total_kind, stage), (count, seconds) in sorted(totals.items()):
+                if total_kind != kind:
+                    continue
+                labels = f'kind="{kind}",stage="{stage}"'
+                if stage in rolling:
+                    for q in (0.5, 0.95, 0.99):
+                        value = percentile(rolling[stage], q)
+                        lines.append(f'{prefix}_stage_seconds{{{labels},quantile="{q}"}} {value:.6f}')
+                lines.append(f"{prefix}_stage_seconds_sum{{{labels}}} {seconds:.6f}")
+                lines.append(f"{prefix}_stage_seconds_count{{{labels}}} {count}")
+
+        lines += [f"# HELP {prefix}_requests_total Requests by kind and outcome",
+                  f"# TYPE {prefix}_requests_total counter"]
+        for (kind, tags), count in sorted(requests.items()):
+            labels = ",".join([f'kind="{kind}"'] + [f'{key}="{value}"' for key, value in tags])
+            lines.append(f"{prefix}_requests_total{{{labels}}} {count}")
+
+        for name, help_text, read in self._gauges:
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} gauge"]
+            for labels, value in read().items():
+                lines.append(f"{prefix}_{name}{{{labels}}} {value}" if labels else f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path=None):
+        """Atomically write prometheus_text() to path (default: export_path)"""
+        path = path or self.export_path
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
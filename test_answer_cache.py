@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from answer_cache import SemanticAnswerCache
+
+
+def test_lookup_only_matches_the_same_corpus_version():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("what is x", [1.0, 0.0], 1, "x is y", [])
+    assert cache.lookup([1.0, 0.01], 1) == ("x is y", [])
+    assert cache.lookup([1.0, 0.0], 2) is None
+    assert cache.lookup([0.0, 1.0], 1) is None
+
+
+def test_invalidate_keeps_persistent_tier_when_asked():
+    pytest.importorskip("bson")
+    from local_db import LocalDatabase
+
+    collection = LocalDatabase()["answer_cache"]
+    cache = SemanticAnswerCache(collection=collection)
+    cache.store("q", [1.0, 0.0], 1, "a", [])
+    cache.invalidate(persistent=False)
+    assert cache.lookup([1.0, 0.0], 1) is None
+    assert collection.count_documents({}) == 1
+    cache.invalidate()
+    assert collection.count_documents({}) == 0
+
+
+class _Upload(io.BytesIO):
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def test_corpus_change_in_another_process_drops_cached_answers(tmp_path, monkeypatch):
+    pytest.importorskip("langchain_text_splitters")
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from local_db import LocalDatabase
+    from rag_engine import RAGChatbot
+
+    monkeypatch.setenv("LOCAL_INDEX_DIR", str(tmp_path))
+    db = LocalDatabase(str(tmp_path / "db"))
+    embeddings = DeterministicFakeEmbedding(size=384)
+
+    def bot(answers):
+        return RAGChatbot(api_key="offline", embeddings=embeddings, db=db,
+                          llm=FakeListChatModel(responses=answers), vector_backend="local")
+
+    reader, writer = bot(["old answer", "new answer"]), bot(["unused"])
+    reader.extractive.enabled = False
+    reader.process_files([_Upload("notes.txt", b"The refund window is thirty days. " * 20)])
+    assert reader.get_response("refund window?")[0] == "old answer"
+    assert reader.get_response("refund window?")[0] == "old answer"
+
+    # Stands in for another process bumping the shared corpus version
+    writer._corpus_changed()
+    reader.corpus_check_seconds = 0
+    assert reader.get_response("refund window?")[0] == "new answer"
+    assert reader.corpus_version == writer.corpus_version
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from chat_history import ChatHistory, new_conversation_id
+from local_db import LocalDatabase
+
+
+def test_recent_pages_backwards_in_order():
+    history = ChatHistory(LocalDatabase()["chat_history"])
+    conversation = new_conversation_id()
+    sent = [history.append(conversation, "user" if i % 2 == 0 else "assistant", f"message {i}") for i in range(7)]
+    history.append(new_conversation_id(), "user", "another conversation")
+
+    latest = history.recent(conversation, limit=3)
+    assert [m["content"] for m in latest] == ["message 4", "message 5", "message 6"]
+    assert latest[0]["role"] == "user" and latest[0]["seq"] == sent[4]["seq"]
+
+    older = history.recent(conversation, limit=3, before=latest[0]["seq"])
+    assert [m["content"] for m in older] == ["message 1", "message 2", "message 3"]
+    oldest = history.recent(conversation, limit=3, before=older[0]["seq"])
+    assert [m["content"] for m in oldest] == ["message 0"]
+    assert history.recent(conversation, limit=3, before=oldest[0]["seq"]) == []
+
+
+def test_messages_persist_across_reopen(tmp_path):
+    path = str(tmp_path / "db")
+    conversation = new_conversation_id()
+    ChatHistory(LocalDatabase(path)["chat_history"]).append(conversation, "user", "hello")
+    assert [m["content"] for m in ChatHistory(LocalDatabase(path)["chat_history"]).recent(conversation)] == ["hello"]
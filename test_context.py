@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+from context import drop_near_duplicates, estimate_tokens, merge_adjacent, pack_context
+
+TEXT = "".join(f"Sentence number {i} about the controller. " for i in range(40))
+
+
+def _chunk(start, end, source="manual.pdf", page=0, **metadata):
+    return Document(page_content=TEXT[start:end], metadata={"source": source, "page": page, "start_index": start,
+                                                            **metadata})
+
+
+def test_overlapping_and_touching_chunks_are_merged_once():
+    merged = merge_adjacent([_chunk(100, 300), _chunk(0, 150), _chunk(300, 400)])
+    assert len(merged) == 1
+    rank, doc = merged[0]
+    assert rank == 0
+    assert doc.page_content == TEXT[0:400]
+
+
+def test_chunks_from_other_pages_or_gaps_stay_separate_in_rank_order():
+    docs = [_chunk(500, 600), _chunk(0, 100), _chunk(50, 150, page=1), Document(page_content="no position")]
+    merged = merge_adjacent(docs)
+    assert [rank for rank, _ in merged] == [0, 1, 2, 3]
+    assert [doc.page_content for _, doc in merged] == [TEXT[500:600], TEXT[0:100], TEXT[50:150], "no position"]
+
+
+def test_near_duplicates_keep_the_better_ranked_copy():
+    a = Document(page_content=TEXT[:300], metadata={"source": "a"})
+    b = Document(page_content=TEXT[:300] + " extra", metadata={"source": "b"})
+    kept = drop_near_duplicates([(0, a), (1, b)])
+    assert [doc.metadata["source"] for _, doc in kept] == ["a"]
+
+
+def test_pack_respects_budget_and_skips_chunks_that_do_not_fit():
+    big = Document(page_content="x" * 400, metadata={"source": "big"})
+    small = Document(page_content="y" * 40, metadata={"source": "small"})
+    first = Document(page_content="z" * 200, metadata={"source": "first"})
+    text, used = pack_context([first, big, small], token_budget=100)
+    assert [doc.metadata["source"] for doc in used] == ["first", "small"]
+    assert sum(estimate_tokens(doc.page_content) for doc in used) <= 100
+    assert text == "z" * 200 + "\n\n" + "y" * 40
+
+
+def test_best_hit_is_truncated_when_nothing_fits():
+    text, used = pack_context([Document(page_content="w" * 1000, metadata={})], token_budget=50)
+    assert len(used) == 1 and text == "w" * 200
+
+
+def test_merged_neighbours_are_sent_once():
+    text, used = pack_context([_chunk(0, 200), _chunk(150, 350)], token_budget=1000)
+    assert text == TEXT[0:350] and len(used) == 1
@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+from extractive import ExtractiveAnswerer, best_sentence, is_lookup
+
+
+@pytest.mark.parametrize("query", [
+    "What is the support email?",
+    "what's the refund window",
+    "Who approves refunds?",
+    "How many days do I have to return an item?",
+    "Is there a late fee?",
+])
+def test_short_fact_questions_are_lookups(query):
+    assert is_lookup(query)
+
+
+@pytest.mark.parametrize("query", [
+    "Why was my refund denied?",
+    "What is the difference between plans A and B?",
+    "Summarize the refund policy",
+    "Explain how refunds work",
+    "What is the process for returning an item that arrived damaged after the warranty period ended?",
+])
+def test_open_ended_or_long_questions_are_not(query):
+    assert not is_lookup(query)
+
+
+def test_best_sentence_reports_term_coverage():
+    text = "Our office opens at nine. The support email is help@example.com. Refunds take a week."
+    sentence, coverage = best_sentence("What is the support email?", text)
+    assert sentence == "The support email is help@example.com."
+    assert coverage == 1.0
+    assert best_sentence("", text) == (None, 0.0)
+
+
+def _doc(score, text="The support email is help@example.com."):
+    return Document(page_content=text, metadata={"source": "faq.pdf", "page": 2, "score": score})
+
+
+def test_extract_needs_score_and_coverage_thresholds():
+    answerer = ExtractiveAnswerer(min_score=0.8, min_coverage=0.5)
+    answer, doc = answerer.extract("What is the support email?", [_doc(0.85)])
+    assert "help@example.com" in answer and "faq.pdf, page 3" in answer
+    assert answerer.extract("What is the support email?", [_doc(0.79)]) is None
+    assert answerer.extract("What is the support email?", [_doc(0.95, "Nothing relevant here at all.")]) is None
+    assert answerer.extract("Why is the support email slow?", [_doc(0.95)]) is None
+
+
+def test_answer_counts_served_share():
+    answerer = ExtractiveAnswerer()
+    answerer.answer("What is the support email?", [_doc(0.9)])
+    answerer.answer("What is the support email?", [_doc(0.1)])
+    assert answerer.stats()["share"] == 0.5
+    assert ExtractiveAnswerer(enabled=False).extract("What is the support email?", [_doc(0.9)]) is None
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("langchain_text_splitters")
+pytest.importorskip("bson")
+
+from ingest import IngestPipeline
+from local_db import LocalDatabase
+from vector_stores import LocalVectorStore
+
+
+class TinyEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(t)), 1.0, 0.0, 0.0] for t in texts]
+
+
+def _write(path, paragraphs):
+    path.write_text("\n\n".join(f"Paragraph {p}: " + "the controller resets after a fault. " * 4 for p in paragraphs))
+    return str(path)
+
+
+def test_unchanged_files_are_skipped_and_edits_only_touch_changed_chunks(tmp_path):
+    store = LocalVectorStore(str(tmp_path / "vectors"), dim=4)
+    manifest = LocalDatabase()["manifest"]
+    pipeline = IngestPipeline(TinyEmbeddings(), store, manifest, chunk_size=200, chunk_overlap=0, parse_workers=1)
+    a = _write(tmp_path / "a.txt", range(10))
+    b = _write(tmp_path / "b.txt", range(100, 105))
+
+    first = pipeline.run([a, b])
+    assert (first["files"], first["skipped"], first["added"]) == (2, 0, 15)
+    assert store.count() == 15
+
+    again = pipeline.run([a, b])
+    assert (again["files"], again["skipped"], again["added"], again["removed"]) == (0, 2, 0, 0)
+
+    # Paragraph 3 is rewritten and paragraph 9 dropped: one new chunk, two stale ones
+    a = _write(tmp_path / "a.txt", [0, 1, 2, 33, 4, 5, 6, 7, 8])
+    edited = pipeline.run([a, b])
+    assert (edited["files"], edited["skipped"]) == (1, 1)
+    assert (edited["added"], edited["removed"], edited["unchanged"]) == (1, 2, 8)
+    assert store.count() == 14
+    entry = manifest.find_one({"_id": "a.txt"})
+    assert entry["chunk_count"] == 9
+    assert sorted(store.get(entry["chunk_ids"])) == sorted(entry["chunk_ids"])
@@ -0,0 +1,58 @@
+import socket
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from ingest_jobs import IngestJobQueue
+from local_db import LocalDatabase
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+class _StaleReads:
+    """The collection as another process saw it just before this one claimed the job"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.snapshot = list(collection.find({}))
+
+    def find(self, query=None):
+        return iter(self.snapshot)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def test_orphaned_job_is_resumed_by_one_process_only(tmp_path):
+    collection = LocalDatabase()["ingest_jobs"]
+    ran = []
+
+    def ingest(paths, progress, **options):
+        ran.append(paths)
+        return {}, "ok"
+
+    # A job interrupted in a process on this host that has since exited
+    spool = tmp_path / "job"
+    spool.mkdir()
+    (spool / "notes.txt").write_text("hello")
+    collection.replace_one({"_id": "job"}, {"status": "running", "files": ["notes.txt"], "options": {},
+                                            "spool": str(spool), "host": socket.gethostname(),
+                                            "pid": _dead_pid(), "created_at": 0.0}, upsert=True)
+
+    stale = _StaleReads(collection)
+    first = IngestJobQueue(collection, ingest, str(tmp_path))
+    second = IngestJobQueue(stale, ingest, str(tmp_path))
+    # Both list the job as orphaned; the claim lets only one of them run it
+    assert first.resume() == 1
+    assert second.resume() == 0
+    first._pool.shutdown()
+    second._pool.shutdown()
+    assert len(ran) == 1
+    assert collection.find_one({"_id": "job"})["status"] == "done"
@@ -0,0 +1,81 @@
+import threading
+
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def _index():
+    index = BM25Index()
+    index.add_many([
+        ("a", "Error E-1042 means the controller lost power; reset it."),
+        ("b", "Error E-1043 means the upload timed out."),
+        ("c", "The controller manual covers every error code."),
+    ])
+    return index
+
+
+def test_compound_codes_are_single_tokens_and_parts():
+    assert tokenize("Error E-1042 in v2.5") == ["error", "e-1042", "e", "1042", "v2.5", "v2", "5"]
+
+
+def test_exact_code_ranks_first():
+    hits = _index().search("what does E-1042 mean?", k=3)
+    assert [doc_id for doc_id, _ in hits] == ["a"]
+    index = _index()
+    index.add_many([("d", "Refunds take five business days."), ("e", "Shipping is free over fifty dollars.")])
+    # Sharing a part of the code ("e") or another term scores below the exact code
+    hits = index.search("E-1042 controller", k=5)
+    assert hits[0][0] == "a"
+    assert {doc_id for doc_id, _ in hits[1:]} == {"b", "c"}
+    assert hits[0][1] > hits[1][1]
+    assert _index().search("nothing matches here") == []
+
+
+def test_remove_many_drops_postings():
+    index = _index()
+    index.remove_many(["a", "missing"])
+    assert len(index) == 2
+    assert "a" not in [doc_id for doc_id, _ in index.search("E-1042")]
+
+
+def test_sync_adds_new_and_removes_missing_ids():
+    index = _index()
+    added, removed = index.sync([
+        ("a", "Error E-1042 means the controller lost power; reset it."),
+        ("d", "Refunds take five business days."),
+    ])
+    assert (added, removed) == (1, 2)
+    assert len(index) == 2
+    assert index.search("refunds")[0][0] == "d"
+    assert index.search("1043") == []
+
+
+def test_sync_does_not_block_search_and_retries_after_concurrent_writes():
+    index = _index()
+    reading, release = threading.Event(), threading.Event()
+
+    def slow_items():
+        yield "a", "Error E-1042 means the controller lost power; reset it."
+        reading.set()
+        release.wait(5)
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(index.sync(slow_items())))
+    thread.start()
+    reading.wait(5)
+    # The scan is in progress: searches still see the old index and writes go through
+    assert index.search("E-1043")[0][0] == "b"
+    index.add("e", "Written by an ingest during the scan")
+    release.set()
+    thread.join(5)
+    assert result == [None]
+    assert len(index) == 4
+
+
+def test_fusion_prefers_ids_ranked_by_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["d", "b", "c"]])
+    assert fused[:2] == ["b", "c"]
+    assert set(fused[2:]) == {"a", "d"}
+
+
+def test_fusion_weights():
+    assert reciprocal_rank_fusion([["a"], ["b"]], weights=[1.0, 2.0]) == ["b", "a"]
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from llm_guard import BATCH, INTERACTIVE, CircuitBreaker, LLMGuard, LLMUnavailable, TokenBucketLimiter
+
+
+def test_batch_calls_leave_the_interactive_reserve():
+    limiter = TokenBucketLimiter(rpm=10, tpm=1000, reserve=0.2)
+    for _ in range(8):
+        limiter.acquire(10, BATCH, timeout=0)
+    # Two requests are left, both held back for interactive calls
+    with pytest.raises(LLMUnavailable):
+        limiter.acquire(10, BATCH, timeout=0)
+    limiter.acquire(10, INTERACTIVE, timeout=0)
+    limiter.acquire(10, INTERACTIVE, timeout=0)
+
+
+def test_batch_waits_while_an_interactive_call_is_queued():
+    limiter = TokenBucketLimiter(rpm=600, tpm=10**6)
+    limiter.level["requests"] = 0.0
+    started = threading.Event()
+
+    def interactive():
+        started.set()
+        limiter.acquire(1, INTERACTIVE)
+
+    thread = threading.Thread(target=interactive)
+    thread.start()
+    started.wait()
+    time.sleep(0.02)
+    # A request refills every 0.1s, but the interactive caller gets it first
+    assert limiter.waiting[INTERACTIVE] == 1
+    with pytest.raises(LLMUnavailable):
+        limiter.acquire(1, BATCH, timeout=0.05)
+    thread.join(5)
+    assert limiter.waiting == {INTERACTIVE: 0, BATCH: 0}
+
+
+def test_refund_returns_unused_tokens():
+    limiter = TokenBucketLimiter(rpm=100, tpm=1000)
+    limiter.acquire(600)
+    limiter.refund(500)
+    assert limiter.snapshot()["tokens_available"] == pytest.approx(900, abs=1)
+
+
+def test_breaker_lets_one_trial_through_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    # A failed trial re-opens the circuit at once
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_cancelled_trial_can_be_retried():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.allow()
+    breaker.cancel_trial()
+    assert breaker.allow()
+
+
+def _guard(**kwargs):
+    limiter = TokenBucketLimiter(rpm=1000, tpm=100_000)
+    return LLMGuard(limiter, CircuitBreaker(failure_threshold=1, reset_seconds=30),
+                    base_delay=0, output_tokens=500, **kwargs), limiter
+
+
+def test_stream_error_after_first_chunk_opens_breaker_and_settles():
+    guard, limiter = _guard()
+
+    def broken():
+        yield "partial "
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        list(guard.stream(broken, 10))
+    assert guard.breaker.state == "open"
+    assert limiter.snapshot()["tokens_available"] > 99_900
+
+
+def test_stream_closed_early_settles_reservation():
+    guard, limiter = _guard()
+    stream = guard.stream(lambda: iter(["chunk"] * 100), 10)
+    next(stream)
+    stream.close()
+    assert limiter.snapshot()["tokens_available"] > 99_900
+
+
+def test_call_retries_then_gives_up():
+    guard, _ = _guard(max_retries=1)
+    guard.breaker.failure_threshold = 10
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        raise TimeoutError()
+
+    with pytest.raises(LLMUnavailable):
+        guard.call(flaky, 10)
+    assert len(attempts) == 2 and guard.counters["retries"] == 1
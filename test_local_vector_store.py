@@ -0,0 +1,87 @@
+import math
+import os
+
+import pytest
+
+pytest.importorskip("bson")
+pytest.importorskip("langchain_core")
+
+from vector_stores import LocalVectorStore
+
+
+def _vector(i):
+    """Unit vectors 0.03 radians apart, so the nearest neighbour of _vector(i) is row i"""
+    return [math.cos(i * 0.03), math.sin(i * 0.03), 0.0, 0.0]
+
+
+def _records(source, n, offset=0):
+    return [{"_id": f"{source}{i}", "text": f"{source} chunk {i}", "embedding": _vector(i + offset),
+             "source": source} for i in range(n)]
+
+
+def _store(path, **kwargs):
+    return LocalVectorStore(str(path), dim=4, initial_capacity=4, **kwargs)
+
+
+def test_add_search_and_replace(tmp_path):
+    store = _store(tmp_path)
+    store.add(_records("a", 10))
+    doc, score = store.search(_vector(3), k=1)[0]
+    assert doc.metadata["_id"] == "a3" and doc.metadata["source"] == "a"
+    assert score == pytest.approx(1.0)
+    # Re-adding an ID replaces the old row
+    store.add([{**_records("a", 1)[0], "text": "new text"}])
+    assert store.count() == 10
+    assert store.get(["a0"])["a0"].page_content == "new text"
+
+
+def test_delete_source_and_reload(tmp_path):
+    store = _store(tmp_path)
+    store.add(_records("a", 5) + _records("b", 5))
+    assert store.delete_source("a") == 5
+    store.delete(["b0"])
+    reloaded = _store(tmp_path)
+    assert reloaded.count() == 4
+    assert sorted(reloaded.get(["a1", "b0", "b1"])) == ["b1"]
+    assert reloaded.search(_vector(2), k=1)[0][0].metadata["_id"] == "b2"
+
+
+def test_compaction_drops_deleted_rows_and_survives_reload(tmp_path):
+    store = _store(tmp_path, compact_ratio=0.25, compact_min_rows=10)
+    store.add(_records("a", 30) + _records("b", 10, offset=30))
+    store.delete_source("a")
+    assert len(store._ids) == 10
+    store.add(_records("c", 2, offset=100))
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".f32")] == [store._vectors_name]
+
+    reloaded = _store(tmp_path)
+    assert reloaded.count() == 12
+    assert reloaded.search(_vector(35), k=1)[0][0].metadata["_id"] == "b5"
+    assert reloaded.search(_vector(101), k=1)[0][0].metadata["_id"] == "c1"
+
+
+def test_crash_before_log_switch_keeps_old_index(tmp_path):
+    store = _store(tmp_path)
+    store.add(_records("a", 6))
+    store.delete(["a0", "a1"])
+    # A compaction that wrote its files but crashed before renaming the log
+    with open(tmp_path / "vectors-unfinished.f32", "wb") as f:
+        f.truncate(64)
+    (tmp_path / "docs.jsonl.tmp").write_text('{"vectors": "vectors-unfinished.f32"}\n')
+
+    reloaded = _store(tmp_path)
+    assert reloaded.count() == 4
+    assert reloaded.search(_vector(4), k=1)[0][0].metadata["_id"] == "a4"
+    assert sorted(os.listdir(tmp_path)) == ["docs.jsonl", "vectors.f32"]
+
+
+def test_partial_trailing_record_is_dropped(tmp_path):
+    store = _store(tmp_path)
+    store.add(_records("a", 3))
+    with open(tmp_path / "docs.jsonl", "a") as f:
+        f.write('{"id": "a9", "row": 3, "te')
+
+    reloaded = _store(tmp_path)
+    assert reloaded.count() == 3
+    reloaded.add(_records("b", 1))
+    assert _store(tmp_path).count() == 4
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("bson")
+
+from quantization import cosine_scores, hamming_distances, pack_bits, quantize_int8
+from vector_stores import AtlasVectorStore
+
+
+def _unit_vectors(n, dim=384, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_int8_keeps_direction():
+    vectors = _unit_vectors(50)
+    int8 = quantize_int8(vectors)
+    assert int8.dtype == np.int8 and np.abs(int8).max(axis=1).tolist() == [127] * 50
+    similarity = [cosine_scores(v, q[None])[0] for v, q in zip(vectors, int8)]
+    assert min(similarity) > 0.999
+    assert quantize_int8(np.zeros(4)).tolist() == [[0, 0, 0, 0]]
+
+
+def test_packed_bits_and_hamming_distance():
+    bits = pack_bits([[1.0, -1.0] * 8, [-1.0, 1.0] * 8])
+    assert bits.shape == (2, 2)
+    assert bits[0].tolist() == [0b10101010] * 2
+    assert hamming_distances(bits[0], bits).tolist() == [0, 16]
+
+
+class _Collection:
+    def create_index(self, *args, **kwargs):
+        pass
+
+
+@pytest.mark.parametrize("storage", ["int8", "binary"])
+def test_encoded_candidates_are_rescored_in_exact_order(storage):
+    vectors = _unit_vectors(40)
+    query = vectors[0] + 0.3 * vectors[1]
+    store = AtlasVectorStore(_Collection(), storage=storage)
+    # Candidates as $vectorSearch returns them: encoded, in approximate (here reversed) order
+    docs = [{**store._encode({"_id": f"c{i}", "text": f"chunk {i}", "embedding": v.tolist()}), "score": 0.0}
+            for i, v in reversed(list(enumerate(vectors)))]
+    results = store._rank(docs, query, k=5)
+
+    exact = np.argsort(-cosine_scores(query, vectors))[:5]
+    assert [doc.metadata["_id"] for doc, _ in results] == [f"c{i}" for i in exact]
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True) and 0.5 < scores[0] <= 1.0
+    assert not {"embedding", "embedding_int8"} & set(results[0][0].metadata)
+
+
+def test_index_definition_matches_storage():
+    binary = AtlasVectorStore(_Collection(), storage="binary").search_index_definition(384)
+    assert binary["fields"][0]["similarity"] == "euclidean"
+    assert AtlasVectorStore(_Collection(), storage="int8").search_index_definition(384)["fields"][0]["similarity"] == "cosine"
+    with pytest.raises(ValueError):
+        AtlasVectorStore(_Collection(), storage="int4")
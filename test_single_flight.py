@@ -0,0 +1,128 @@
+import asyncio
+import io
+import threading
+
+import pytest
+
+from single_flight import SingleFlight, normalize_query
+
+
+def test_followers_replay_published_chunks_then_follow_new_ones():
+    flights = SingleFlight()
+    leader, is_leader = flights.join(("what is x", 1))
+    follower, is_follower_leader = flights.join(("what is x", 1))
+    assert is_leader and not is_follower_leader and follower is leader
+
+    leader.set_docs(["doc"])
+    leader.publish("Hello ")
+    received = []
+    reader = threading.Thread(target=lambda: received.append(follower.result()))
+    reader.start()
+    leader.publish("world")
+    leader.llm_called = True
+    leader.finish()
+    reader.join(5)
+
+    assert received == [("Hello world", ["doc"])]
+    assert flights.stats() == {"in_flight": 0, "coalesced": 1, "llm_calls_saved": 1}
+
+
+def test_async_follower_replays_chunks():
+    flights = SingleFlight()
+    leader, _ = flights.join(("q", 1))
+    leader.publish("a")
+
+    async def follow():
+        follower, _ = flights.join(("q", 1))
+        task = asyncio.create_task(follower.aresult())
+        await asyncio.sleep(0)
+        leader.publish("b")
+        leader.complete("c", ["doc"])
+        return await asyncio.wait_for(task, 5)
+
+    assert asyncio.run(follow()) == ("abc", ["doc"])
+
+
+def test_leader_error_reaches_followers_and_saves_nothing():
+    flights = SingleFlight()
+    leader, _ = flights.join(("q", 1))
+    follower, _ = flights.join(("q", 1))
+    leader.publish("partial")
+    leader.llm_called = True
+    leader.fail(RuntimeError("llm down"))
+
+    with pytest.raises(RuntimeError, match="llm down"):
+        follower.result()
+    with pytest.raises(RuntimeError):
+        follower.wait_docs()
+    assert flights.stats()["llm_calls_saved"] == 0
+
+
+def test_finished_flight_leaves_the_registry():
+    flights = SingleFlight()
+    first, _ = flights.join(("q", 1))
+    first.complete("answer", [])
+    second, is_leader = flights.join(("q", 1))
+    assert is_leader and second is not first
+
+
+def test_corpus_version_and_normalization_define_the_key():
+    flights = SingleFlight()
+    flights.join((normalize_query("What is X?"), 1))
+    assert not flights.join((normalize_query("  what   is x "), 1))[1]
+    assert flights.join((normalize_query("What is X?"), 2))[1]
+
+
+def test_follower_times_out_and_frees_a_stalled_flight():
+    flights = SingleFlight(timeout=0.05)
+    leader, _ = flights.join(("q", 1))
+    follower, _ = flights.join(("q", 1))
+    leader.publish("partial")
+    with pytest.raises(TimeoutError):
+        follower.result()
+    assert flights.stats()["in_flight"] == 0
+    assert flights.join(("q", 1))[1]
+
+
+def test_async_follower_times_out():
+    flights = SingleFlight(timeout=0.05)
+    flights.join(("q", 1))
+    follower, _ = flights.join(("q", 1))
+    with pytest.raises(TimeoutError):
+        asyncio.run(follower.await_docs())
+
+
+class _Upload(io.BytesIO):
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def test_abandoned_stream_releases_its_flight(tmp_path, monkeypatch):
+    pytest.importorskip("langchain_text_splitters")
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from local_db import LocalDatabase
+    from rag_engine import RAGChatbot
+
+    monkeypatch.setenv("LOCAL_INDEX_DIR", str(tmp_path))
+    bot = RAGChatbot(api_key="offline", embeddings=DeterministicFakeEmbedding(size=384),
+                     db=LocalDatabase(str(tmp_path / "db")), llm=FakeListChatModel(responses=["answer"]),
+                     vector_backend="local")
+    bot.extractive.enabled = False
+    bot.process_files([_Upload("notes.txt", b"The refund window is thirty days. " * 20)])
+
+    # A client that disconnects before the stream is read never starts the generator
+    chunks, _ = bot.stream_response("refund window?")
+    assert bot.flights.stats()["in_flight"] == 1
+    del chunks
+    assert bot.flights.stats()["in_flight"] == 0
+
+    async def abandon_async():
+        chunks, _ = await bot.astream_response("refund window?")
+        assert bot.flights.stats()["in_flight"] == 1
+
+    asyncio.run(abandon_async())
+    assert bot.flights.stats()["in_flight"] == 0
+    assert bot.get_response("refund window?")[0] == "answer"
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_text_splitters")
+
+from ingest import IngestPipeline
+
+# Synthetic upload size and the anonymous-memory growth we allow while ingesting it
+FILE_MB = 128
+RSS_CEILING_MB = 64
+
+
+def _anon_rss_mb():
+    """Anonymous resident memory; file-backed mmap pages are excluded on purpose"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class CountingStore:
+    """Stand-in for the vector store that only counts what it is given"""
+
+    def __init__(self):
+        self.inserted = 0
+
+    def add(self, records):
+        self.inserted += len(records)
+
+    def delete(self, ids):
+        pass
+
+
+class Manifest:
+    def __init__(self):
+        self.docs = {}
+
+    def find_one(self, query):
+        return self.docs.get(query["_id"])
+
+    def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = doc
+
+
+class TinyEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(t))] for t in texts]
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs Linux /proc")
+def test_large_text_ingest_stays_under_rss_ceiling(tmp_path):
+    path = tmp_path / "manual.txt"
+    paragraph = ("Error code E-{n}: reset the controller and retry the upload. " * 8 + "\n\n")
+    with open(path, "w") as f:
+        n = 0
+        while f.tell() < FILE_MB << 20:
+            f.write(paragraph.format(n=n) * 64)
+            n += 1
+
+    chunks = CountingStore()
+    pipeline = IngestPipeline(TinyEmbeddings(), chunks, Manifest(),
+                              chunk_size=4000, chunk_overlap=200, stream_threshold=1 << 20,
+                              window_chars=1 << 20)
+
+    baseline = _anon_rss_mb()
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], _anon_rss_mb())
+            time.sleep(0.01)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        report = pipeline.run([str(path)])
+    finally:
+        done.set()
+        sampler.join()
+
+    assert report["files"] == 1
+    assert chunks.inserted == report["added"] > 0
+    assert peak[0] - baseline < RSS_CEILING_MB, f"grew {peak[0] - baseline:.0f} MB for a {FILE_MB} MB file"
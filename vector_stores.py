@@ -0,0 +1,507 @@
+import asyncio
+import json
+import os
+import threading
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+from langchain_core.documents import Document
+from pymongo.errors import BulkWriteError, OperationFailure
+from pymongo.operations import SearchIndexModel, UpdateOne
+
+from quantization import STORAGE_MODES, cosine_scores, pack_bits, quantize_int8
+
+
+class AtlasVectorStore:
+    """
+    Chunks in a MongoDB collection, searched with Atlas $vectorSearch.
+    Documents use the same layout langchain_mongodb writes: {_id, text, embedding, **metadata}.
+
+    storage selects how the embedding is written:
+    - "float": BSON double array (~4.9 KB per chunk)
+    - "int8": scalar-quantized BSON binary vector (~0.4 KB)
+    - "binary": 1-bit packed BSON binary vector (48 bytes for 384 dims, indexed) plus an
+      int8 copy that is not indexed and only used for rescoring
+    Compact modes fetch rescore_factor * k candidates and rescore them against the
+    full-precision query vector before returning the top k.
+    """
+
+    def __init__(self, collection, index_name="vector_index", text_key="text", embedding_key="embedding",
+                 candidates_factor=10, storage="float", rescore_factor=4):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown vector storage {storage!r}; expected one of {STORAGE_MODES}")
+        self.collection = collection
+        self.index_name = index_name
+        self.text_key = text_key
+        self.embedding_key = embedding_key
+        self.candidates_factor = candidates_factor
+        self.storage = storage
+        self.rescore_factor = rescore_factor
+        self.rescore_key = f"{embedding_key}_int8"
+        # Optional callable returning a pymongo AsyncCollection for the same collection, used by
+        # asearch/aget; called on each use because async clients belong to one event loop
+        self.async_collection = None
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        try:
+            # Per-source deletes touch only that source's chunks
+            self.collection.create_index("source")
+        except Exception:
+            pass
+
+    def _encode(self, record):
+        """Copy of record with the embedding in this store's storage format"""
+        if self.storage == "float":
+            return record
+        record = dict(record)
+        vector = record[self.embedding_key]
+        int8 = Binary.from_vector(quantize_int8(vector)[0], BinaryVectorDtype.INT8)
+        if self.storage == "int8":
+            record[self.embedding_key] = int8
+        else:
+            # Lists, not arrays: pymongo's ndarray path rejects packed bytes above 127
+            record[self.embedding_key] = Binary.from_vector(pack_bits(vector)[0].tolist(), BinaryVectorDtype.PACKED_BIT, 0)
+            record[self.rescore_key] = int8
+        return record
+
+    def search_index_definition(self, dim):
+        """Atlas Vector Search index definition matching the storage format"""
+        return {
+            "fields": [
+                {"type": "vector", "path": self.embedding_key, "numDimensions": dim,
+                 # 1-bit vectors are compared by Hamming distance, which Atlas exposes as euclidean
+                 "similarity": "euclidean" if self.storage == "binary" else "cosine"},
+                {"type": "filter", "path": "source"},
+            ]
+        }
+
+    def apply_search_index(self, dim):
+        """Create the vector search index, or replace its definition, to match the storage format"""
+        definition = self.search_index_definition(dim)
+        if list(self.collection.list_search_indexes(self.index_name)):
+            self.collection.update_search_index(self.index_name, definition)
+            return "updated"
+        self.collection.create_search_index(
+            SearchIndexModel(definition=definition, name=self.index_name, type="vectorSearch")
+        )
+        return "created"
+
+    def convert_storage(self, batch_size=500):
+        """Re-encode chunks still stored as float arrays into the compact format; returns the count"""
+        if self.storage == "float":
+            return 0
+        converted = 0
+        ops = []
+        for doc in self.collection.find({self.embedding_key: {"$type": "array"}}, {self.embedding_key: 1}):
+            encoded = self._encode({self.embedding_key: doc[self.embedding_key]})
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": encoded}))
+            if len(ops) >= batch_size:
+                self.collection.bulk_write(ops, ordered=False)
+                converted += len(ops)
+                ops = []
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+            converted += len(ops)
+        return converted
+
+    def add(self, records):
+        """Insert records ({_id, text, embedding, **metadata})"""
+        try:
+            self.collection.insert_many([self._encode(r) for r in records], ordered=False)
+        except BulkWriteError as e:
+            # IDs are content-addressed, so a duplicate key means the chunk is already stored
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete_many({"_id": {"$in": list(ids)}})
+
+    def delete_source(self, source):
+        """Delete every chunk of one source file (uses the source index); returns the count"""
+        return self.collection.delete_many({"source": source}).deleted_count
+
+    def clear(self):
+        """
+        Drop and recreate the collection instead of deleting chunk by chunk.
+        Atlas Search index definitions are read first and recreated on the new collection.
+        """
+        count = self.collection.estimated_document_count()
+        try:
+            definitions = list(self.collection.list_search_indexes())
+        except OperationFailure:
+            # Not an Atlas cluster (no search indexes to keep)
+            definitions = []
+        self.collection.drop()
+        self.collection.database.create_collection(self.collection.name)
+        self._ensure_indexes()
+        for index in definitions:
+            self.collection.create_search_index(
+                SearchIndexModel(definition=index["latestDefinition"], name=index["name"],
+                                 type=index.get("type", "search"))
+            )
+        return count
+
+    def count(self):
+        return self.collection.count_documents({})
+
+    def estimated_count(self):
+        """Count from collection metadata (no scan)"""
+        return self.collection.estimated_document_count()
+
+    def _to_document(self, doc):
+        text = doc.pop(self.text_key, "")
+        doc.pop(self.embedding_key, None)
+        doc.pop(self.rescore_key, None)
+        doc["_id"] = str(doc["_id"])
+        return Document(page_content=text, metadata=doc)
+
+    def get(self, ids):
+        """Fetch chunks by ID: {id: Document}"""
+        if not ids:
+            return {}
+        docs = self.collection.find({"_id": {"$in": list(ids)}}, {self.embedding_key: 0, self.rescore_key: 0})
+        return {str(doc["_id"]): self._to_document(doc) for doc in docs}
+
+    def iter_texts(self):
+        """Yield (id, text) for every chunk (used to build the lexical index)"""
+        for doc in self.collection.find({}, {self.text_key: 1}):
+            yield str(doc["_id"]), doc.get(self.text_key, "")
+
+    def _search_pipeline(self, query_vector, k):
+        if self.storage == "float":
+            query, limit, project = [float(x) for x in query_vector], k, {self.embedding_key: 0}
+        elif self.storage == "int8":
+            # Keep the int8 vectors: they are needed for rescoring
+            query = Binary.from_vector(quantize_int8(query_vector)[0], BinaryVectorDtype.INT8)
+            limit, project = k * self.rescore_factor, None
+        else:
+            query = Binary.from_vector(pack_bits(query_vector)[0].tolist(), BinaryVectorDtype.PACKED_BIT, 0)
+            limit, project = k * self.rescore_factor, {self.embedding_key: 0}
+        pipeline = [
+            {
+                "$vectorSearch": {
+                    "index": self.index_name,
+                    "path": self.embedding_key,
+                    "queryVector": query,
+                    "numCandidates": limit * self.candidates_factor,
+                    "limit": limit,
+                }
+            },
+            {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+        ]
+        if project:
+            pipeline.append({"$project": project})
+        return pipeline
+
+    def _rank(self, docs, query_vector, k):
+        """Rescore compact-vector candidates against the full-precision query; returns [(Document, score)]"""
+        if self.storage != "float" and docs:
+            field = self.embedding_key if self.storage == "int8" else self.rescore_key
+            scores = cosine_scores(query_vector, [doc[field].as_vector().data for doc in docs])
+            for doc, score in zip(docs, scores):
+                # Same scale as Atlas's cosine vectorSearchScore
+                doc["score"] = (1.0 + float(score)) / 2
+            docs = sorted(docs, key=lambda doc: doc["score"], reverse=True)[:k]
+        results = []
+        for doc in docs:
+            score = doc.pop("score")
+            results.append((self._to_document(doc), score))
+        return results
+
+    def search(self, query_vector, k=5):
+        """Return [(Document, score)] for the k nearest chunks"""
+        return self._rank(list(self.collection.aggregate(self._search_pipeline(query_vector, k))), query_vector, k)
+
+    async def asearch(self, query_vector, k=5):
+        if self.async_collection is None:
+            return await asyncio.to_thread(self.search, query_vector, k)
+        cursor = await self.async_collection().aggregate(self._search_pipeline(query_vector, k))
+        return self._rank([doc async for doc in cursor], query_vector, k)
+
+    async def aget(self, ids):
+        if self.async_collection is None:
+            return await asyncio.to_thread(self.get, ids)
+        if not ids:
+            return {}
+        found = {}
+        async for doc in self.async_collection().find({"_id": {"$in": list(ids)}},
+                                                      {self.embedding_key: 0, self.rescore_key: 0}):
+            found[str(doc["_id"])] = self._to_document(doc)
+        return found
+
+
+class LocalVectorStore:
+    """
+    Local vector index for offline / air-gapped use.
+
+    Normalized float32 embeddings live in a memory-mapped file (vectors*.f32) and
+    top-k search is one vectorized dot product over it. Chunk text and metadata
+    are kept in memory and persisted to an append-only log (docs.jsonl) that is
+    replayed on startup; a record cut short by a crash is dropped. Deleted rows
+    are masked out; once they make up compact_ratio of the rows (and at least
+    compact_min_rows), deletes compact the index, so re-ingests and deletes do
+    not grow the files without limit. Compaction writes a new vectors file and a
+    new log naming it, and switches to them by renaming the log, so a crash
+    leaves either the old pair or the new one.
+    """
+
+    def __init__(self, directory, dim=384, initial_capacity=1024, compact_ratio=0.25, compact_min_rows=1000):
+        self.directory = directory
+        self.dim = dim
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        os.makedirs(directory, exist_ok=True)
+        self._log_path = os.path.join(directory, "docs.jsonl")
+        # Vectors file the log belongs to; its first line names it after a compaction
+        self._vectors_name = "vectors.f32"
+        self._lock = threading.Lock()
+
+        self._ids = []          # row -> chunk id (None when deleted)
+        self._docs = []         # row -> (text, metadata)
+        self._rows = {}         # chunk id -> row
+        self._by_source = defaultdict(set)   # source -> chunk ids
+        self._load_log()
+        self._remove_stale_files()
+
+        capacity = max(initial_capacity, len(self._ids))
+        self._open_vectors(capacity)
+        self._alive = np.array([cid is not None for cid in self._ids] + [False] * (capacity - len(self._ids)))
+        self._open_log("a")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, self._vectors_name)
+
+    def _load_log(self):
+        if not os.path.exists(self._log_path):
+            return
+        valid = 0
+        with open(self._log_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    entry = None
+                if entry is None:
+                    # Partial record from an interrupted append: drop it so new records start on a fresh line
+                    break
+                valid += len(line)
+                if "vectors" in entry:
+                    self._vectors_name = entry["vectors"]
+                    continue
+                if "delete" in entry:
+                    row = self._rows.pop(entry["delete"], None)
+                    if row is not None:
+                        source = self._docs[row][1].get("source")
+                        self._by_source[source].discard(entry["delete"])
+                        if not self._by_source[source]:
+                            del self._by_source[source]
+                        self._ids[row] = None
+                        self._docs[row] = None
+                    continue
+                row = entry["row"]
+                while len(self._ids) <= row:
+                    self._ids.append(None)
+                    self._docs.append(None)
+                self._ids[row] = entry["id"]
+                self._docs[row] = (entry["text"], entry["metadata"])
+                self._rows[entry["id"]] = row
+                self._by_source[entry["metadata"].get("source")].add(entry["id"])
+        if valid < os.path.getsize(self._log_path):
+            with open(self._log_path, "r+b") as f:
+                f.truncate(valid)
+
+    def _remove_stale_files(self):
+        """Vectors files and logs left behind by a compaction that crashed or finished"""
+        for name in os.listdir(self.directory):
+            if (name.startswith("vectors") and name.endswith(".f32") and name != self._vectors_name) \
+                    or name == "docs.jsonl.tmp":
+                os.remove(os.path.join(self.directory, name))
+
+    def _open_log(self, mode):
+        self._log = open(self._log_path, mode, encoding="utf-8")
+        if mode == "w":
+            self._log.write(json.dumps({"vectors": self._vectors_name}) + "\n")
+            self._log.flush()
+
+    def _open_vectors(self, capacity):
+        size = capacity * self.dim * 4
+        if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < size:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(size)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows):
+        capacity = self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        self._vectors.flush()
+        self._open_vectors(capacity)
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+
+    def add(self, records):
+        """Insert or replace records ({_id, text, embedding, **metadata})"""
+        with self._lock:
+            stale = [r["_id"] for r in records if r["_id"] in self._rows]
+            self._delete_locked(stale)
+            self._maybe_compact_locked()
+            start = len(self._ids)
+            self._ensure_capacity(start + len(records))
+            vectors = np.asarray([r["embedding"] for r in records], dtype=np.float32).reshape(len(records), self.dim)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._vectors[start:start + len(records)] = vectors / norms
+            for offset, record in enumerate(records):
+                row = start + offset
+                metadata = {k: v for k, v in record.items() if k not in ("_id", "text", "embedding")}
+                self._ids.append(record["_id"])
+                self._docs.append((record["text"], metadata))
+                self._rows[record["_id"]] = row
+                self._by_source[metadata.get("source")].add(record["_id"])
+                self._alive[row] = True
+                self._log.write(json.dumps({"id": record["_id"], "row": row, "text": record["text"],
+                                            "metadata": metadata}) + "\n")
+            self._vectors.flush()
+            self._log.flush()
+
+    def _delete_locked(self, ids):
+        for cid in ids:
+            row = self._rows.pop(cid, None)
+            if row is None:
+                continue
+            source = self._docs[row][1].get("source")
+            self._by_source[source].discard(cid)
+            if not self._by_source[source]:
+                del self._by_source[source]
+            self._ids[row] = None
+            self._docs[row] = None
+            self._alive[row] = False
+            self._log.write(json.dumps({"delete": cid}) + "\n")
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete_locked(ids)
+            self._log.flush()
+            self._maybe_compact_locked()
+
+    def delete_source(self, source):
+        """Delete every chunk of one source file; returns the count"""
+        with self._lock:
+            ids = list(self._by_source.get(source, ()))
+            self._delete_locked(ids)
+            self._log.flush()
+            self._maybe_compact_locked()
+        return len(ids)
+
+    def clear(self):
+        with self._lock:
+            count = len(self._rows)
+            self._ids, self._docs, self._rows = [], [], {}
+            self._by_source.clear()
+            self._alive[:] = False
+            self._log.close()
+            self._open_log("w")
+        return count
+
+    def _maybe_compact_locked(self):
+        dead = len(self._ids) - len(self._rows)
+        if dead >= self.compact_min_rows and dead >= self.compact_ratio * len(self._ids):
+            self._compact_locked()
+
+    def compact(self):
+        """Rewrite the index without deleted rows"""
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        live = [row for row, cid in enumerate(self._ids) if cid is not None]
+        ids = [self._ids[row] for row in live]
+        docs = [self._docs[row] for row in live]
+        capacity = self._vectors.shape[0]
+        old_vectors_path = self._vectors_path
+        # Write the new vectors and log next to the current ones; nothing in use is modified
+        name = f"vectors-{uuid.uuid4().hex[:12]}.f32"
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.truncate(capacity * self.dim * 4)
+        vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        if live:
+            vectors[:len(live)] = self._vectors[live]
+        vectors.flush()
+        del vectors
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"vectors": name}) + "\n")
+            for row, (cid, (text, metadata)) in enumerate(zip(ids, docs)):
+                f.write(json.dumps({"id": cid, "row": row, "text": text, "metadata": metadata}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # Renaming the log is the switch: until then a restart reads the old pair, afterwards the new one
+        self._log.close()
+        os.replace(tmp_path, self._log_path)
+        self._vectors_name = name
+        self._open_vectors(capacity)
+        os.remove(old_vectors_path)
+        self._open_log("a")
+        self._ids, self._docs = ids, docs
+        self._rows = {cid: row for row, cid in enumerate(ids)}
+        self._alive[:] = False
+        self._alive[:len(live)] = True
+
+    def count(self):
+        return len(self._rows)
+
+    def estimated_count(self):
+        return len(self._rows)
+
+    def get(self, ids):
+        """Fetch chunks by ID: {id: Document}"""
+        found = {}
+        with self._lock:
+            for cid in ids:
+                row = self._rows.get(cid)
+                if row is not None:
+                    text, metadata = self._docs[row]
+                    found[cid] = Document(page_content=text, metadata={"_id": cid, **metadata})
+        return found
+
+    def iter_texts(self):
+        """Yield (id, text) for every chunk (used to build the lexical index)"""
+        with self._lock:
+            items = [(cid, self._docs[row][0]) for cid, row in self._rows.items()]
+        return iter(items)
+
+    def search(self, query_vector, k=5):
+        """Return [(Document, score)] for the k nearest chunks; score is (1 + cosine) / 2, like Atlas"""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        with self._lock:
+            n = len(self._ids)
+            if not self._rows:
+                return []
+            scores = self._vectors[:n] @ query
+            scores[~self._alive[:n]] = -np.inf
+            k = min(k, len(self._rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for row in top:
+                text, metadata = self._docs[row]
+                results.append((Document(page_content=text, metadata={"_id": self._ids[row], **metadata}),
+                                (1.0 + float(scores[row])) / 2))
+        return results
+
+    async def asearch(self, query_vector, k=5):
+        # Local search is CPU-bound; keep it off the event loop
+        return await asyncio.to_thread(self.search, query_vector, k)
+
+    async def aget(self, ids):
+        return await asyncio.to_thread(self.get, ids)